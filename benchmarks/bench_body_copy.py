@@ -0,0 +1,52 @@
+# coding: utf-8
+''' bytes allocated per response between BodyHandler and Response.save()
+    usage: python benchmarks/bench_body_copy.py [body_size] [chunk_size]
+'''
+
+import os
+import sys
+import json
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pycurl_session import Session, Response
+from pycurl_session.session import BodyHandler
+
+
+def bench(body_size, chunk_size, content_type):
+    session = Session(store_cookie=False)
+    chunks = [b"x" * chunk_size for _ in range(body_size // chunk_size)]
+    handler = BodyHandler()
+    tracemalloc.start()
+    for chunk in chunks:
+        handler.write(chunk)
+    base = tracemalloc.get_traced_memory()[0]
+    tracemalloc.reset_peak()
+    response = Response(session=session)
+    response.headers = ["Content-Type: {0}".format(content_type)]
+    response.content = handler.get_data()
+    after_gather = tracemalloc.get_traced_memory()[1] - base
+    session._response_decode(response)
+    text_size = len(response.text) if isinstance(response.text, str) else 0
+    body = response.content_view
+    response.save(os.devnull)
+    peak = tracemalloc.get_traced_memory()[1] - base
+    tracemalloc.stop()
+    return {
+        "body_size": body_size,
+        "chunk_size": chunk_size,
+        "content_type": content_type,
+        "gather_bytes": after_gather,
+        # decoded text is new str, not a copy of body
+        "copy_bytes_except_text": max(0, peak - text_size),
+        "view_nbytes": body.nbytes,
+    }
+
+
+if __name__ == "__main__":
+    body_size = int(sys.argv[1]) if len(sys.argv) > 1 else 4 * 1024 * 1024
+    chunk_size = int(sys.argv[2]) if len(sys.argv) > 2 else 16 * 1024
+    for content_type in ["application/octet-stream", "application/json"]:
+        print(json.dumps(bench(body_size, chunk_size, content_type)))
+        print(json.dumps(bench(body_size, body_size, content_type)))
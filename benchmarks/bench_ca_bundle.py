@@ -0,0 +1,53 @@
+# coding: utf-8
+''' TLS setup cost per new connection with CAINFO (file path) and CAINFO_BLOB (bundle in memory),
+    against local https stand-in server, every request use a new connection (FORBID_REUSE).
+    CA bundle is certifi bundle + self-signed cert of server, same size as default.
+    usage: python benchmarks/bench_ca_bundle.py [requests]
+'''
+
+import os
+import sys
+import json
+import logging
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import certifi
+import pycurl
+from pycurl_session import Session
+from benchmarks.server import StandInServer
+
+
+def bench(server, bundle, ca_blob, count):
+    session = Session(store_cookie=False)
+    session._ca_blob = ca_blob
+    wall = time.perf_counter()
+    cpu = time.process_time()
+    for i in range(count):
+        c = session.prepare_curl_handle("GET", server.url("/page/{0}".format(i)), c=session.c, cert=bundle)
+        session.set_http_version(c)
+        c.setopt(pycurl.FORBID_REUSE, 1)
+        session.send(c)
+    wall = time.perf_counter() - wall
+    cpu = time.process_time() - cpu
+    return {
+        "option": "CAINFO_BLOB" if ca_blob else "CAINFO",
+        "requests": count,
+        "ms_per_req": round(wall / count * 1000, 3),
+        "cpu_ms_per_req": round(cpu / count * 1000, 3),
+    }
+
+
+if __name__ == "__main__":
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 300
+    logging.getLogger("pycurl_session").setLevel(logging.WARNING)
+    with StandInServer("https", body_size=1024) as server:
+        bundle = os.path.join(server.tmp_dir, "bundle.pem")
+        with open(bundle, "wb") as f:
+            for path in [certifi.where(), server.cafile]:
+                with open(path, "rb") as ca:
+                    f.write(ca.read())
+        print(json.dumps({"libcurl": pycurl.version, "auto": "CAINFO_BLOB" if Session(store_cookie=False)._ca_blob else "CAINFO"}))
+        for ca_blob in [False, True]:
+            print(json.dumps(bench(server, bundle, ca_blob, count)))
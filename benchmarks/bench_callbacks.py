@@ -0,0 +1,92 @@
+# coding: utf-8
+''' python callback cost of header and body capture per response
+        python - HEADERFUNCTION/WRITEFUNCTION are python methods, header line decoded and parsed one by one
+        append - list.append as callback, raw header bytes decoded and parsed once when headers is used
+    synthetic: call callbacks like libcurl, 16 header lines and 16 body chunks
+    live: Session.get against local http stand-in server
+    usage: python benchmarks/bench_callbacks.py [requests]
+'''
+
+import os
+import sys
+import json
+import logging
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pycurl_session import Session
+from pycurl_session.response import Headers
+from pycurl_session.session import HeaderHandler, BodyHandler
+from benchmarks.server import StandInServer
+
+
+class PythonHeaderHandler(object):
+    def __init__(self):
+        self.headers = Headers()
+        self.callback = self.write
+
+    def write(self, header_line):
+        header_line = header_line.decode("iso-8859-1")
+        if ":" in header_line:
+            self.headers.append(header_line.strip())
+
+    def clear(self):
+        self.headers = Headers()
+
+
+class PythonBodyHandler(BodyHandler):
+    def __init__(self):
+        super().__init__()
+        self.callback = self.write
+
+
+HANDLERS = {
+    "python": (PythonHeaderHandler, PythonBodyHandler),
+    "append": (HeaderHandler, BodyHandler),
+}
+
+HEADER_LINES = [b"HTTP/1.1 200 OK\r\n"] + [
+    "X-Header-{0}: value {0}; path=/\r\n".format(i).encode("iso-8859-1") for i in range(15)
+] + [b"\r\n"]
+CHUNKS = [b"x" * 16384] * 16
+
+
+def bench_synthetic(name, count):
+    header_handler, body_handler = HANDLERS[name][0](), HANDLERS[name][1]()
+    start = time.perf_counter()
+    for _ in range(count):
+        header_callback = header_handler.callback
+        body_callback = body_handler.callback
+        for line in HEADER_LINES:
+            header_callback(line)
+        for chunk in CHUNKS:
+            body_callback(chunk)
+        headers = header_handler.headers
+        body = body_handler.get_data()
+        headers.get("x-header-1")
+        header_handler.clear()
+        body_handler.clear()
+    seconds = time.perf_counter() - start
+    return {"mode": "synthetic", "handler": name, "us_per_resp": round(seconds / count * 1000000, 2)}
+
+
+def bench_live(name, server, count):
+    session = Session(store_cookie=False)
+    session.c.header_handler, session.c.body_handler = HANDLERS[name][0](), HANDLERS[name][1]()
+    url = server.url("/page/1")
+    cpu = time.process_time()
+    for _ in range(count):
+        session.get(url)
+    cpu = time.process_time() - cpu
+    return {"mode": "live", "handler": name, "cpu_us_per_req": round(cpu / count * 1000000, 2)}
+
+
+if __name__ == "__main__":
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    logging.getLogger("pycurl_session").setLevel(logging.WARNING)
+    for name in HANDLERS:
+        print(json.dumps(bench_synthetic(name, count * 10)))
+    with StandInServer("http", body_size=256 * 1024, cookies=8) as server:
+        for name in HANDLERS:
+            print(json.dumps(bench_live(name, server, count)))
@@ -0,0 +1,49 @@
+# coding: utf-8
+''' items/sec of feed exporter pipelines
+    usage: python benchmarks/bench_exporter.py [items]
+'''
+
+import os
+import sys
+import json
+import shutil
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pycurl_session.spider import Spider
+from pycurl_session.spider.exporter import JsonLinesExporter, CsvExporter, COMPRESSION
+
+
+def bench(exporter_class, compression, count, batch_size):
+    dir_path = tempfile.mkdtemp()
+    spider = Spider()
+    spider.settings = {
+        "FEED_URI": os.path.join(dir_path, "{spider}" + exporter_class.file_extension),
+        "FEED_COMPRESSION": compression,
+    }
+    item = {"url": "https://example.com/item/0", "title": "example title", "price": 9.99, "tags": "a,b,c"}
+    exporter = exporter_class()
+    t = time.perf_counter()
+    for i in range(0, count, batch_size):
+        exporter.process_items([item] * batch_size, spider)
+    exporter.close_spider(spider)
+    used = time.perf_counter() - t
+    size = sum(os.path.getsize(os.path.join(dir_path, name)) for name in os.listdir(dir_path))
+    shutil.rmtree(dir_path)
+    return {
+        "exporter": exporter_class.__name__,
+        "compression": compression,
+        "batch_size": batch_size,
+        "items_per_sec": int(count / used),
+        "file_size": size,
+    }
+
+
+if __name__ == "__main__":
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    for exporter_class in [JsonLinesExporter, CsvExporter]:
+        for compression in [None] + list(COMPRESSION.keys()):
+            for batch_size in [1, 100]:
+                print(json.dumps(bench(exporter_class, compression, count, batch_size)))
@@ -0,0 +1,75 @@
+# coding: utf-8
+''' setopt calls and time per request to prepare a pooled handle, like Schedule.put_curl_pool + make_curl_handle
+        reset - pycurl.Curl, reset() then set all options again
+        diff - CurlHandle, keep options, only set the changed ones
+    no network, prepare_curl_handle only.
+    usage: python benchmarks/bench_handle_reuse.py [requests]
+'''
+
+import os
+import sys
+import json
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pycurl
+from pycurl_session import Session
+from pycurl_session.session import CurlHandle
+
+
+class CountCurl(pycurl.Curl):
+    def __init__(self):
+        super().__init__()
+        self.setopt_count = 0
+
+    def setopt(self, option, value):
+        super().setopt(option, value)
+        self.setopt_count += 1
+
+
+def make_requests(count):
+    # crawl like: same site, referer from list page, some POST
+    requests = []
+    for i in range(count):
+        if i % 50 == 49:
+            requests.append(("POST", "https://example.com/search", {"data": {"q": str(i)}}))
+        else:
+            requests.append(("GET", "https://example.com/page/{0}".format(i), {"headers": {"referer": "https://example.com/"}}))
+    return requests
+
+
+def prepare(session, c, requests):
+    reuse = isinstance(c, CurlHandle)
+    start = time.perf_counter()
+    for method, url, args in requests:
+        if not reuse:
+            c.reset()
+        session.prepare_curl_handle(method, url, c=c, **args)
+        session.set_http_version(c)
+    return time.perf_counter() - start
+
+
+def bench(name, requests):
+    session = Session(store_cookie=False)
+    if name == "reset":
+        # count with subclass, time with pycurl.Curl, setopt in python add overhead
+        c = CountCurl()
+        prepare(session, c, requests)
+        seconds = prepare(session, pycurl.Curl(), requests)
+    else:
+        c = CurlHandle()
+        seconds = prepare(session, c, requests)
+    return {
+        "handle": name,
+        "requests": len(requests),
+        "setopt_per_req": round(c.setopt_count / len(requests), 2),
+        "us_per_req": round(seconds / len(requests) * 1000000, 2),
+    }
+
+
+if __name__ == "__main__":
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    requests = make_requests(count)
+    for name in ["reset", "diff"]:
+        print(json.dumps(bench(name, requests)))
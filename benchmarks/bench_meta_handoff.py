@@ -0,0 +1,77 @@
+# coding: utf-8
+''' cost of deepcopy(c.meta) and deepcopy(headers) per response, against handing them to Response
+    usage: python benchmarks/bench_meta_handoff.py [responses] [meta_size]
+'''
+
+import os
+import sys
+import json
+import time
+import cProfile
+import pstats
+from copy import deepcopy
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pycurl_session import Response
+
+
+def make_meta(meta_size):
+    # users put parsed data in meta, and pass it along
+    return {
+        "cookiejar": 1,
+        "item": {"title": "x" * 64, "tags": ["tag{0}".format(i) for i in range(meta_size)]},
+        "rows": [{"id": i, "name": "row{0}".format(i), "price": i * 1.5} for i in range(meta_size)],
+    }
+
+
+def make_headers():
+    return ["Content-Type: text/html; charset=utf-8", "Server: nginx"] + [
+        "Set-Cookie: k{0}=v{0}; path=/".format(i) for i in range(10)
+    ]
+
+
+def run_copy(count, meta, headers):
+    for _ in range(count):
+        response = Response()
+        response.meta = deepcopy(meta)
+        response.headers = deepcopy(headers)
+        del response
+
+
+def run_handoff(count, meta, headers):
+    for _ in range(count):
+        response = Response()
+        response.meta = meta
+        response.headers = headers
+        del response
+
+
+def bench(name, func, count, meta, headers):
+    profile = cProfile.Profile()
+    time_start = time.perf_counter()
+    profile.enable()
+    func(count, meta, headers)
+    profile.disable()
+    time_used = time.perf_counter() - time_start
+    stats = pstats.Stats(profile)
+    deepcopy_time = sum(
+        v[3] for k, v in stats.stats.items() if k[2] == "deepcopy"
+    )
+    return {
+        "name": name,
+        "responses": count,
+        "time_used": round(time_used, 4),
+        "us_per_response": round(time_used / count * 1e6, 2),
+        # cumulative time in copy.deepcopy, from profile
+        "deepcopy_time": round(deepcopy_time, 4),
+    }
+
+
+if __name__ == "__main__":
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    meta_size = int(sys.argv[2]) if len(sys.argv) > 2 else 100
+    meta = make_meta(meta_size)
+    headers = make_headers()
+    print(json.dumps(bench("deepcopy", run_copy, count, meta, headers)))
+    print(json.dumps(bench("handoff", run_handoff, count, meta, headers)))
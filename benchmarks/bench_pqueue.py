@@ -0,0 +1,43 @@
+# coding: utf-8
+''' push/pop cost of Schedule.queue_pending
+    usage: python benchmarks/bench_pqueue.py [size ...]
+'''
+
+import os
+import sys
+import json
+import random
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pycurl_session.spider.pqueue import PriorityQueue
+from pycurl_session.spider.task import TaskItem
+
+
+def bench(size, sample=100000):
+    q = PriorityQueue()
+    rnd = random.Random(size)
+    for i in range(size):
+        q.append(TaskItem("spider", i, rnd.randint(0, 9)))
+    # measure at full size
+    sample = min(sample, size)
+    t = time.perf_counter()
+    for i in range(sample):
+        q.append(TaskItem("spider", i, rnd.randint(0, 9)))
+    push = time.perf_counter() - t
+    t = time.perf_counter()
+    for i in range(sample):
+        q.popleft()
+    pop = time.perf_counter() - t
+    return {
+        "size": size,
+        "push_ns": int(push / sample * 1e9),
+        "pop_ns": int(pop / sample * 1e9),
+    }
+
+
+if __name__ == "__main__":
+    sizes = [int(x) for x in sys.argv[1:]] or [10 ** 4, 10 ** 5, 10 ** 6, 10 ** 7]
+    for size in sizes:
+        print(json.dumps(bench(size)))
@@ -0,0 +1,77 @@
+# coding: utf-8
+''' first request of new hosts in Schedule, with and without DNS_PREFETCH_ENABLED.
+    `hosts` local https stand-in servers(different ports, different hosts), start_urls has `pages` pages of each host,
+    CONCURRENT_REQUESTS is 2, pages are crawled host by host, the later hosts wait in queue and are prefetched.
+    first_* - timings(ms) of the first response per host: namelookup, appconnect(TLS done) and starttransfer(first byte)
+    usage: python benchmarks/bench_prefetch.py [hosts] [pages]
+'''
+
+import os
+import sys
+import json
+import logging
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pycurl_session.spider import Spider, Schedule
+from benchmarks.server import StandInServer
+
+
+def bench(servers, pages, prefetch):
+    # host by host, later hosts wait in queue
+    urls = [
+        "https://localhost:{0}/page/{1}".format(server.port, i)
+        for server in servers for i in range(pages)
+    ]
+    first = {}
+
+    class PrefetchSpider(Spider):
+        name = "bench_prefetch"
+
+        def __init__(self):
+            self.start_urls = urls
+
+        def parse(self, response):
+            host = response.url.split("/")[2]
+            if host not in first:
+                first[host] = response.timings
+
+    schedule = Schedule({
+        "ROBOTSTXT_OBEY": False,
+        "COOKIES_STORE_ENABLED": False,
+        "LOG_ENABLED": False,
+        "CONCURRENT_REQUESTS": 2,
+        "DNS_PREFETCH_ENABLED": prefetch,
+    })
+    schedule.session._verify = False
+    schedule.add_spider(PrefetchSpider)
+    start = time.perf_counter()
+    schedule.run()
+    seconds = time.perf_counter() - start
+
+    def mean(name):
+        return round(sum(getattr(t, name) for t in first.values()) / len(first) * 1000, 3)
+
+    return {
+        "prefetch": prefetch,
+        "hosts": len(first),
+        "seconds": round(seconds, 3),
+        "first_namelookup_ms": mean("namelookup"),
+        "first_appconnect_ms": mean("appconnect"),
+        "first_starttransfer_ms": mean("starttransfer"),
+        "prefetch_connected": schedule.logstat.get("dns_prefetch/connected", 0),
+    }
+
+
+if __name__ == "__main__":
+    hosts = int(sys.argv[1]) if len(sys.argv) > 1 else 8
+    pages = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+    servers = [StandInServer("https", latency=0.005, body_size=1024).start() for _ in range(hosts)]
+    logging.getLogger("pycurl_session").setLevel(logging.WARNING)
+    try:
+        for prefetch in [False, True]:
+            print(json.dumps(bench(servers, pages, prefetch)))
+    finally:
+        for server in servers:
+            server.stop()
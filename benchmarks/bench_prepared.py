@@ -0,0 +1,61 @@
+# coding: utf-8
+''' repeated api calls with same url, headers and auth, Session.get/post vs PreparedRequest.send
+    against local http stand-in server.
+    usage: python benchmarks/bench_prepared.py [requests]
+'''
+
+import os
+import sys
+import json
+import logging
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pycurl_session import Session
+from pycurl_session.auth import HTTPAUTH_BEARER
+from benchmarks.server import StandInServer
+
+
+HEADERS = {
+    "user-agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0 Safari/537.36",
+    "accept": "application/json",
+    "accept-language": "en-US,en;q=0.9",
+    "x-api-version": "2",
+}
+
+
+def new_session():
+    session = Session(store_cookie=False)
+    session.retry_http_codes = []
+    return session
+
+
+def bench_session(url, count):
+    session = new_session()
+    start = time.perf_counter()
+    for i in range(count):
+        session.get(url, params={"page": i}, headers=HEADERS, auth=HTTPAUTH_BEARER("token"))
+        session.post(url, json={"page": i}, headers=HEADERS, auth=HTTPAUTH_BEARER("token"))
+    return time.perf_counter() - start
+
+
+def bench_prepared(url, count):
+    session = new_session()
+    get = session.prepare("GET", url, headers=HEADERS, auth=HTTPAUTH_BEARER("token"))
+    post = session.prepare("POST", url, json={}, headers=HEADERS, auth=HTTPAUTH_BEARER("token"))
+    start = time.perf_counter()
+    for i in range(count):
+        get.send(params={"page": i})
+        post.send(json={"page": i})
+    return time.perf_counter() - start
+
+
+if __name__ == "__main__":
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    logging.getLogger("pycurl_session").setLevel(logging.WARNING)
+    with StandInServer("http", body_size=256) as server:
+        url = server.url("/json")
+        for name, func in [("session", bench_session), ("prepared", bench_prepared)]:
+            seconds = func(url, count)
+            print(json.dumps({"name": name, "requests": count * 2, "us_per_req": round(seconds / count / 2 * 1000000, 2)}))
@@ -0,0 +1,127 @@
+# coding: utf-8
+''' requests/sec of Task.get() for RedisSpider, with a local redis stand-in
+    every round-trip to the stand-in sleep RTT seconds, like a network call.
+    usage: python benchmarks/bench_redis_task.py [count] [rtt_ms]
+'''
+
+import os
+import sys
+import json
+import time
+from collections import deque
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pycurl_session.spider import RedisSpider
+from pycurl_session.spider.task import Task
+
+
+class StandInPipeline(object):
+    def __init__(self, server):
+        self.server = server
+        self.commands = []
+
+    def __getattr__(self, name):
+        def command(*args):
+            self.commands.append((name, args))
+            return self
+        return command
+
+    def execute(self):
+        self.server.round_trip()
+        result = [getattr(self.server, name)(*args, _rtt=False) for name, args in self.commands]
+        self.commands.clear()
+        return result
+
+
+class StandInRedis(object):
+    ''' support commands used by Task: type, spop, lrange, ltrim, lpush, sadd, pipeline '''
+    def __init__(self, rtt=0.0005):
+        self.rtt = rtt
+        self.data = {}
+        self.round_trips = 0
+
+    def round_trip(self):
+        self.round_trips += 1
+        time.sleep(self.rtt)
+
+    def type(self, key, _rtt=True):
+        if _rtt: self.round_trip()
+        value = self.data.get(key)
+        if isinstance(value, set): return b"set"
+        if isinstance(value, deque): return b"list"
+        return b"none"
+
+    def spop(self, key, count=None, _rtt=True):
+        if _rtt: self.round_trip()
+        value = self.data.get(key, set())
+        result = [value.pop() for _ in range(min(count or 1, len(value)))]
+        return result if count is not None else (result[0] if result else None)
+
+    def lrange(self, key, start, end, _rtt=True):
+        if _rtt: self.round_trip()
+        value = list(self.data.get(key, deque()))
+        return value[start:] if end == -1 else value[start:end + 1]
+
+    def ltrim(self, key, start, end, _rtt=True):
+        if _rtt: self.round_trip()
+        value = list(self.data.get(key, deque()))
+        self.data[key] = deque(value[start:] if end == -1 else value[start:end + 1])
+        return True
+
+    def lpush(self, key, *values, _rtt=True):
+        if _rtt: self.round_trip()
+        self.data.setdefault(key, deque()).extendleft(values)
+        return len(self.data[key])
+
+    def sadd(self, key, *values, _rtt=True):
+        if _rtt: self.round_trip()
+        self.data.setdefault(key, set()).update(values)
+        return len(values)
+
+    def pipeline(self, transaction=True):
+        return StandInPipeline(self)
+
+
+class BenchSpider(RedisSpider):
+    name = "bench"
+    REDIS_START_URLS_KEY = "bench:start_urls"
+
+
+def bench(count, rtt, key_type, batch_size):
+    server = StandInRedis(rtt)
+    urls = ["https://example.com/{0}".format(i).encode("utf-8") for i in range(count)]
+    if key_type == "set":
+        server.sadd(BenchSpider.REDIS_START_URLS_KEY, *urls, _rtt=False)
+    else:
+        server.data[BenchSpider.REDIS_START_URLS_KEY] = deque(urls)
+
+    class BenchTask(Task):
+        def set_redis(self, spider):
+            self.redis_server = server
+            self.redis_encoding = spider.REDIS_ENCODING
+            self.redis_batch_size = batch_size
+            self.redis_key_type = server.type(self.get_redis_key()).decode("utf-8")
+
+    spider = BenchSpider()
+    task = BenchTask(spider)
+    t = time.perf_counter()
+    got = 0
+    while task.get() is not None:
+        got += 1
+    used = time.perf_counter() - t
+    return {
+        "key_type": key_type,
+        "batch_size": batch_size,
+        "requests": got,
+        "round_trips": server.round_trips,
+        "requests_per_sec": int(got / used),
+    }
+
+
+if __name__ == "__main__":
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    rtt = float(sys.argv[2]) / 1000 if len(sys.argv) > 2 else 0.0005
+    for key_type in ["set", "list"]:
+        for batch_size in [1, 16, 100]:
+            print(json.dumps(bench(count, rtt, key_type, batch_size)))
@@ -0,0 +1,254 @@
+# coding: utf-8
+''' drive Session and Schedule against local stand-in servers, print json result.
+    usage: python -m benchmarks.run [--scenario session_get,session_multi,schedule]
+                                    [--protocol http,https,h2] [--requests 1000] [--output result.json]
+    see: python -m benchmarks.run --help
+'''
+
+import argparse
+import json
+import logging
+import os
+import platform
+import resource
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pycurl
+from pycurl_session import Session, Response
+from pycurl_session.spider import Spider, Schedule, Request
+from benchmarks.server import StandInServer, _H2_INSTALLED
+
+
+def percentile(values, p):
+    if not values:
+        return 0
+    values = sorted(values)
+    index = min(len(values) - 1, max(0, int(round(p / 100 * len(values) + 0.5)) - 1))
+    return values[index]
+
+
+def rss_kb():
+    # current rss, /proc only in linux
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") // 1024
+    except (OSError, ValueError):
+        return 0
+
+
+class Measure(object):
+    def __init__(self):
+        self.latency = []
+        self.status = {}
+        self.errors = 0
+
+    def add(self, status, latency):
+        self.status.update({status: self.status.get(status, 0) + 1})
+        self.latency.append(latency)
+
+    def __enter__(self):
+        self.wall = time.perf_counter()
+        self.cpu = time.process_time()
+        return self
+
+    def __exit__(self, *args):
+        self.wall = time.perf_counter() - self.wall
+        self.cpu = time.process_time() - self.cpu
+
+    def result(self):
+        count = len(self.latency)
+        return {
+            "requests": count,
+            "errors": self.errors,
+            "status": {str(k): v for k, v in self.status.items()},
+            "time": round(self.wall, 4),
+            "req_per_s": round(count / self.wall, 2) if self.wall else 0,
+            "latency_ms": {
+                "p50": round(percentile(self.latency, 50) * 1000, 3),
+                "p90": round(percentile(self.latency, 90) * 1000, 3),
+                "p99": round(percentile(self.latency, 99) * 1000, 3),
+                "max": round(max(self.latency or [0]) * 1000, 3),
+            },
+            # server run in child process, not counted
+            "cpu_s": round(self.cpu, 4),
+            "cpu_per_req_ms": round(self.cpu / count * 1000, 4) if count else 0,
+            "rss_kb": rss_kb(),
+            "maxrss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        }
+
+
+def new_session(server):
+    session = Session(store_cookie=False)
+    # measure every response, not retry
+    session.retry_http_codes = []
+    if server.protocol == "h2":
+        session.http_version = "2"
+    return session
+
+
+def run_session_get(server, args):
+    session = new_session(server)
+    measure = Measure()
+    with measure:
+        for i in range(args.requests):
+            t = time.perf_counter()
+            try:
+                response = session.get(server.url("/page/{0}".format(i)), cert=server.cafile)
+                measure.add(response.status_code, time.perf_counter() - t)
+            except pycurl.error:
+                measure.errors += 1
+    return measure.result()
+
+
+def run_session_multi(server, args):
+    ''' keep `concurrency` handles running in CurlMulti, like Schedule without spider '''
+    session = new_session(server)
+    cm = pycurl.CurlMulti()
+    handles = [pycurl.Curl() for _ in range(args.concurrency)]
+    urls = [server.url("/page/{0}".format(i)) for i in range(args.requests)]
+    urls.reverse()
+    measure = Measure()
+
+    active = []
+
+    def add(c):
+        c = session.prepare_curl_handle("GET", urls.pop(), c=c, cert=server.cafile)
+        session.set_http_version(c)
+        cm.add_handle(c)
+        active.append(c)
+
+    def done(c):
+        cm.remove_handle(c)
+        active.remove(c)
+        if urls: add(c)
+
+    with measure:
+        for c in handles:
+            if urls: add(c)
+        while active:
+            while True:
+                ret, _ = cm.perform()
+                if ret != pycurl.E_CALL_MULTI_PERFORM:
+                    break
+            cm.select(0.1)
+            _, ok_list, err_list = cm.info_read()
+            for c in ok_list:
+                response = Response(session=session)
+                session.gather_response(c, response)
+                if response.status_code in session.redirect_http_codes:
+                    cm.remove_handle(c)
+                    session._response_redirect(c, response.status_code)
+                    cm.add_handle(c)
+                    continue
+                measure.add(response.status_code, response.timings.total)
+                done(c)
+            for c, errno, errmsg in err_list:
+                measure.errors += 1
+                done(c)
+    cm.close()
+    return measure.result()
+
+
+def run_schedule(server, args):
+    measure = Measure()
+    base_url = server.url("/")
+
+    class BenchSpider(Spider):
+        name = "bench"
+
+        def __init__(self):
+            self.start_urls = [base_url]
+
+        def parse(self, response):
+            measure.add(response.status_code, response.timings.total)
+            for href in response.xpath("//a/@href").getall():
+                yield Request(response.urljoin(href), callback=self.parse_page)
+
+        def parse_page(self, response):
+            measure.add(response.status_code, response.timings.total)
+            yield {"title": response.title}
+
+    settings = {
+        "ROBOTSTXT_OBEY": False,
+        "COOKIES_STORE_ENABLED": False,
+        "CONCURRENT_REQUESTS": args.concurrency,
+        "RETRY_TIMES": 0,
+        "RETRY_HTTP_CODES": [],
+        "LOG_ENABLED": False,
+    }
+    schedule = Schedule(settings)
+    for name in [schedule.name, "pycurl_session", "bench"]:
+        logging.getLogger(name).setLevel(logging.WARNING)
+    if server.protocol != "http":
+        # Request can not set CAINFO, self-signed cert
+        schedule.session._verify = False
+    if server.protocol == "h2":
+        schedule.session.http_version = "2"
+    schedule.add_spider(BenchSpider)
+    with measure:
+        schedule.run()
+    result = measure.result()
+    result.update({"items": schedule.logstat.get("item_pipeline/count", 0)})
+    return result
+
+
+SCENARIOS = {
+    "session_get": run_session_get,
+    "session_multi": run_session_multi,
+    "schedule": run_schedule,
+}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="pycurl_session benchmarks against local stand-in server")
+    parser.add_argument("--scenario", default=",".join(SCENARIOS.keys()))
+    parser.add_argument("--protocol", default="http,https" + (",h2" if _H2_INSTALLED else ""))
+    parser.add_argument("--requests", type=int, default=1000, help="requests per scenario, schedule crawl links of index page")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--latency", type=float, default=0, help="server latency in seconds")
+    parser.add_argument("--body-size", type=int, default=4096)
+    parser.add_argument("--cookies", type=int, default=0, help="Set-Cookie per response")
+    parser.add_argument("--redirects", type=int, default=0, help="302 hops before response")
+    parser.add_argument("--error-rate", type=float, default=0)
+    parser.add_argument("--output", default=None, help="write json to file, default stdout")
+    args = parser.parse_args(argv)
+    # keep stdout for json only
+    logging.getLogger("pycurl_session").setLevel(logging.WARNING)
+
+    report = {
+        "time": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "python": platform.python_version(),
+        "pycurl": pycurl.version,
+        "platform": platform.platform(),
+        "args": vars(args),
+        "results": [],
+    }
+    for protocol in args.protocol.split(","):
+        server = StandInServer(
+            protocol,
+            latency=args.latency,
+            body_size=args.body_size,
+            links=args.requests,
+            cookies=args.cookies,
+            redirects=args.redirects,
+            error_rate=args.error_rate,
+        )
+        with server:
+            for scenario in args.scenario.split(","):
+                result = {"scenario": scenario, "protocol": protocol}
+                result.update(SCENARIOS[scenario](server, args))
+                report["results"].append(result)
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text)
+    else:
+        print(text)
+    return report
+
+
+if __name__ == "__main__":
+    main()
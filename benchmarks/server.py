@@ -0,0 +1,262 @@
+# coding: utf-8
+''' local stand-in server for benchmarks, run in a child process.
+    protocol: http(HTTP/1.1), https(HTTP/1.1 over TLS, self-signed), h2(HTTP/2 over TLS, need h2 package)
+    paths (GET, POST for http and https):
+        /           - html page with `links` links to /page/<n>
+        /page/<n>   - html page
+        /json       - json body
+    every response: wait `latency` seconds, `body_size` bytes body, `cookies` Set-Cookie with new value,
+    `redirects` 302 hops before the final response, `error_rate` of responses are `error_status`
+'''
+
+import json
+import multiprocessing
+import os
+import random
+import shutil
+import socket
+import ssl
+import subprocess
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs, urlencode
+
+try:
+    import h2.config
+    import h2.connection
+    import h2.events
+    _H2_INSTALLED = True
+except ModuleNotFoundError:
+    _H2_INSTALLED = False
+
+
+DEFAULT_CONFIG = {
+    "latency": 0,
+    "body_size": 4096,
+    "links": 100,
+    "cookies": 0,
+    "redirects": 0,
+    "error_rate": 0,
+    "error_status": 503,
+}
+
+
+def make_cert(dir_path):
+    ''' self-signed cert for 127.0.0.1 and localhost, use cert path as CAINFO in client '''
+    cert_path = os.path.join(dir_path, "cert.pem")
+    key_path = os.path.join(dir_path, "key.pem")
+    subprocess.run(
+        [
+            "openssl", "req", "-x509", "-newkey", "rsa:2048", "-nodes", "-days", "1",
+            "-keyout", key_path, "-out", cert_path, "-subj", "/CN=localhost",
+            "-addext", "subjectAltName=DNS:localhost,IP:127.0.0.1",
+        ],
+        check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    return cert_path, key_path
+
+
+def make_response(config, path, rnd):
+    ''' return (status, [(name, value)], body) '''
+    url = urlparse(path)
+    query = parse_qs(url.query)
+    hop = int(query.get("hop", ["0"])[0])
+    if hop < config["redirects"]:
+        query.update({"hop": [str(hop + 1)]})
+        location = url.path + "?" + urlencode(query, doseq=True)
+        return 302, [("location", location), ("content-length", "0")], b""
+    if config["error_rate"] and rnd.random() < config["error_rate"]:
+        return config["error_status"], [("content-length", "0")], b""
+
+    if url.path.startswith("/json"):
+        body = json.dumps({"path": url.path, "data": "x" * max(0, config["body_size"] - 32)}).encode("utf-8")
+        content_type = "application/json"
+    else:
+        if url.path == "/":
+            links = "".join('<a href="/page/{0}">page {0}</a>'.format(i) for i in range(config["links"]))
+        else:
+            links = ""
+        head = '<html><head><meta charset="utf-8"><title>{0}</title></head><body>{1}<p>'.format(url.path, links)
+        tail = "</p></body></html>"
+        body = (head + "x" * max(0, config["body_size"] - len(head) - len(tail)) + tail).encode("utf-8")
+        content_type = "text/html; charset=utf-8"
+    headers = [("content-type", content_type), ("content-length", str(len(body)))]
+    for i in range(config["cookies"]):
+        headers.append(("set-cookie", "c{0}={1}; Path=/".format(i, rnd.getrandbits(64))))
+    return 200, headers, body
+
+
+def _serve_http1(config, sock, ssl_context):
+    rnd = random.Random(0)
+    lock = threading.Lock()
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        # headers and body are written separately, avoid delayed ACK stall
+        disable_nagle_algorithm = True
+
+        def do_GET(self):
+            if config["latency"]:
+                time.sleep(config["latency"])
+            with lock:
+                status, headers, body = make_response(config, self.path, rnd)
+            self.send_response(status)
+            for name, value in headers:
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_POST(self):
+            # body is dropped, same response as GET
+            self.rfile.read(int(self.headers.get("Content-Length") or 0))
+            self.do_GET()
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer(sock.getsockname(), Handler, bind_and_activate=False)
+    server.socket.close()
+    server.socket = ssl_context.wrap_socket(sock, server_side=True) if ssl_context else sock
+    server.daemon_threads = True
+    server.serve_forever()
+
+
+def _serve_h2_connection(config, conn, rnd, lock):
+    h2_conn = h2.connection.H2Connection(config=h2.config.H2Configuration(client_side=False))
+    h2_conn.initiate_connection()
+    conn.sendall(h2_conn.data_to_send())
+    conn_lock = threading.Lock()
+
+    pending = {}    # {stream_id: body not sent, wait for window update}
+
+    def send_body(stream_id):
+        # send as much as flow control window allow
+        body = pending.pop(stream_id)
+        offset = 0
+        while offset < len(body):
+            size = min(h2_conn.local_flow_control_window(stream_id), h2_conn.max_outbound_frame_size, len(body) - offset)
+            if size <= 0:
+                break
+            h2_conn.send_data(stream_id, body[offset:offset + size], end_stream=offset + size >= len(body))
+            offset += size
+        if offset < len(body):
+            pending.update({stream_id: body[offset:]})
+
+    def respond(stream_id, path):
+        with lock:
+            status, headers, body = make_response(config, path, rnd)
+        with conn_lock:
+            h2_conn.send_headers(stream_id, [(":status", str(status))] + headers, end_stream=not body)
+            if body:
+                pending.update({stream_id: body})
+                send_body(stream_id)
+            conn.sendall(h2_conn.data_to_send())
+
+    while True:
+        try:
+            data = conn.recv(65536)
+        except OSError:
+            break
+        if not data:
+            break
+        with conn_lock:
+            for event in h2_conn.receive_data(data):
+                if isinstance(event, h2.events.RequestReceived):
+                    path = dict(event.headers).get(b":path", b"/").decode("utf-8")
+                    threading.Timer(config["latency"], respond, (event.stream_id, path)).start()
+                elif isinstance(event, h2.events.WindowUpdated):
+                    for stream_id in list(pending.keys()):
+                        send_body(stream_id)
+                elif isinstance(event, h2.events.StreamReset):
+                    pending.pop(event.stream_id, None)
+            conn.sendall(h2_conn.data_to_send())
+    conn.close()
+
+
+def _serve_h2(config, sock, ssl_context):
+    rnd = random.Random(0)
+    lock = threading.Lock()
+    ssl_context.set_alpn_protocols(["h2"])
+    while True:
+        conn, _ = sock.accept()
+        try:
+            conn.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            conn = ssl_context.wrap_socket(conn, server_side=True)
+        except (ssl.SSLError, OSError):
+            conn.close()
+            continue
+        threading.Thread(target=_serve_h2_connection, args=(config, conn, rnd, lock), daemon=True).start()
+
+
+def _run_server(protocol, config, cert, pipe):
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind(("127.0.0.1", 0))
+    sock.listen(128)
+    ssl_context = None
+    if protocol in ["https", "h2"]:
+        ssl_context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+        ssl_context.load_cert_chain(*cert)
+    pipe.send(sock.getsockname()[1])
+    pipe.close()
+    if protocol == "h2":
+        _serve_h2(config, sock, ssl_context)
+    else:
+        _serve_http1(config, sock, ssl_context)
+
+
+class StandInServer(object):
+    ''' usage:
+            with StandInServer("https", latency=0.01) as server:
+                session.get(server.url("/"), cert=server.cafile)
+    '''
+    def __init__(self, protocol="http", **config):
+        if protocol not in ["http", "https", "h2"]:
+            raise Exception("protocol not support: {0}".format(protocol))
+        if protocol == "h2" and not _H2_INSTALLED:
+            raise Exception("h2 server need package h2: pip install h2")
+        self.protocol = protocol
+        self.config = dict(DEFAULT_CONFIG, **config)
+        self.port = None
+        self.cafile = None
+        self.process = None
+        self.tmp_dir = None
+
+    @property
+    def base_url(self):
+        scheme = "http" if self.protocol == "http" else "https"
+        return "{0}://127.0.0.1:{1}".format(scheme, self.port)
+
+    def url(self, path="/"):
+        return self.base_url + path
+
+    def start(self):
+        cert = None
+        if self.protocol != "http":
+            self.tmp_dir = tempfile.mkdtemp(prefix="pycurl_session_bench_")
+            cert = make_cert(self.tmp_dir)
+            self.cafile = cert[0]
+        parent, child = multiprocessing.Pipe()
+        self.process = multiprocessing.Process(
+            target=_run_server, args=(self.protocol, self.config, cert, child), daemon=True,
+        )
+        self.process.start()
+        self.port = parent.recv()
+        return self
+
+    def stop(self):
+        if self.process is not None:
+            self.process.terminate()
+            self.process.join()
+            self.process = None
+        if self.tmp_dir:
+            shutil.rmtree(self.tmp_dir, ignore_errors=True)
+            self.tmp_dir = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *args):
+        self.stop()
@@ -176,4 +176,4 @@ if len(logger.handlers) == 0:
 
 from pycurl_session.client import SFTP, FTP, WebDAV
 from pycurl_session.response import Response, Selector
-from pycurl_session.session import Session
\ No newline at end of file
+from pycurl_session.session import Session, PreparedRequest
\ No newline at end of file
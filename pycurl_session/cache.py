@@ -12,6 +12,7 @@ from .utils.domain import get_tld
 class CacheDB(object):
     def __init__(self, db_name):
         self.db_name = db_name
+        self.version = 0    # +1 when cookies changed by this instance
 
         if os.path.exists(self.db_name):
             self.conn = sqlite3.connect(
@@ -95,6 +96,7 @@ CREATE TABLE cookie (
                 params.append((session_id, name, value, domain, path, expires))
             res = self.executemany(sql, params)
             if res: res.close()
+            self.version += 1
 
         url_path = url_parsed.path if url_parsed.path else "/"
         top_domain = get_tld(url)
@@ -129,6 +131,7 @@ CREATE TABLE cookie (
         res = self.executemany(sql, params)
         self.conn.commit()
         if res: res.close()
+        self.version += 1
 
     def delete_cookies(self, params):
         sql = (
@@ -137,6 +140,7 @@ CREATE TABLE cookie (
         res = self.executemany(sql, params)
         self.conn.commit()
         if res: res.close()
+        self.version += 1
 
     def clear_cookies(self, session_id=None):
         if session_id:
@@ -144,6 +148,7 @@ CREATE TABLE cookie (
             res = self.execute(sql, (session_id,))
             self.conn.commit()
             if res: res.close()
+            self.version += 1
 
     def unset_cookies(self, session_id, cookies=None):
         if session_id is None:
@@ -0,0 +1,386 @@
+# -*- coding: UTF-8 -*-
+''' private http cache for Session, follow RFC 9111.
+    memory LRU in front of sqlite on disk, both evict by size.
+    only GET is cached, one entry for every method + url + value of request headers in Vary.
+'''
+
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from email.utils import parsedate_tz, mktime_tz
+
+from pycurl_session.response import Headers
+
+
+# https://www.rfc-editor.org/rfc/rfc9110#section-15.1, redirect is followed in Session, not cached
+CACHEABLE_STATUS = [200, 203, 204, 300, 404, 405, 410, 414, 501]
+# not stored, and not updated by 304, https://www.rfc-editor.org/rfc/rfc9111#section-3.1
+SKIP_HEADERS = ["set-cookie", "connection", "keep-alive", "proxy-connection", "te", "transfer-encoding", "upgrade"]
+# 10% of (date - last-modified) if no explicit expiration, not more than one day
+HEURISTIC_FRACTION = 0.1
+HEURISTIC_MAX = 86400
+
+
+def parse_http_date(value):
+    ''' return timestamp, or None '''
+    if not value:
+        return None
+    try:
+        return mktime_tz(parsedate_tz(value))
+    except (TypeError, ValueError, OverflowError):
+        return None
+
+
+def parse_cache_control(value):
+    ''' "max-age=60, no-cache" -> {"max-age": "60", "no-cache": None} '''
+    result = {}
+    if not value:
+        return result
+    for item in value.split(","):
+        kv = item.split("=", 1)
+        name = kv[0].strip().lower()
+        if not name:
+            continue
+        result.update({name: kv[1].strip().strip('"') if len(kv) == 2 else None})
+    return result
+
+
+def _seconds(value):
+    try:
+        return max(0, int(value))
+    except (TypeError, ValueError):
+        return None
+
+
+class CacheEntry(object):
+    __slots__ = (
+        "key", "variant", "vary", "url", "status_code", "headers", "content",
+        "request_time", "response_time", "size",
+    )
+
+    def __init__(self, key, variant, vary, url, status_code, headers, content, request_time, response_time):
+        self.key = key
+        self.variant = variant
+        self.vary = vary                    # list of request header names in Vary
+        self.url = url
+        self.status_code = status_code
+        self.headers = headers              # Headers
+        self.content = content
+        self.request_time = request_time
+        self.response_time = response_time
+        self.size = len(content) + sum(len(line) for line in headers)
+
+    @property
+    def cache_control(self):
+        return parse_cache_control(", ".join(self.headers.getlist("cache-control")))
+
+    def freshness_lifetime(self):
+        # https://www.rfc-editor.org/rfc/rfc9111#section-4.2.1, private cache ignore s-maxage
+        cache_control = self.cache_control
+        max_age = _seconds(cache_control.get("max-age"))
+        if max_age is not None:
+            return max_age
+        date = parse_http_date(self.headers.get("date")) or self.response_time
+        if "expires" in self.headers:
+            expires = parse_http_date(self.headers.get("expires"))
+            # invalid Expires, e.g. "0", means already expired
+            return max(0, expires - date) if expires is not None else 0
+        last_modified = parse_http_date(self.headers.get("last-modified"))
+        if last_modified is not None and date > last_modified:
+            return min(HEURISTIC_MAX, int((date - last_modified) * HEURISTIC_FRACTION))
+        return 0
+
+    def current_age(self, now=None):
+        # https://www.rfc-editor.org/rfc/rfc9111#section-4.2.3
+        now = now or time.time()
+        date = parse_http_date(self.headers.get("date")) or self.response_time
+        age_value = _seconds(self.headers.get("age")) or 0
+        apparent_age = max(0, self.response_time - date)
+        response_delay = self.response_time - self.request_time
+        corrected_initial_age = max(apparent_age, age_value + response_delay)
+        return corrected_initial_age + (now - self.response_time)
+
+    def is_fresh(self, request_headers=None, now=None):
+        if "no-cache" in self.cache_control:
+            return False
+        request_headers = request_headers or {}
+        request_cache_control = parse_cache_control(request_headers.get("cache-control"))
+        if "no-cache" in request_cache_control:
+            return False
+        if "cache-control" not in request_headers and "no-cache" in str(request_headers.get("pragma", "")).lower():
+            return False
+        lifetime = self.freshness_lifetime()
+        max_age = _seconds(request_cache_control.get("max-age"))
+        if max_age is not None:
+            lifetime = min(lifetime, max_age)
+        return lifetime > self.current_age(now)
+
+    def validators(self):
+        ''' headers for conditional request, empty if no validator '''
+        result = {}
+        etag = self.headers.get("etag")
+        if etag:
+            result.update({"if-none-match": etag})
+        last_modified = self.headers.get("last-modified")
+        if last_modified:
+            result.update({"if-modified-since": last_modified})
+        return result
+
+    def fill_response(self, response):
+        response.status_code = self.status_code
+        response.headers = Headers(self.headers.lines)
+        response.content = self.content
+        response.url = self.url
+        response.from_cache = True
+        return response
+
+
+class MemoryStore(object):
+    ''' LRU by size, {key: {variant: CacheEntry}} '''
+    def __init__(self, max_size=32 * 1024 * 1024):
+        self.max_size = max_size
+        self.size = 0
+        self.entries = OrderedDict()
+
+    def get(self, key):
+        variants = self.entries.get(key)
+        if variants is None:
+            return None
+        self.entries.move_to_end(key)
+        return variants
+
+    def set(self, entry):
+        variants = self.entries.setdefault(entry.key, {})
+        old = variants.pop(entry.variant, None)
+        if old is not None:
+            self.size -= old.size
+        variants.update({entry.variant: entry})
+        self.size += entry.size
+        self.entries.move_to_end(entry.key)
+        while self.size > self.max_size and self.entries:
+            _, variants = self.entries.popitem(last=False)
+            self.size -= sum(item.size for item in variants.values())
+
+    def delete(self, key):
+        variants = self.entries.pop(key, None)
+        if variants:
+            self.size -= sum(item.size for item in variants.values())
+
+    def clear(self):
+        self.entries.clear()
+        self.size = 0
+
+
+class DiskStore(object):
+    ''' sqlite table, evict least recently used by size '''
+    def __init__(self, path, max_size=256 * 1024 * 1024):
+        dir_path = os.path.dirname(path)
+        if dir_path and not os.path.exists(dir_path):
+            os.makedirs(dir_path)
+        self.path = path
+        self.max_size = max_size
+        self.conn = sqlite3.connect(path, isolation_level=None, check_same_thread=False)
+        self.conn.executescript('''
+CREATE TABLE IF NOT EXISTS http_cache (
+    key           TEXT NOT NULL,
+    variant       TEXT NOT NULL,
+    vary          TEXT,
+    url           TEXT,
+    status_code   INTEGER,
+    headers       TEXT,
+    content       BLOB,
+    request_time  REAL,
+    response_time REAL,
+    size          INTEGER,
+    access_time   REAL,
+    PRIMARY KEY (key, variant)
+);
+CREATE INDEX IF NOT EXISTS http_cache_access ON http_cache (access_time);
+''')
+        self.size = self.conn.execute("SELECT COALESCE(SUM(size), 0) FROM http_cache").fetchone()[0]
+
+    def get(self, key):
+        rows = self.conn.execute(
+            "SELECT key, variant, vary, url, status_code, headers, content, request_time, response_time"
+            " FROM http_cache WHERE key=?", (key,)
+        ).fetchall()
+        if not rows:
+            return None
+        self.conn.execute("UPDATE http_cache SET access_time=? WHERE key=?", (time.time(), key))
+        variants = {}
+        for key, variant, vary, url, status_code, headers, content, request_time, response_time in rows:
+            variants.update({variant: CacheEntry(
+                key, variant, vary.split(",") if vary else [], url, status_code,
+                Headers(headers.split("\r\n") if headers else []), bytes(content), request_time, response_time,
+            )})
+        return variants
+
+    def set(self, entry):
+        row = self.conn.execute(
+            "SELECT size FROM http_cache WHERE key=? AND variant=?", (entry.key, entry.variant)
+        ).fetchone()
+        if row:
+            self.size -= row[0]
+        self.conn.execute(
+            "INSERT OR REPLACE INTO http_cache"
+            " (key, variant, vary, url, status_code, headers, content, request_time, response_time, size, access_time)"
+            " VALUES(?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (
+                entry.key, entry.variant, ",".join(entry.vary), entry.url, entry.status_code,
+                "\r\n".join(entry.headers.lines), entry.content, entry.request_time, entry.response_time,
+                entry.size, time.time(),
+            ),
+        )
+        self.size += entry.size
+        if self.size > self.max_size:
+            self.evict()
+
+    def evict(self):
+        # remove oldest access until 90% of max size, not evict on every set
+        target = self.max_size * 0.9
+        removed = []
+        for key, variant, size in self.conn.execute(
+            "SELECT key, variant, size FROM http_cache ORDER BY access_time"
+        ):
+            if self.size <= target:
+                break
+            removed.append((key, variant))
+            self.size -= size
+        self.conn.executemany("DELETE FROM http_cache WHERE key=? AND variant=?", removed)
+
+    def delete(self, key):
+        self.conn.execute("DELETE FROM http_cache WHERE key=?", (key,))
+        self.size = self.conn.execute("SELECT COALESCE(SUM(size), 0) FROM http_cache").fetchone()[0]
+
+    def clear(self):
+        self.conn.execute("DELETE FROM http_cache")
+        self.size = 0
+
+    def close(self):
+        if self.conn:
+            self.conn.close()
+            self.conn = None
+
+
+class HttpCache(object):
+    ''' usage:
+            session.set_http_cache(path)        # memory and disk
+            session.http_cache = HttpCache()    # memory only
+    '''
+    def __init__(self, path=None, memory_size=32 * 1024 * 1024, disk_size=256 * 1024 * 1024):
+        self.memory = MemoryStore(memory_size)
+        self.disk = DiskStore(path, disk_size) if path else None
+        self.lock = threading.Lock()
+
+    def get_key(self, method, url):
+        return "{0} {1}".format(method.upper(), url.split("#")[0])
+
+    def get_variant(self, vary, request_headers):
+        # value of request headers named in Vary, header names are lower case in Session
+        return "\n".join(
+            "{0}={1}".format(name, " ".join(str(request_headers.get(name, "")).split())) for name in vary
+        )
+
+    def lookup(self, method, url, request_headers):
+        ''' return CacheEntry match Vary, fresh or not, or None '''
+        if method.upper() != "GET":
+            return None
+        if "no-store" in parse_cache_control(request_headers.get("cache-control")):
+            return None
+        key = self.get_key(method, url)
+        with self.lock:
+            variants = self.memory.get(key)
+            if variants is None and self.disk is not None:
+                variants = self.disk.get(key)
+                if variants:
+                    for entry in variants.values():
+                        self.memory.set(entry)
+            if not variants:
+                return None
+            for entry in variants.values():
+                if entry.variant == self.get_variant(entry.vary, request_headers):
+                    return entry
+        return None
+
+    def is_cacheable(self, method, request_headers, response):
+        # https://www.rfc-editor.org/rfc/rfc9111#section-3
+        if method.upper() != "GET" or response.status_code not in CACHEABLE_STATUS:
+            return False
+        if "no-store" in parse_cache_control(request_headers.get("cache-control")):
+            return False
+        cache_control = parse_cache_control(", ".join(response.headers.getlist("cache-control")))
+        if "no-store" in cache_control:
+            return False
+        if "*" in response.headers.get("vary", ""):
+            return False
+        if "authorization" in request_headers and not (
+            "public" in cache_control or "must-revalidate" in cache_control or "s-maxage" in cache_control
+        ):
+            return False
+        # something to decide freshness or to revalidate
+        return (
+            "max-age" in cache_control
+            or "expires" in response.headers
+            or "etag" in response.headers
+            or "last-modified" in response.headers
+        )
+
+    def store(self, method, url, request_headers, response, request_time, response_time=None):
+        ''' store response if cacheable, return CacheEntry or None '''
+        if not self.is_cacheable(method, request_headers, response):
+            return None
+        vary = []
+        for value in response.headers.getlist("vary"):
+            vary.extend(name.strip().lower() for name in value.split(",") if name.strip())
+        headers = Headers([
+            line for line in response.headers if line.split(":", 1)[0].strip().lower() not in SKIP_HEADERS
+        ])
+        entry = CacheEntry(
+            self.get_key(method, url), self.get_variant(vary, request_headers), vary,
+            response.url, response.status_code, headers, response.content_bytes,
+            request_time, response_time or time.time(),
+        )
+        self.save(entry)
+        return entry
+
+    def save(self, entry):
+        with self.lock:
+            self.memory.set(entry)
+            if self.disk is not None:
+                self.disk.set(entry)
+
+    def revalidate(self, entry, response, request_time, response_time=None):
+        ''' response is 304, update headers of entry and save it.
+            https://www.rfc-editor.org/rfc/rfc9111#section-4.3.4
+        '''
+        names = set(
+            line.split(":", 1)[0].strip().lower() for line in response.headers
+        ) - set(SKIP_HEADERS + ["content-length"])
+        lines = [line for line in entry.headers if line.split(":", 1)[0].strip().lower() not in names]
+        lines.extend(line for line in response.headers if line.split(":", 1)[0].strip().lower() in names)
+        entry = CacheEntry(
+            entry.key, entry.variant, entry.vary, entry.url, entry.status_code, Headers(lines), entry.content,
+            request_time, response_time or time.time(),
+        )
+        self.save(entry)
+        return entry
+
+    def invalidate(self, url):
+        ''' unsafe method, e.g. POST, PUT, DELETE, invalidate cached GET of url '''
+        key = self.get_key("GET", url)
+        with self.lock:
+            self.memory.delete(key)
+            if self.disk is not None:
+                self.disk.delete(key)
+
+    def clear(self):
+        with self.lock:
+            self.memory.clear()
+            if self.disk is not None:
+                self.disk.clear()
+
+    def close(self):
+        if self.disk is not None:
+            self.disk.close()
@@ -9,27 +9,129 @@ from copy import deepcopy
 from urllib.parse import urlparse, urljoin, unquote, quote
 
 
+# <meta charset="gbk"> or <meta http-equiv="Content-Type" content="text/html; charset=gbk">
+META_CHARSET = re.compile(rb"""<meta[^>]+?charset\s*=\s*["']?\s*([\w.:-]+)""", re.I)
+META_CHARSET_SNIFF_SIZE = 4096
+
+
 class Response(object):
+    __slots__ = (
+        "_headers", "url", "status_code", "_content", "_content_io", "_text", "_encoding",
+        "_charset_in_response", "content_type", "cookies", "request", "meta", "session", "timings",
+        "from_cache",
+    )
+
     def __init__(self, session=None):
-        self.headers = []
+        self._headers = Headers()
         self.url = None
         self.status_code = None
-        self.content = BytesIO()
-        self.text = ""
+        self._content = b""         # body bytes
+        self._content_io = None     # BytesIO, create when response.content is used
+        self._text = ""             # None means not decoded yet
+        self._encoding = None
+        self._charset_in_response = None
         self.content_type = ""
-        self.encoding = None
         self.cookies = CookieJar()
         self.request = {}
         self.meta = {}
         self.session = session
+        self.timings = Timings()
+        self.from_cache = False
 
     def __del__(self):
         self.headers.clear()
-        self.content.seek(0)
-        self.content.truncate()
+        self._content = b""
+        self._content_io = None
+        self._text = ""
         self.cookies.clear()
         self.request.clear()
-        self.meta.clear()
+        # meta may be shared with request, e.g. Request(url, meta=response.meta), do not clear
+        self.meta = None
+
+    @property
+    def headers(self):
+        return self._headers
+
+    @headers.setter
+    def headers(self, value):
+        # list of "Name: value" still works, index it
+        self._headers = value if isinstance(value, Headers) else Headers(value)
+
+    @property
+    def content(self):
+        # BytesIO(bytes) share memory with bytes until it is written, no copy here
+        if self._content_io is None:
+            self._content_io = BytesIO(self._content)
+        return self._content_io
+
+    @content.setter
+    def content(self, value):
+        if isinstance(value, BytesIO):
+            self._content = b""
+            self._content_io = value
+        else:
+            self._content = value if isinstance(value, bytes) else bytes(value or b"")
+            self._content_io = None
+
+    @property
+    def content_bytes(self):
+        if self._content_io is not None:
+            # no copy if BytesIO not written
+            return self._content_io.getvalue()
+        return self._content
+
+    @property
+    def content_view(self):
+        return memoryview(self.content_bytes)
+
+    @property
+    def text(self):
+        if self._text is None:
+            self._decode()
+        return self._text
+
+    @text.setter
+    def text(self, value):
+        self._text = value
+
+    @property
+    def encoding(self):
+        if self._text is None:
+            self._decode()
+        return self._encoding
+
+    @encoding.setter
+    def encoding(self, value):
+        # set before response.text is used, decode with it first
+        self._encoding = value
+
+    def set_lazy_text(self, charset_in_response=None):
+        self._charset_in_response = charset_in_response
+        self._text = None
+
+    def _sniff_charset(self, body):
+        # only look at the beginning, meta charset should be in <head>
+        match = META_CHARSET.search(body, 0, META_CHARSET_SNIFF_SIZE)
+        if match:
+            return match.group(1).decode("ascii", "ignore").lower()
+        return None
+
+    def _decode(self):
+        body = self.content_bytes
+        charset_in_html = None
+        if "text" in self.content_type and len(body) > 0:
+            charset_in_html = self._sniff_charset(body)
+        for charset in [self._encoding, charset_in_html, self._charset_in_response, "utf-8"]:
+            if charset is None:
+                continue
+            try:
+                self._text = body.decode(charset)
+                self._encoding = charset
+                return
+            except (UnicodeDecodeError, LookupError):
+                continue
+        self._text = ""
+        self._encoding = "unkown"
 
     def xpath(self, xpath):
         if self.text == "":
@@ -70,6 +172,19 @@ class Response(object):
         return self.status_code
 
     def json(self):
+        if (self._text is None
+            and self._encoding is None
+            and self._charset_in_response in [None, "utf-8", "utf8"]
+        ):
+            # json.loads() detect utf-8/16/32 from bytes, no need to decode text
+            body = self.content_bytes
+            if not body:
+                return ""
+            try:
+                return json.loads(body)
+            except UnicodeDecodeError:
+                # not utf-8, decode text like response.text
+                pass
         if self.text:
             try:
                 result = json.loads(self.text)
@@ -160,16 +275,8 @@ class Response(object):
         return form_data
 
     def get_header(self, item):
-        value = ""
-        if self.headers is None: return value
-        for header in reversed(self.headers):
-            if ":" not in header:
-                continue
-            key, val = header.split(":", 1)
-            if key.lower() == item.lower():
-                value = val.strip()
-                break
-        return value
+        # last one if header appear multiple times
+        return self.headers.get(item, "")
 
     def save(self, path, encoding="utf-8"):
         dir_path_exists = True
@@ -177,14 +284,13 @@ class Response(object):
         if dir_path == "": dir_path = "./"
         if not os.path.exists(dir_path):
             dir_path_exists = False
-        if self.content:
-            self.content.seek(0)
-        nbytes = self.content.getbuffer().nbytes
+        content = self.content_bytes
+        nbytes = len(content)
         if nbytes > 0:
             if not dir_path_exists:
                 os.makedirs(dir_path)
             with open(path, "wb") as f:
-                f.write(self.content.getvalue())
+                f.write(content)
                 return nbytes
         elif self.text:
             if not dir_path_exists:
@@ -196,7 +302,68 @@ class Response(object):
         return 0
 
 
+class Timings(object):
+    ''' timing of last transfer from curl getinfo, seconds from start.
+        phases: dns, connect, tls, server(wait for first byte), transfer
+    '''
+    __slots__ = (
+        "namelookup", "connect", "appconnect", "pretransfer", "starttransfer", "total",
+        "size_download", "speed_download", "num_connects",
+    )
+
+    def __init__(self, namelookup=0, connect=0, appconnect=0, pretransfer=0, starttransfer=0, total=0,
+        size_download=0, speed_download=0, num_connects=0,
+    ):
+        self.namelookup = namelookup
+        self.connect = connect
+        self.appconnect = appconnect        # 0 if not https
+        self.pretransfer = pretransfer
+        self.starttransfer = starttransfer
+        self.total = total
+        self.size_download = size_download
+        self.speed_download = speed_download
+        self.num_connects = num_connects    # 0 if connection reused
+
+    @property
+    def dns(self):
+        return self.namelookup
+
+    @property
+    def tcp(self):
+        return max(0, self.connect - self.namelookup)
+
+    @property
+    def tls(self):
+        return max(0, self.appconnect - self.connect) if self.appconnect else 0
+
+    @property
+    def server(self):
+        return max(0, self.starttransfer - self.pretransfer)
+
+    @property
+    def transfer(self):
+        return max(0, self.total - self.starttransfer)
+
+    def phases(self):
+        return {
+            "dns": self.dns,
+            "connect": self.tcp,
+            "tls": self.tls,
+            "server": self.server,
+            "transfer": self.transfer,
+            "total": self.total,
+        }
+
+    def to_dict(self):
+        return {k: getattr(self, k) for k in self.__slots__}
+
+    def __repr__(self):
+        return "Timings({0})".format(", ".join("{0}={1}".format(k, getattr(self, k)) for k in self.__slots__))
+
+
 class Selector(object):
+    __slots__ = ("lst", "text", "ele", "type")
+
     def __init__(self, default=None, text="", ele=None):
         self.lst = []
         self.text = text
@@ -346,6 +513,8 @@ class Selector(object):
 
 
 class CookieItem:
+    __slots__ = ("name", "value", "domain", "path", "expires")
+
     def __init__(self, name, value, domain, path, expires) -> None:
         self.name = name
         self.value = value
@@ -405,4 +574,80 @@ class CookieJar:
         raise StopIteration
 
     def __repr__(self):
-        return json.dumps([str(item) for item in self.data])
\ No newline at end of file
+        return json.dumps([str(item) for item in self.data])
+
+class Headers:
+    ''' response headers.
+        iterate, index and len() work on raw lines "Name: value" like a list,
+        get(), getlist() and "name" in headers is case-insensitive lookup by name,
+        the name index is built when first used.
+    '''
+    def __init__(self, lines=None) -> None:
+        self.lines = list(lines) if lines else []
+        self._index = None  # {lower name: [value]}
+
+    @property
+    def index(self):
+        if self._index is None:
+            index = {}
+            for line in self.lines:
+                name, sep, value = line.partition(":")
+                if sep:
+                    name = name.strip().lower()
+                    if name in index:
+                        index[name].append(value.strip())
+                    else:
+                        index[name] = [value.strip()]
+            self._index = index
+        return self._index
+
+    def append(self, line):
+        self.lines.append(line)
+        if self._index is not None and ":" in line:
+            name, value = line.split(":", 1)
+            name = name.strip().lower()
+            if name in self._index:
+                self._index[name].append(value.strip())
+            else:
+                self._index.update({name: [value.strip()]})
+
+    def extend(self, lines):
+        for line in lines:
+            self.append(line)
+
+    def clear(self):
+        self.lines.clear()
+        self._index = None
+
+    def get(self, name, default=None):
+        values = self.index.get(name.lower())
+        return values[-1] if values else default
+
+    def getlist(self, name):
+        return list(self.index.get(name.lower(), []))
+
+    def items(self):
+        for line in self.lines:
+            if ":" in line:
+                name, value = line.split(":", 1)
+                yield name.strip(), value.strip()
+
+    def __contains__(self, name):
+        return name.lower() in self.index
+
+    def __getitem__(self, key):
+        if isinstance(key, str):
+            values = self.index.get(key.lower())
+            if not values:
+                raise KeyError(key)
+            return values[-1]
+        return self.lines[key]
+
+    def __len__(self):
+        return len(self.lines)
+
+    def __iter__(self):
+        return iter(self.lines)
+
+    def __repr__(self):
+        return repr(self.lines)
@@ -8,38 +8,95 @@ import json as m_json
 import time
 import tempfile
 import uuid
+from functools import lru_cache
 from datetime import datetime
-from io import BytesIO
 from urllib.parse import urlparse, urlencode, urljoin, unquote, quote
 from urllib.parse import ParseResult, urlunparse
 from pycurl_session.cache import CacheDB
-from pycurl_session.response import Response
+from pycurl_session.httpcache import HttpCache
+from pycurl_session.response import Response, Headers, Timings
 from pycurl_session.auth import HTTPAUTH, HTTPAUTH_BASIC
 
 import logging
 
 logger = logging.getLogger("pycurl_session")
 
+# {path: bytes}, CA bundle read once in process, for CAINFO_BLOB
+_CA_BLOBS = {}
+
+
+def reconstruct_url(url_info, params=None, quote_safe=""):
+    netloc = url_info.netloc
+    scheme = url_info.scheme.lower()
+
+    if url_info.username:
+        netloc = netloc.split("@")[-1]
+
+    query = url_info.query if url_info.query else ""
+    if params:
+        if isinstance(params, dict):
+            params = "&".join(["{0}={1}".format(k, v) for k, v in params.items()])
+        query = query + "&" + params if query else params
+    if query:
+        _tmp = []
+        for pair in query.split("&"):
+            kv = pair.split("=", 1)
+            if len(kv) == 2:
+                _tmp.append((kv[0], unquote(kv[1])))
+            else:
+                _tmp.append((kv, ""))
+        query = urlencode(_tmp, safe=quote_safe)
+    return urlunparse(ParseResult(
+        scheme,
+        netloc,
+        quote(unquote(url_info.path)),
+        quote(unquote(url_info.params), safe="=;,"),    # rfc3986 3.3. Path
+        query,
+        quote(unquote(url_info.fragment))
+    ))
+
+
+@lru_cache(maxsize=4096)
+def normalize_url(url, params=None, quote_safe=""):
+    ''' return (urlparse(url), reconstruct_url()), cached for repeated url, e.g. api, redirect and retry.
+        params: str or None
+    '''
+    url_info = urlparse(url)
+    return url_info, reconstruct_url(url_info, params, quote_safe)
+
 
 class HeaderHandler(object):
+    ''' header lines are collected as raw bytes by `callback` (list.append, no python frame per line),
+        decoded and parsed to Headers at once when headers is used
+    '''
     def __init__(self) -> None:
-        self.headers = []
+        self.lines = []
+        self.callback = self.lines.append
+        self._headers = None
 
     def write(self, header_line):
-        header_line = header_line.decode("iso-8859-1")
-        if ":" in header_line:
-            self.headers.append(header_line.strip())
+        self.lines.append(header_line)
+
+    @property
+    def headers(self):
+        if self._headers is None:
+            text = b"".join(self.lines).decode("iso-8859-1")
+            self._headers = Headers([line.strip() for line in text.split("\n") if ":" in line])
+        return self._headers
 
     def clear(self):
-        self.headers.clear()
+        # same list for callback, headers of last response is owned by Response
+        self.lines.clear()
+        self._headers = None
 
 class BodyHandler(object):
     def __init__(self) -> None:
         self.data = []
+        # note: if use ByteIO.write, there is a small chance, data missing(reset?) and size 0,
+        # so use list.append here. list is reused, bound method is created once
+        self.callback = self.data.append
 
     def write(self, chunk):
-        # note: if use ByteIO.write, there is a small chance, data missing(reset?) and size 0,
-        # so use list.append here.
         self.data.append(chunk)
         return None
 
@@ -47,8 +104,202 @@ class BodyHandler(object):
         self.data.clear()
 
     def get_data(self):
+        if len(self.data) == 1:
+            # one chunk, no copy
+            return self.data[0]
         return b"".join(self.data)
 
+class CurlHandle(pycurl.Curl):
+    ''' pycurl.Curl remember the options, for reuse without reset().
+            setopt between begin() and commit() is collected, commit() only set the changed ones,
+            and unset the ones set last time but not this time.
+            setopt out of begin() and commit() (redirect, http version, ...) is set at once if changed.
+        methods options (POST, HTTPGET, NOBODY, CUSTOMREQUEST, ...) affect each other in libcurl,
+        set all of them again if one is changed.
+    '''
+    METHOD_OPTIONS = {
+        pycurl.POST, pycurl.HTTPGET, pycurl.NOBODY, pycurl.CUSTOMREQUEST, pycurl.POSTFIELDS, pycurl.HTTPPOST,
+    }
+    # keep when not set this time, same result to request
+    STICKY_OPTIONS = {
+        pycurl.CAINFO, getattr(pycurl, "CAINFO_BLOB", pycurl.CAINFO), pycurl.SSL_VERIFYPEER, pycurl.SSL_VERIFYHOST, pycurl.SSL_CIPHER_LIST,
+        pycurl.HTTP_VERSION, pycurl.FRESH_CONNECT, pycurl.SHARE,
+    }
+    # unsetopt() not support these, set to default value
+    DEFAULT_VALUES = {
+        pycurl.IPRESOLVE: pycurl.IPRESOLVE_WHATEVER,
+        pycurl.PROXYTYPE: pycurl.PROXYTYPE_HTTP,
+        pycurl.PROXYPORT: 0,
+        pycurl.HTTPAUTH: pycurl.HTTPAUTH_BASIC,
+    }
+    KEEP_OPTIONS = METHOD_OPTIONS | STICKY_OPTIONS
+    MISSING = object()
+
+    def __init__(self):
+        super().__init__()
+        self.options = {}       # {option: value} set to libcurl
+        self.pending = None     # {option: value} between begin() and commit()
+        self.setopt_count = 0   # setopt/unsetopt call to libcurl
+        self.reset_count = 0
+
+    def setopt(self, option, value):
+        if option in self.METHOD_OPTIONS:
+            # e.g. redirect, CUSTOMREQUEST of last method stays in libcurl if only forgotten here
+            self._reset_method()
+            self._setopt(option, value)
+        elif self.options.get(option, self.MISSING) != value:
+            self._setopt(option, value)
+
+    def _setopt(self, option, value):
+        super().setopt(option, value)
+        self.options[option] = value
+        self.setopt_count += 1
+
+    def _unsetopt(self, option):
+        if option in self.DEFAULT_VALUES:
+            super().setopt(option, self.DEFAULT_VALUES[option])
+        else:
+            super().unsetopt(option)
+        self.options.pop(option)
+        self.setopt_count += 1
+
+    def reset(self):
+        super().reset()
+        self.options.clear()
+        self.reset_count += 1
+
+    def begin(self):
+        self.pending = {}
+        # setopt is called ~20 times in prepare_curl_handle, collect by dict directly
+        self.__dict__["setopt"] = self.pending.__setitem__
+
+    def commit(self):
+        pending, self.pending = self.pending, None
+        self.__dict__.pop("setopt", None)
+        options = self.options
+        try:
+            for option in options.keys() - pending.keys() - self.KEEP_OPTIONS:
+                self._unsetopt(option)
+        except TypeError:
+            # unsetopt() not support, e.g. REFERER, reset and set again
+            sticky = {k: v for k, v in options.items() if k in self.STICKY_OPTIONS}
+            self.reset()
+            pending = {**sticky, **pending}
+        method = [(k, v) for k, v in pending.items() if k in self.METHOD_OPTIONS]
+        if len(method) != len(self.METHOD_OPTIONS & options.keys()) or any(
+            options.get(k, self.MISSING) != v for k, v in method
+        ):
+            self._reset_method()
+            for option, value in method:
+                self._setopt(option, value)
+        for option, value in pending.items():
+            if options.get(option, self.MISSING) != value:
+                self._setopt(option, value)
+
+    def apply(self, options):
+        # set options like a begin() - commit(), e.g. options saved from pending
+        self.pending = dict(options)
+        self.commit()
+
+    def _reset_method(self):
+        # back to GET, the default of new handle
+        method = self.METHOD_OPTIONS & self.options.keys()
+        if not method:
+            return
+        if self.options.get(pycurl.NOBODY):
+            super().setopt(pycurl.NOBODY, 0)
+            self.setopt_count += 1
+        for option in [pycurl.CUSTOMREQUEST, pycurl.HTTPPOST]:
+            if option in method:
+                super().unsetopt(option)
+                self.setopt_count += 1
+        super().setopt(pycurl.HTTPGET, 1)
+        self.setopt_count += 1
+        for option in method:
+            self.options.pop(option)
+
+class PreparedRequest(object):
+    ''' request prepared once by Session.prepare(), send many times.
+            url, headers, cookies, auth, proxy and curl options are computed once, saved in `options`,
+            send() only set the options changed since last send.
+            send(params=, data=, json=, files=) change the query or body of this time.
+        cookies are prepared again if the cookies of session changed.
+    '''
+    def __init__(self, session, method, url, **args):
+        self.session = session
+        self.method = method.upper()
+        self.url = url
+        self.args = args
+        self.c = CurlHandle()
+        self.options = {}
+        self.request = {}
+        self.headers = {}
+        self.url_info = None
+        self.cookie_version = None
+        self.body_kind = self.get_body_kind(args.get("data"), args.get("json"), args.get("files"))
+        # content-type from headers of session or prepare(), not set by body
+        self.content_type_given = "content-type" in {
+            key.lower().strip() for key in list(session.headers) + list(args.get("headers") or {})
+        }
+        self.prepare()
+
+    def get_body_kind(self, data, json, files):
+        if files is not None or self.args.get("multipart", False):
+            return "multipart"
+        if json is not None:
+            return "json"
+        if data is not None:
+            return "data"
+        return None
+
+    def prepare(self):
+        session = self.session
+        c = session.prepare_curl_handle(self.method, self.url, c=self.c, **self.args)
+        self.options = dict(c.options)
+        self.request = dict(c.request)
+        self.headers = self.request.pop("headers")
+        # send(params=) replace the params of prepare
+        self.url_info = urlparse(self.url)
+        self.cookie_version = (session.cookie_db, session.cookie_db.version)
+
+    def send(self, params=None, data=None, json=None, files=None):
+        session = self.session
+        if self.cookie_version != (session.cookie_db, session.cookie_db.version):
+            self.prepare()
+        c = self.c
+        c.request = dict(self.request)
+        c.header_handler.clear()
+        c.body_handler.clear()
+        c.retry = 0
+        headers = dict(self.headers)
+        if params is None and data is None and json is None and files is None:
+            c.apply(self.options)
+        else:
+            c.begin()
+            c.pending.update(self.options)
+            if params is not None:
+                url = session.reconstruct_url(self.url_info, params, quote_safe=self.args.get("quote_safe", ""))
+                c.request.update({"url": url})
+                c.setopt(c.URL, url)
+            if data is not None or json is not None or files is not None:
+                for option in CurlHandle.METHOD_OPTIONS:
+                    c.pending.pop(option, None)
+                if (not self.content_type_given
+                    and self.get_body_kind(data, json, files) != self.body_kind
+                ):
+                    # e.g. application/json of prepare(json=), send(data=) is form
+                    headers.pop("content-type", None)
+                session._prepare_request_body(
+                    c, self.method, headers, data=data, json=json, files=files,
+                    multipart=self.args.get("multipart", False),
+                )
+                if headers != self.headers:
+                    session.set_request_headers(c, headers)
+            c.commit()
+        c.request.update({"headers": headers})
+        session.set_http_version(c)
+        return session.send(c)
+
 class Session(object):
     def __init__(self, session_id=None, store_cookie=True):
         if session_id:
@@ -67,7 +318,7 @@ class Session(object):
             self.cookie_db_path = ":memory:"
         self.cookie_db = CacheDB(self.cookie_db_path)
 
-        self.c = pycurl.Curl()
+        self.c = CurlHandle()
         self.version_info = pycurl.version_info()
 
         # direct set
@@ -79,6 +330,7 @@ class Session(object):
         self.simulate_fetch = False
         # (string) one of [1_0, 1.0, 1_1, 1.1, 2, 2_0, 2.0, 2TLS, 2_PRIOR_KNOWLEDGE, 3, 3_0, 3.0, 3ONLY]
         self.http_version = None    # None for default
+        self.http_cache = None      # HttpCache, None for disable
 
         # set by function
         self._max_retry_times = 3
@@ -90,10 +342,13 @@ class Session(object):
         self._ssl_cipher_list = None # "ALL:!EXPORT:!EXPORT40:!EXPORT56:!aNULL:!LOW:!RC4:@STRENGTH"
         self._verify = True
         self._verbose = False
+        self._ca_blob = None    # True - CAINFO_BLOB, False - CAINFO, None - auto by libcurl
 
         # private
         self._fh = None
         self._hv = self.get_http_version()
+        if self._ca_blob is None:
+            self._ca_blob = self.get_ca_blob_enabled()
 
     def get_http_version(self):
         # https://curl.se/libcurl/c/CURLOPT_HTTP_VERSION.html
@@ -105,6 +360,26 @@ class Session(object):
         else:
             return pycurl.CURL_HTTP_VERSION_1_1
 
+    def get_ca_blob_enabled(self):
+        # https://curl.se/libcurl/c/CURLOPT_CA_CACHE_TIMEOUT.html
+        # libcurl 7.87.0+ with OpenSSL keep the parsed CAINFO in memory (per multi handle) and reuse it,
+        # CAINFO_BLOB is not cached and parsed for every connection, so CAINFO is better.
+        # older libcurl parse CAINFO file for every connection, load it in memory once, use CAINFO_BLOB(7.77.0+)
+        if not hasattr(pycurl, "CAINFO_BLOB") or self.version_info[2] < 0x074d00:
+            return False
+        ssl_version = self.version_info[5] or ""
+        if self.version_info[2] >= 0x075700 and ssl_version.split("/")[0] in ["OpenSSL", "LibreSSL", "BoringSSL", "quictls", "AWS-LC"]:
+            return False
+        return True
+
+    def load_ca_blob(self, path):
+        blob = _CA_BLOBS.get(path)
+        if blob is None:
+            with open(path, "rb") as f:
+                blob = f.read()
+            _CA_BLOBS.update({path: blob})
+        return blob
+
     def set_http_version(self, c, http_version=None):
         hv = http_version or self.http_version
         if c.hv != hv:
@@ -133,6 +408,13 @@ class Session(object):
         self.cookie_db_path = cookie_db_path
         self.cookie_db = CacheDB(self.cookie_db_path)
 
+    def set_http_cache(self, path=None, memory_size=32 * 1024 * 1024, disk_size=256 * 1024 * 1024):
+        # path: sqlite file of disk cache, None for memory only
+        if self.http_cache is not None:
+            self.http_cache.close()
+        self.http_cache = HttpCache(path, memory_size=memory_size, disk_size=disk_size)
+        return self.http_cache
+
     def set_logger(self, log_path=None):
         if log_path:
             dir_path = os.path.dirname(log_path)
@@ -169,6 +451,10 @@ class Session(object):
     def delete(self, url, **args):
         return self.request("DELETE", url=url, **args)
 
+    def prepare(self, method, url, **args):
+        ''' return PreparedRequest, args same as request() '''
+        return PreparedRequest(self, method, url, **args)
+
     def request(self, method, url, **args):
         c = self.c
         if "c" in args:
@@ -185,8 +471,21 @@ class Session(object):
             if c.retry > c.max_retry_times:
                 break
             try:
+                entry = None
+                if self.http_cache is not None:
+                    entry = self.http_cache.lookup(c.request["method"], c.request["url"], c.request["headers"])
+                    if entry is not None and entry.is_fresh(c.request["headers"]):
+                        self._response_from_cache(c, response, entry)
+                        logger.info("({0}) <{1} {2}> from cache".format(
+                            response.status_code, c.request["method"], c.request["url"]
+                        ))
+                        break
+                    self._set_conditional_headers(c, entry)
+                request_time = time.time()
                 c.perform()
                 self.gather_response(c, response)
+                if self.http_cache is not None:
+                    self._process_http_cache(c, response, entry, request_time)
                 if response.status_code in self.redirect_http_codes and c.allow_redirects:
                     self._response_redirect(c, response.status_code, logger_handle=logger)
                     continue
@@ -247,35 +546,15 @@ class Session(object):
 
 
     def reconstruct_url(self, url_info, params=None, quote_safe=""):
-        netloc = url_info.netloc
-        scheme = url_info.scheme.lower()
-
-        if url_info.username:
-            netloc = netloc.split("@")[-1]
-
-        query = url_info.query if url_info.query else ""
-        if params:
-            if isinstance(params, dict):
-                params = "&".join(["{0}={1}".format(k, v) for k, v in params.items()])
-            query = query + "&" + params if query else params
-        if query:
-            _tmp = []
-            for pair in query.split("&"):
-                kv = pair.split("=", 1)
-                if len(kv) == 2:
-                    _tmp.append((kv[0], unquote(kv[1])))
-                else:
-                    _tmp.append((kv, ""))
-            query = urlencode(_tmp, safe=quote_safe)
-        return urlunparse(ParseResult(
-            scheme,
-            netloc,
-            quote(unquote(url_info.path)),
-            quote(unquote(url_info.params), safe="=;,"),    # rfc3986 3.3. Path
-            query,
-            quote(unquote(url_info.fragment))
-        ))
+        return reconstruct_url(url_info, params, quote_safe)
 
+    def normalize_url(self, url, params=None, quote_safe=""):
+        ''' return (url_info, url) '''
+        if params is not None and not isinstance(params, str):
+            # dict, not hashable
+            url_info = urlparse(url)
+            return url_info, reconstruct_url(url_info, params, quote_safe)
+        return normalize_url(url, params or None, quote_safe)
 
     def prepare_curl_handle(
         # fmt: off
@@ -305,8 +584,11 @@ class Session(object):
                 hv: str
         '''
         if c is None:
-            c = pycurl.Curl()
+            c = CurlHandle()
         self.init_curl_var(c)
+        if isinstance(c, CurlHandle):
+            # only set the changed options at the end
+            c.begin()
         c.session_id = session_id if session_id else None
 
         # common setting
@@ -322,18 +604,17 @@ class Session(object):
         c.setopt(c.ENCODING, "")    # Important
         # c.setopt(c.ENCODING, "gzip,deflate")
         # c.setopt(c.HTTP_VERSION, pycurl.CURL_HTTP_VERSION_2)
-        c.setopt(c.HEADERFUNCTION, c.header_handler.write)
-        c.setopt(c.WRITEFUNCTION, c.body_handler.write)
+        c.setopt(c.HEADERFUNCTION, c.header_handler.callback)
+        c.setopt(c.WRITEFUNCTION, c.body_handler.callback)
 
         self._set_proxy(c, proxy)
         if cert:
             c.cert = cert
 
         # reconstruct url
-        url_info = urlparse(url)
+        url_info, url = self.normalize_url(url, params, quote_safe=quote_safe)
         domain = url_info.hostname
 
-        url = self.reconstruct_url(url_info, params, quote_safe=quote_safe)
         c.request.update({"url": url})
         c.setopt(c.URL, url)
 
@@ -379,7 +660,20 @@ class Session(object):
             request_headers.update({"cookie": cookie_str})
             c.setopt(pycurl.COOKIE, cookie_str)
 
-        ## data send
+        method = method.upper()
+        c.request.update({"method": method})
+        self._prepare_request_body(c, method, request_headers, data=data, json=json, files=files, multipart=multipart)
+
+        if self.simulate_fetch:
+            self._add_fetch_header(request_headers, url, method)
+        c.request.update({"headers": request_headers})
+        self.set_request_headers(c, request_headers)
+        if isinstance(c, CurlHandle):
+            c.commit()
+        return c
+
+    def _prepare_request_body(self, c, method, request_headers, data=None, json=None, files=None, multipart=False):
+        ## data send, set method and body, may add content-type in request_headers
         # for post:
         #   1. data
         #       accept one of:
@@ -406,8 +700,6 @@ class Session(object):
         # for get:
         #   params accept dict or raw_str
         json_data = json
-        method = method.upper()
-        c.request.update({"method": method})
         if method == "POST":
             c.setopt(c.POST, 1)
             if multipart or files is not None:
@@ -514,18 +806,12 @@ class Session(object):
         else:
             c.setopt(c.CUSTOMREQUEST, method)
 
-        if self.simulate_fetch:
-            self._add_fetch_header(request_headers, url, method)
-        c.request.update({"headers": request_headers})
-        headers_list = ["{0}: {1}".format("-".join(x.capitalize() for x in k.split("-")), v) for k, v in request_headers.items()]
-        c.setopt(c.HTTPHEADER, headers_list)
-        return c
-
     def gather_response(self, c, response):
         response.status_code = c.getinfo(pycurl.RESPONSE_CODE)
         response.headers = c.header_handler.headers
-        response.content = BytesIO(c.body_handler.get_data())
+        response.content = c.body_handler.get_data()
         response.url = c.getinfo(pycurl.EFFECTIVE_URL)
+        response.timings = self.get_timings(c)
         response.request.update(
             {
                 "url": c.request["url"],
@@ -533,14 +819,68 @@ class Session(object):
                 "headers": c.request["headers"],
             }
         )
-        self._response_decode(response)  # guess response.text
+        self._response_decode(response)  # response.text is decoded when used
         self.save_cookies(response, c.session_id)
 
+    def set_request_headers(self, c, request_headers):
+        # {"user-agent": "curl"} -> ["User-Agent: curl"]
+        headers_list = ["{0}: {1}".format("-".join(x.capitalize() for x in k.split("-")), v) for k, v in request_headers.items()]
+        c.setopt(c.HTTPHEADER, headers_list)
+
+    def _set_conditional_headers(self, c, entry):
+        # stale entry, validate with If-None-Match and If-Modified-Since.
+        # c.request["headers"] is not changed, validators are not sent after redirect
+        request_headers = c.request["headers"]
+        validators = entry.validators() if entry is not None else {}
+        validators = {k: v for k, v in validators.items() if k not in request_headers}
+        self.set_request_headers(c, dict(request_headers, **validators))
+
+    def _response_from_cache(self, c, response, entry):
+        entry.fill_response(response)
+        response.request.update(
+            {
+                "url": c.request["url"],
+                "cookies": c.request["cookies"],
+                "headers": c.request["headers"],
+            }
+        )
+        self._response_decode(response)
+
+    def _process_http_cache(self, c, response, entry, request_time):
+        method = c.request["method"]
+        url = c.request["url"]
+        if response.status_code == 304 and entry is not None:
+            # not modified, serve stored response with updated headers
+            entry = self.http_cache.revalidate(entry, response, request_time)
+            timings = response.timings
+            self._response_from_cache(c, response, entry)
+            response.timings = timings
+        elif method in ["GET", "HEAD", "OPTIONS", "TRACE"]:
+            self.http_cache.store(method, url, c.request["headers"], response, request_time)
+        elif response.status_code < 400:
+            # https://www.rfc-editor.org/rfc/rfc9111#section-4.4
+            self.http_cache.invalidate(url)
+
+    def get_timings(self, c):
+        return Timings(
+            namelookup=c.getinfo(pycurl.NAMELOOKUP_TIME),
+            connect=c.getinfo(pycurl.CONNECT_TIME),
+            appconnect=c.getinfo(pycurl.APPCONNECT_TIME),
+            pretransfer=c.getinfo(pycurl.PRETRANSFER_TIME),
+            starttransfer=c.getinfo(pycurl.STARTTRANSFER_TIME),
+            total=c.getinfo(pycurl.TOTAL_TIME),
+            # *_T since libcurl 7.55.0, old options are deprecated
+            size_download=c.getinfo(getattr(pycurl, "SIZE_DOWNLOAD_T", pycurl.SIZE_DOWNLOAD)),
+            speed_download=c.getinfo(getattr(pycurl, "SPEED_DOWNLOAD_T", pycurl.SPEED_DOWNLOAD)),
+            num_connects=c.getinfo(pycurl.NUM_CONNECTS),
+        )
+
     def _set_ssl(self, c):
-        if c.cert:
-            c.setopt(c.CAINFO, c.cert)
+        cafile = c.cert if c.cert else certifi.where()
+        if self._ca_blob:
+            c.setopt(c.CAINFO_BLOB, self.load_ca_blob(cafile))
         else:
-            c.setopt(c.CAINFO, certifi.where())
+            c.setopt(c.CAINFO, cafile)
         if c.verify and self._verify:
             c.setopt(c.SSL_VERIFYPEER, 1)
             c.setopt(c.SSL_VERIFYHOST, 2)
@@ -630,56 +970,52 @@ class Session(object):
             c.setopt(c.CUSTOMREQUEST, method)
 
         # check and update headers
-        for header in c.header_handler.headers:
-            if "location:" in header.lower():
-                url = header.split(":", 1)[1].strip()
-                url = urljoin(origin_url, url)
-                url_info = urlparse(url)
-                # reset url
-                url = self.reconstruct_url(url_info)
-                c.request.update({"url": url})
-                c.setopt(c.URL, url)
-                if url_info.scheme.lower() == "https":
-                    self._set_ssl(c)
-
-                domain = url_info.hostname
-                c.request["headers"].update({"host": domain})
-                request_headers = c.request["headers"]
-                # reset auth, if need
-                origin_url_info = urlparse(origin_url)
-                origin_domain = origin_url_info.hostname
-                if domain != origin_domain:
-                    if domain in self.auth:
-                        self.auth[domain].attach(c, url, request_headers)
-                    else:
-                        if url_info.username:
-                            auth = HTTPAUTH_BASIC(url_info.username, url_info.password)
-                            auth.attach(c, url, request_headers)
-                            self.auth.update({domain: auth})
-                # reset cookie
-                new_cookies = self.get_cookies(url, c.session_id)
-                if "cookie" in request_headers and origin_domain in domain:
-                    # when two domain is same or new domain is subdomain
-                    # add/update cookie in origin header
-                    # NOTE: not exactly correct
-                    cookies_in_header_str = request_headers.pop("cookie")
-                    for item in cookies_in_header_str.split(";"):
-                        kv = item.strip().split("=")
-                        if len(kv) == 2:
-                            new_cookies.update({kv[0]: kv[1]})
-                c.request.update({"cookies": new_cookies})
-                if new_cookies:
-                    # both work, but header first
-                    cookie_str = "; ".join(["{0}={1}".format(k, v) for k, v in new_cookies.items()])
-                    request_headers.update({"cookie": cookie_str})
-                    c.setopt(pycurl.COOKIE, cookie_str)
-                # reset header
-                if self.simulate_fetch:
-                    self._add_fetch_header(request_headers, url, method)
-                c.request.update({"headers": request_headers})
-                headers_list = ["{0}: {1}".format("-".join(x.capitalize() for x in k.split("-")), v) for k, v in request_headers.items()]
-                c.setopt(c.HTTPHEADER, headers_list)
-                break
+        location = c.header_handler.headers.getlist("location")
+        if location:
+            url = urljoin(origin_url, location[0])
+            # reset url
+            url_info, url = self.normalize_url(url)
+            c.request.update({"url": url})
+            c.setopt(c.URL, url)
+            if url_info.scheme.lower() == "https":
+                self._set_ssl(c)
+
+            domain = url_info.hostname
+            c.request["headers"].update({"host": domain})
+            request_headers = c.request["headers"]
+            # reset auth, if need
+            origin_url_info = urlparse(origin_url)
+            origin_domain = origin_url_info.hostname
+            if domain != origin_domain:
+                if domain in self.auth:
+                    self.auth[domain].attach(c, url, request_headers)
+                else:
+                    if url_info.username:
+                        auth = HTTPAUTH_BASIC(url_info.username, url_info.password)
+                        auth.attach(c, url, request_headers)
+                        self.auth.update({domain: auth})
+            # reset cookie
+            new_cookies = self.get_cookies(url, c.session_id)
+            if "cookie" in request_headers and origin_domain in domain:
+                # when two domain is same or new domain is subdomain
+                # add/update cookie in origin header
+                # NOTE: not exactly correct
+                cookies_in_header_str = request_headers.pop("cookie")
+                for item in cookies_in_header_str.split(";"):
+                    kv = item.strip().split("=")
+                    if len(kv) == 2:
+                        new_cookies.update({kv[0]: kv[1]})
+            c.request.update({"cookies": new_cookies})
+            if new_cookies:
+                # both work, but header first
+                cookie_str = "; ".join(["{0}={1}".format(k, v) for k, v in new_cookies.items()])
+                request_headers.update({"cookie": cookie_str})
+                c.setopt(pycurl.COOKIE, cookie_str)
+            # reset header
+            if self.simulate_fetch:
+                self._add_fetch_header(request_headers, url, method)
+            c.request.update({"headers": request_headers})
+            self.set_request_headers(c, request_headers)
 
         if logger_handle:
             logger_handle.info(
@@ -798,52 +1134,18 @@ class Session(object):
 
 
     def _response_decode(self, response):
-        content_type = ""
-        charset = None
+        # only parse Content-Type here, body is decoded when response.text is used
         charset_in_response = None
-        charset_in_html = None
-        for header in response.headers:
-            if "content-type:" in header.lower():
-                header_content = header.split(":")[1].lower()
-                if ";" in header_content:
-                    content_type = header_content.split(";")[0].strip()
-                else:
-                    content_type = header_content.strip()
-                response.content_type = content_type
-                for item in header_content.split(";"):
-                    if "charset=" in item:
-                        charset_in_response = item.replace("charset=", "").strip()
-                        if "," in charset_in_response:
-                            charset_in_response = charset_in_response.split(",")[0].strip()
-        if "text" in content_type:
-            response.text = response.content.getvalue()
-            if len(response.text) > 0:
-                charset_in_html = response.xpath("//head/meta[@charset]/@charset").get()
-                if charset_in_html is None:
-                    content = response.xpath(
-                        "//head/meta[contains(@content, 'charset=')]/@content"
-                    ).get()
-                    if content:
-                        for item in content.split(";"):
-                            if "charset=" in item:
-                                charset_in_html = item.replace("charset=", "").strip()
-                                if "," in charset_in_html:
-                                    charset_in_html = charset_in_html.split(",")[0].strip()
-
-        charset_decode = False
-        for charset in [charset_in_html, charset_in_response, "utf-8"]:
-            try:
-                if charset is None:
-                    continue
-                response.text = response.content.getvalue().decode(charset)
-                response.encoding = charset
-                charset_decode = True
-                break
-            except UnicodeDecodeError:
-                continue
-        if charset_decode == False:
-            response.text = ""
-            response.encoding = "unkown"
+        header_content = response.headers.get("content-type")
+        if header_content is not None:
+            header_content = header_content.lower()
+            response.content_type = header_content.split(";")[0].strip()
+            for item in header_content.split(";"):
+                if "charset=" in item:
+                    charset_in_response = item.replace("charset=", "").strip()
+                    if "," in charset_in_response:
+                        charset_in_response = charset_in_response.split(",")[0].strip()
+        response.set_lazy_text(charset_in_response)
 
 
     def _is_cors(self, url, headers):
@@ -951,66 +1253,64 @@ class Session(object):
         response.cookies.clear()
         params = []
         params_del = []
-        for item in response.headers:
-            header_name, header_value = item.split(":", 1)
-            if header_name.lower() == "set-cookie":
-                cookie_str = self.byte2str(header_value).strip()
-                # print(cookie_str)
-                cookie = cookie_str.split(";")
-                name = ""
-                value = ""
-                domain = ""
-                path = ""
-                expires = ""
-                for kv in cookie:
-                    kv = kv.strip()
-                    if kv.lower().startswith("path="):
-                        path = kv.split("=")[1].strip()
-                    elif kv.lower().startswith("domain="):
-                        domain = kv.split("=")[1].strip()
-                    elif kv.lower().startswith("expires="):
-                        if expires:  # max-age already
-                            continue
-                        expires = kv.split("=")[1].strip()
-                        expires_origin = expires
-                        expires = expires.replace("-", " ").replace("+", "").strip()
-                        if "," in expires:
-                            expires = expires[expires.find(",") + 1 :].strip()
-                        if "gmt" not in expires.lower():
-                            # not endswith('GMT'), endswith('0000')
-                            if len(expires.split(" ")[-1]) == 4:
-                                expires = expires[: -4].strip()
-                        else:
-                            expires = expires.replace("gmt", "").replace("GMT", "").strip()
-                        if len(expires.split(" ")[2]) == 2:
-                            dt_format = "%d %b %y %H:%M:%S"
-                        else:
-                            dt_format = "%d %b %Y %H:%M:%S"
-                        try:
-                            dt = datetime.strptime(expires, dt_format)
-                        except ValueError:
-                            logger.warning("Cannot format cookie expires: {}".format(expires_origin))
-                            expires = ""
-                            continue
-                        expires = int((dt - datetime(1970, 1, 1)).total_seconds())
-                    elif kv.lower().startswith("max-age="):
-                        expires = int(time.time()) + int(kv.split("=")[1].strip())
-                    elif kv.lower().startswith("version="):
+        for header_value in response.headers.getlist("set-cookie"):
+            cookie_str = self.byte2str(header_value).strip()
+            # print(cookie_str)
+            cookie = cookie_str.split(";")
+            name = ""
+            value = ""
+            domain = ""
+            path = ""
+            expires = ""
+            for kv in cookie:
+                kv = kv.strip()
+                if kv.lower().startswith("path="):
+                    path = kv.split("=")[1].strip()
+                elif kv.lower().startswith("domain="):
+                    domain = kv.split("=")[1].strip()
+                elif kv.lower().startswith("expires="):
+                    if expires:  # max-age already
                         continue
+                    expires = kv.split("=")[1].strip()
+                    expires_origin = expires
+                    expires = expires.replace("-", " ").replace("+", "").strip()
+                    if "," in expires:
+                        expires = expires[expires.find(",") + 1 :].strip()
+                    if "gmt" not in expires.lower():
+                        # not endswith('GMT'), endswith('0000')
+                        if len(expires.split(" ")[-1]) == 4:
+                            expires = expires[: -4].strip()
+                    else:
+                        expires = expires.replace("gmt", "").replace("GMT", "").strip()
+                    if len(expires.split(" ")[2]) == 2:
+                        dt_format = "%d %b %y %H:%M:%S"
                     else:
-                        kv_split = kv.split("=", 1)
-                        if len(kv_split) == 2 and cookie_str.startswith(kv_split[0]):
-                            name = kv_split[0].strip()
-                            value = kv_split[1].strip()
-                if domain == "":
-                    domain = default_domain
-                # only same domain or high domain
-                high_domain = domain[1:] if domain and domain[0] == "." else domain
-                if default_domain.endswith(high_domain):
-                    params.append((session_id, name, value, domain, path, expires))
-                    response.cookies.set_cookie(name, value, domain, path, expires)
-                    if value in ["delete"]:  # value = 'delete': delete this cookie
-                        params_del.append((session_id, name, domain, path))
+                        dt_format = "%d %b %Y %H:%M:%S"
+                    try:
+                        dt = datetime.strptime(expires, dt_format)
+                    except ValueError:
+                        logger.warning("Cannot format cookie expires: {}".format(expires_origin))
+                        expires = ""
+                        continue
+                    expires = int((dt - datetime(1970, 1, 1)).total_seconds())
+                elif kv.lower().startswith("max-age="):
+                    expires = int(time.time()) + int(kv.split("=")[1].strip())
+                elif kv.lower().startswith("version="):
+                    continue
+                else:
+                    kv_split = kv.split("=", 1)
+                    if len(kv_split) == 2 and cookie_str.startswith(kv_split[0]):
+                        name = kv_split[0].strip()
+                        value = kv_split[1].strip()
+            if domain == "":
+                domain = default_domain
+            # only same domain or high domain
+            high_domain = domain[1:] if domain and domain[0] == "." else domain
+            if default_domain.endswith(high_domain):
+                params.append((session_id, name, value, domain, path, expires))
+                response.cookies.set_cookie(name, value, domain, path, expires)
+                if value in ["delete"]:  # value = 'delete': delete this cookie
+                    params_del.append((session_id, name, domain, path))
 
         if len(params):
             self.cookie_db.save_cookies(params)
@@ -1,3 +1,4 @@
 from pycurl_session.spider.spider import Spider, RedisSpider
 from pycurl_session.spider.request import Request, FormRequest
 from pycurl_session.spider.schedule import Schedule
+from pycurl_session.spider.cluster import ShardSchedule
@@ -0,0 +1,216 @@
+# coding: utf-8
+
+import json
+import logging
+import multiprocessing
+import os
+import pickle
+import queue
+import zlib
+
+from pycurl_session.spider.offload import pack_request, unpack_request
+from pycurl_session.spider.schedule import Schedule
+from pycurl_session.spider.task import Task, TaskItem
+from pycurl_session.utils.domain import get_tld
+
+
+def shard_index(url, count):
+    # hash() is random in every process, use crc32
+    key = get_tld(url) or ""
+    return zlib.crc32(key.encode("utf-8")) % count
+
+
+class Shard(object):
+    ''' used by Schedule.shard in worker process.
+        Request is sent to the worker who own its registered domain,
+        so download delay, robots.txt and url duplicate check of one domain
+        stay in one worker.
+    '''
+    def __init__(self, index, count, inboxes, sent, received, idle, stop):
+        self.index = index
+        self.count = count
+        self.inboxes = inboxes
+        self.sent = sent            # Value, request forward count
+        self.received = received    # Value, request receive count
+        self.idle = idle            # Array, idle flag of every worker
+        self.stop = stop            # Event, set by ShardSchedule when all done
+        self.forward_count = 0
+        self.forward_failed = 0
+
+    def own(self, url):
+        return shard_index(url, self.count) == self.index
+
+    def forward(self, taskitem, spider):
+        request = taskitem.item
+        index = shard_index(request.url, self.count)
+        # Queue.put() pickle in feeder thread, and drop the item on error, then sent never equal received.
+        # pickle here, count sent when the request can be received
+        try:
+            data = pickle.dumps((taskitem.spider_id, pack_request(request, spider), taskitem.priority))
+        except Exception:
+            self.forward_failed += 1
+            raise
+        with self.sent.get_lock():
+            self.sent.value += 1
+        self.inboxes[index].put(data)
+        self.forward_count += 1
+
+    def poll(self, spider_instance, max_count=1000, timeout=0):
+        ''' timeout: wait for the first request when worker is idle, instead of busy loop '''
+        result = []
+        for _ in range(max_count):
+            try:
+                if timeout and not result:
+                    data = self.inboxes[self.index].get(timeout=timeout)
+                else:
+                    data = self.inboxes[self.index].get_nowait()
+            except queue.Empty:
+                break
+            # busy before count received, see ShardSchedule.all_idle()
+            self.idle[self.index] = 0
+            with self.received.get_lock():
+                self.received.value += 1
+            spider_id, request, priority = pickle.loads(data)
+            if spider_id in spider_instance:
+                unpack_request(request, spider_instance[spider_id])
+                result.append(TaskItem(spider_id, request, priority))
+        return result
+
+    def set_idle(self, idle):
+        self.idle[self.index] = 1 if idle else 0
+
+    def should_stop(self):
+        return self.stop.is_set()
+
+
+def worker_settings(custom_settings, index):
+    # every worker serve metrics on its own port and textfile
+    custom_settings = dict(custom_settings)
+    if custom_settings.get("METRICS_PORT"):
+        custom_settings["METRICS_PORT"] = custom_settings["METRICS_PORT"] + index
+    if custom_settings.get("METRICS_TEXTFILE"):
+        root, ext = os.path.splitext(custom_settings["METRICS_TEXTFILE"])
+        custom_settings["METRICS_TEXTFILE"] = "{0}-{1}{2}".format(root, index, ext)
+    # every worker write its own feed file
+    custom_settings["FEED_WORKER"] = index
+    # segment store of HttpCacheMiddleware and RevalidateMiddleware has one writer only,
+    # default directory is split by FEED_WORKER in middleware
+    for name in ["HTTPCACHE_DIR", "REVALIDATE_DIR"]:
+        if custom_settings.get(name):
+            custom_settings[name] = os.path.join(custom_settings[name], "worker-{0}".format(index))
+    return custom_settings
+
+
+def _run_worker(index, count, custom_settings, spiders, channel):
+    inboxes, sent, received, idle, stop, result_queue = channel
+    schedule = Schedule(worker_settings(custom_settings, index))
+    schedule.shard = Shard(index, count, inboxes, sent, received, idle, stop)
+    for spider, task_provider, arg in spiders:
+        schedule.add_spider(spider, task_provider=task_provider, **arg)
+    if index != 0:
+        # only first worker get request from Task, others receive forward request
+        schedule.spider_task_done.update(schedule.spider_task.keys())
+    try:
+        schedule.run()
+    finally:
+        idle[index] = 1
+        schedule.logstat.update({
+            "shard/forward_count": schedule.shard.forward_count,
+            "shard/forward_failed": schedule.shard.forward_failed,
+        })
+        result_queue.put((index, schedule.logstat))
+
+
+def merge_logstat(logstat_list):
+    result = {}
+    for logstat in logstat_list:
+        for k, v in logstat.items():
+            if k not in result:
+                result.update({k: v})
+            elif k in ["time_start"]:
+                result[k] = min(result[k], v)
+            elif k in ["time_end", "time_used", "time_used_s"]:
+                result[k] = max(result[k], v)
+            elif isinstance(v, dict) and isinstance(result[k], dict):
+                result[k] = dict(result[k], **v)
+            elif isinstance(v, (int, float)) and isinstance(result[k], (int, float)):
+                result[k] += v
+            else:
+                result[k] = v
+    return result
+
+
+class ShardSchedule(object):
+    ''' run Schedule in multiple processes, request shard by registered domain.
+        usage like Schedule:
+            schedule = ShardSchedule(settings, workers=4)
+            schedule.add_spider(Spider)
+            schedule.run()
+    '''
+    name = "ShardSchedule"
+
+    def __init__(self, custom_settings={}, workers=None):
+        self.custom_settings = custom_settings
+        self.workers = workers or multiprocessing.cpu_count()
+        self.spiders = []
+        self.logstat = {}
+        self.settings = {}
+        Schedule.update_settings(self, custom_settings)
+        Schedule.set_logger(self, self.name)
+        self.logger = logging.getLogger(self.name)
+
+    def add_spider(self, spider, task_provider:Task=Task, **arg):
+        self.spiders.append((spider, task_provider, arg))
+
+    def all_idle(self, sent, received, idle):
+        # counter read before and after idle flags, a worker set busy before count received
+        count = (sent.value, received.value)
+        if count[0] != count[1]:
+            return False
+        if not all(idle[:]):
+            return False
+        return count == (sent.value, received.value)
+
+    def run(self):
+        ctx = multiprocessing.get_context()
+        inboxes = [ctx.Queue() for _ in range(self.workers)]
+        sent = ctx.Value("q", 0)
+        received = ctx.Value("q", 0)
+        idle = ctx.Array("b", [0] * self.workers, lock=False)
+        stop = ctx.Event()
+        result_queue = ctx.Queue()
+        channel = (inboxes, sent, received, idle, stop, result_queue)
+
+        processes = []
+        self.logger.info("ShardSchedule started with {0} workers".format(self.workers))
+        for index in range(self.workers):
+            p = ctx.Process(
+                target=_run_worker,
+                args=(index, self.workers, self.custom_settings, self.spiders, channel),
+                name="{0}-{1}".format(self.name, index),
+            )
+            p.start()
+            processes.append(p)
+
+        logstat_list = []
+        try:
+            while len(logstat_list) < self.workers:
+                if not stop.is_set() and self.all_idle(sent, received, idle):
+                    stop.set()
+                try:
+                    logstat_list.append(result_queue.get(timeout=0.1)[1])
+                except queue.Empty:
+                    if not any(p.is_alive() for p in processes) and result_queue.empty():
+                        break
+        except KeyboardInterrupt:
+            # worker process handle KeyboardInterrupt itself
+            while len(logstat_list) < self.workers and any(p.is_alive() for p in processes):
+                try:
+                    logstat_list.append(result_queue.get(timeout=0.1)[1])
+                except (queue.Empty, KeyboardInterrupt):
+                    continue
+        for p in processes:
+            p.join()
+
+        self.logstat = merge_logstat(logstat_list)
+        self.logger.info("Dumping logstat:\n" + json.dumps(self.logstat, sort_keys=True, indent=4, separators=(',', ': ')))
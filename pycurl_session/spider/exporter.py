@@ -0,0 +1,179 @@
+# coding: utf-8
+
+import bz2
+import csv
+import gzip
+import io
+import json
+import lzma
+import os
+import threading
+import time
+try:
+    from compression import zstd    # python 3.14+
+    _ZSTD_INSTALLED = True
+except ModuleNotFoundError:
+    _ZSTD_INSTALLED = False
+
+
+COMPRESSION = {
+    # name: (extension, open compress file with binary fileobj)
+    "gzip": (".gz", lambda f: gzip.GzipFile(fileobj=f, mode="wb", compresslevel=6)),
+    "bz2": (".bz2", lambda f: bz2.BZ2File(f, mode="wb")),
+    "xz": (".xz", lambda f: lzma.LZMAFile(f, mode="wb")),
+}
+if _ZSTD_INSTALLED:
+    COMPRESSION.update({"zstd": (".zst", lambda f: zstd.ZstdFile(f, mode="wb"))})
+
+
+class FeedFile(object):
+    ''' write to "path.part", rename to "path" when close '''
+    def __init__(self, path, compression=None, buffer_size=1024 * 1024):
+        self.path = path
+        self.part_path = path + ".part"
+        dir_path = os.path.dirname(path)
+        if dir_path and not os.path.exists(dir_path):
+            os.makedirs(dir_path)
+        # buffering=1 means line buffering, not support in binary mode
+        self.raw = open(self.part_path, "wb", buffering=max(2, buffer_size))
+        if compression:
+            self.compress = COMPRESSION[compression][1](self.raw)
+        else:
+            self.compress = None
+        self.stream = io.TextIOWrapper(
+            self.compress or self.raw, encoding="utf-8", newline="", write_through=False,
+        )
+        self.time_open = time.time()
+        self.count = 0
+        self.written = 0
+
+    def write(self, s):
+        self.stream.write(s)
+        self.written += len(s)
+
+    def size(self):
+        # characters written, before compress
+        return self.written
+
+    def close(self):
+        self.stream.close()     # close compress file and raw file too
+        if self.compress is not None and not self.raw.closed:
+            self.raw.close()
+        os.replace(self.part_path, self.path)
+
+
+class FeedExporter(object):
+    ''' base item pipeline, write items to file, one json per line.
+        subclass override open_file() and write_items() for other formats.
+        settings(in spider.settings):
+            FEED_URI - path template, support {spider}, {spider_id}, {time}, {index}, {worker}
+            FEED_COMPRESSION - None, gzip, bz2, xz, zstd(python 3.14+)
+            FEED_ROTATE_SIZE - start new file when characters written(before compress) over this, 0 for disable
+            FEED_ROTATE_INTERVAL - start new file after seconds, 0 for disable
+            FEED_BUFFER_SIZE - write buffer size
+    '''
+    file_extension = ""
+
+    def __init__(self):
+        self.files = {}     # {spider_id: FeedFile}
+        self.index = {}     # {spider_id: int}
+        self.lock = threading.Lock()
+
+    def get_path(self, spider):
+        settings = getattr(spider, "settings", {})
+        uri = settings.get("FEED_URI") or "{spider}-{time}" + self.file_extension
+        worker = settings.get("FEED_WORKER")
+        rotate = settings.get("FEED_ROTATE_SIZE") or settings.get("FEED_ROTATE_INTERVAL")
+        suffix = ""
+        if worker is not None and "{worker}" not in uri:
+            # workers of ShardSchedule start in the same second
+            suffix += "-{worker}"
+        if rotate and "{index}" not in uri:
+            suffix += "-{index}"
+        if suffix:
+            dir_path, name = os.path.split(uri)
+            if "." in name:
+                name = name.replace(".", suffix + ".", 1)
+            else:
+                name = name + suffix
+            uri = os.path.join(dir_path, name)
+        path = uri.format(
+            spider=spider.name,
+            spider_id=spider.spider_id,
+            time=time.strftime("%Y%m%d%H%M%S"),
+            index=self.index.get(spider.spider_id, 0),
+            worker=worker if worker is not None else "",
+        )
+        compression = settings.get("FEED_COMPRESSION")
+        if compression:
+            if compression not in COMPRESSION:
+                raise Exception("FEED_COMPRESSION not support: {0}".format(compression))
+            if not path.endswith(COMPRESSION[compression][0]):
+                path = path + COMPRESSION[compression][0]
+        return path
+
+    def get_file(self, spider):
+        spider_id = spider.spider_id
+        settings = getattr(spider, "settings", {})
+        feed = self.files.get(spider_id)
+        if feed is not None:
+            rotate_size = settings.get("FEED_ROTATE_SIZE", 0)
+            rotate_interval = settings.get("FEED_ROTATE_INTERVAL", 0)
+            if ((rotate_size and feed.size() >= rotate_size)
+                or (rotate_interval and time.time() - feed.time_open >= rotate_interval)
+            ):
+                self.close_file(spider_id)
+                self.index[spider_id] = self.index.get(spider_id, 0) + 1
+                feed = None
+        if feed is None:
+            feed = FeedFile(
+                self.get_path(spider),
+                compression=settings.get("FEED_COMPRESSION"),
+                buffer_size=settings.get("FEED_BUFFER_SIZE") or 1024 * 1024,
+            )
+            self.files.update({spider_id: feed})
+            self.open_file(feed, spider)
+        return feed
+
+    def open_file(self, feed, spider):
+        pass
+
+    def write_items(self, feed, items, spider):
+        feed.write("".join([json.dumps(item, ensure_ascii=False, default=str) + "\n" for item in items]))
+
+    def close_file(self, spider_id):
+        feed = self.files.pop(spider_id, None)
+        if feed is not None:
+            feed.close()
+
+    def process_item(self, item, spider):
+        self.process_items([item], spider)
+
+    def process_items(self, items, spider):
+        with self.lock:
+            feed = self.get_file(spider)
+            self.write_items(feed, items, spider)
+            feed.count += len(items)
+
+    def close_spider(self, spider):
+        with self.lock:
+            self.close_file(spider.spider_id)
+
+
+class JsonLinesExporter(FeedExporter):
+    file_extension = ".jsonl"
+
+
+class CsvExporter(FeedExporter):
+    ''' FEED_CSV_FIELDS - column list, default use keys of the first item '''
+    file_extension = ".csv"
+
+    def open_file(self, feed, spider):
+        feed.writer = None
+
+    def write_items(self, feed, items, spider):
+        if feed.writer is None:
+            fields = getattr(spider, "settings", {}).get("FEED_CSV_FIELDS") or list(items[0].keys())
+            feed.writer = csv.DictWriter(feed, fieldnames=fields, extrasaction="ignore")
+            feed.writer.writeheader()
+        feed.writer.writerows(items)
@@ -0,0 +1,254 @@
+# coding: utf-8
+
+import os
+import threading
+import time
+from bisect import bisect_left
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse
+
+
+CONTENT_TYPE = "application/openmetrics-text; version=1.0.0; charset=utf-8"
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+def _format_labels(labelnames, labels, extra=None):
+    pairs = list(zip(labelnames, labels))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join("{0}=\"{1}\"".format(k, _escape(v)) for k, v in pairs) + "}"
+
+
+def _format_value(value):
+    if isinstance(value, float):
+        if value == float("inf"):
+            return "+Inf"
+        return repr(value)
+    return str(value)
+
+
+class Metric(object):
+    ''' base metric, values keyed by label values tuple '''
+    type = "unknown"
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.values = {}
+        self.lock = threading.Lock()
+
+    def samples(self):
+        # [(suffix, labels, extra label, value)]
+        with self.lock:
+            return [("", labels, None, value) for labels, value in self.values.items()]
+
+    def render(self):
+        lines = [
+            "# TYPE {0} {1}".format(self.name, self.type),
+            "# HELP {0} {1}".format(self.name, _escape(self.documentation)),
+        ]
+        for suffix, labels, extra, value in self.samples():
+            lines.append("{0}{1}{2} {3}".format(
+                self.name, suffix, _format_labels(self.labelnames, labels, extra), _format_value(value),
+            ))
+        return lines
+
+
+class Counter(Metric):
+    type = "counter"
+
+    def inc(self, labels=(), value=1):
+        with self.lock:
+            self.values[labels] = self.values.get(labels, 0) + value
+
+    def get(self, labels=()):
+        return self.values.get(labels, 0)
+
+    def samples(self):
+        return [("_total", labels, extra, value) for _, labels, extra, value in super().samples()]
+
+
+class Gauge(Metric):
+    ''' func: called when render, return number, or {labels: number} if has labelnames '''
+    type = "gauge"
+
+    def __init__(self, name, documentation, labelnames=(), func=None):
+        super().__init__(name, documentation, labelnames)
+        self.func = func
+
+    def set(self, labels=(), value=0):
+        with self.lock:
+            self.values[labels] = value
+
+    def samples(self):
+        if self.func is not None:
+            value = self.func()
+            if isinstance(value, dict):
+                return [("", labels, None, v) for labels, v in value.items()]
+            return [("", (), None, value)]
+        return super().samples()
+
+
+class Histogram(Metric):
+    type = "histogram"
+    DEFAULT_BUCKETS = [0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10]
+
+    def __init__(self, name, documentation, labelnames=(), buckets=None):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = sorted(buckets or self.DEFAULT_BUCKETS)
+
+    def observe(self, labels=(), value=0):
+        with self.lock:
+            if labels not in self.values:
+                # [count per bucket(not cumulative), sum]
+                self.values[labels] = [[0] * (len(self.buckets) + 1), 0]
+            stat = self.values[labels]
+            stat[0][bisect_left(self.buckets, value)] += 1
+            stat[1] += value
+
+    def samples(self):
+        result = []
+        with self.lock:
+            for labels, (counts, total) in self.values.items():
+                cumulative = 0
+                for bound, count in zip(self.buckets + [float("inf")], counts):
+                    cumulative += count
+                    result.append(("_bucket", labels, ("le", _format_value(float(bound))), cumulative))
+                result.append(("_count", labels, None, cumulative))
+                result.append(("_sum", labels, None, total))
+        return result
+
+
+class Registry(object):
+    def __init__(self):
+        self.metrics = {}
+        self.lock = threading.Lock()
+
+    def _get(self, cls, name, documentation, labelnames, **arg):
+        with self.lock:
+            if name not in self.metrics:
+                self.metrics.update({name: cls(name, documentation, labelnames, **arg)})
+            return self.metrics[name]
+
+    def counter(self, name, documentation, labelnames=()):
+        return self._get(Counter, name, documentation, labelnames)
+
+    def gauge(self, name, documentation, labelnames=(), func=None):
+        return self._get(Gauge, name, documentation, labelnames, func=func)
+
+    def histogram(self, name, documentation, labelnames=(), buckets=None):
+        return self._get(Histogram, name, documentation, labelnames, buckets=buckets)
+
+    def render(self):
+        with self.lock:
+            metrics = list(self.metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        lines.append("# EOF")
+        return "\n".join(lines) + "\n"
+
+    def write_textfile(self, path):
+        # write then rename, reader never see half file
+        tmp_path = "{0}.{1}.tmp".format(path, os.getpid())
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(self.render())
+        os.replace(tmp_path, path)
+
+
+class MetricsServer(object):
+    ''' serve registry on http://host:port/metrics in daemon thread '''
+    def __init__(self, registry, host="127.0.0.1", port=0):
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] not in ["/", "/metrics"]:
+                    self.send_error(404)
+                    return
+                body = registry.render().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", CONTENT_TYPE)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        self.server.daemon_threads = True
+        self.port = self.server.server_address[1]
+        self.thread = threading.Thread(target=self.server.serve_forever, name="MetricsServer", daemon=True)
+        self.thread.start()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class ScheduleMetrics(object):
+    ''' metrics of Schedule, enable by setting METRICS_PORT or METRICS_TEXTFILE '''
+    def __init__(self, schedule):
+        settings = schedule.settings
+        self.registry = Registry()
+        self.responses = self.registry.counter(
+            "pycurl_session_responses", "Responses received, include redirect and retry", ["spider", "status"])
+        self.items = self.registry.counter(
+            "pycurl_session_items", "Items passed to item pipelines", ["spider"])
+        self.retries = self.registry.counter(
+            "pycurl_session_retries", "Requests retried", ["spider"])
+        self.errors = self.registry.counter(
+            "pycurl_session_errors", "Requests failed with curl error", ["spider", "errno"])
+        self.latency = self.registry.histogram(
+            "pycurl_session_request_duration_seconds", "Total time of request by domain", ["domain"])
+        # len() is safe to call from server thread
+        self.registry.gauge(
+            "pycurl_session_queue_pending", "Requests in pending queue", func=lambda: len(schedule.queue_pending))
+        self.registry.gauge(
+            "pycurl_session_queue_delay", "Requests wait for download delay", func=lambda: len(schedule.queue_delay))
+        self.registry.gauge(
+            "pycurl_session_handles_running", "Curl handles in flight", func=lambda: schedule.num_handles)
+        self.registry.gauge(
+            "pycurl_session_parse_pending", "Responses wait for parse in process pool",
+            func=lambda: len(schedule.parse_offload) if schedule.parse_offload is not None else 0)
+        self.registry.gauge(
+            "pycurl_session_pipeline_pending", "Items wait for pipeline threads",
+            func=lambda: len(schedule.pipeline_runner) if schedule.pipeline_runner is not None else 0)
+
+        self.server = None
+        if settings.get("METRICS_PORT"):
+            self.server = MetricsServer(self.registry, settings.get("METRICS_HOST") or "127.0.0.1", settings["METRICS_PORT"])
+        self.textfile = settings.get("METRICS_TEXTFILE")
+        self.interval = settings.get("METRICS_INTERVAL") or 15
+        self.time_write = 0
+
+    def on_response(self, spider_id, response):
+        self.responses.inc((spider_id, response.status_code))
+        if response.timings.total:
+            self.latency.observe((urlparse(response.url).hostname or "",), response.timings.total)
+
+    def on_item(self, spider_id):
+        self.items.inc((spider_id,))
+
+    def on_retry(self, spider_id):
+        self.retries.inc((spider_id,))
+
+    def on_error(self, spider_id, errno):
+        self.errors.inc((spider_id, errno))
+
+    def process_tick(self, force=False):
+        # called in schedule loop, write textfile every interval
+        if self.textfile and (force or time.time() - self.time_write >= self.interval):
+            self.time_write = time.time()
+            self.registry.write_textfile(self.textfile)
+
+    def close(self):
+        self.process_tick(force=True)
+        if self.server is not None:
+            self.server.close()
+            self.server = None
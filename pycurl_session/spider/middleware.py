@@ -1,17 +1,38 @@
 # coding: utf-8
 
+import os
+import pickle
+import tempfile
 import time
 import json
-from urllib.parse import urlparse
+from bisect import bisect_left
+from urllib.parse import urlparse, ParseResult
 
 from pycurl_session.response import Response
 from pycurl_session.spider.spider import Spider
-from pycurl_session.spider.request import Request
+from pycurl_session.spider.request import Request, request_fingerprint
+from pycurl_session.spider.segmentstore import SegmentStore
 from pycurl_session.spider.robotstxtparser import RobotFileParser
 from pycurl_session.spider.exceptions import IgnoreRequest, RetryRequest
 
 
+HTTPCACHE_DEFAULT_DIR = os.path.join(tempfile.gettempdir(), "pycurl_session", "httpcache")
+REVALIDATE_DEFAULT_DIR = os.path.join(tempfile.gettempdir(), "pycurl_session", "revalidate")
+
+
+def default_store_dir(default_dir, spider):
+    # SegmentStore has one writer only, every spider and every ShardSchedule worker use its own directory
+    path = os.path.join(default_dir, str(spider.name))
+    worker = spider.settings.get("FEED_WORKER")
+    if worker is not None:
+        path = os.path.join(path, "worker-{0}".format(worker))
+    return path
+
+
 class Statistics:
+    # upper bound(ms) of timing histogram buckets, last bucket is larger than all
+    TIMINGS_BUCKETS = [10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000]
+
     def __init__(self):
         self.url_collector = set()
         self.stat = {"time_start": time.time(), "time_end": None, "time_used": None}
@@ -59,8 +80,29 @@ class Statistics:
             )
             return None
 
+    def add_timings(self, response):
+        # per domain histogram of every phase, see Response.timings
+        timings = getattr(response, "timings", None)
+        if timings is None or not timings.total:
+            return
+        key = "timings/{0}".format(urlparse(response.url).hostname or "")
+        if key not in self.stat:
+            self.stat.update({key: {"count": 0, "num_connects": 0, "size_download": 0}})
+        stat = self.stat[key]
+        stat["count"] += 1
+        stat["num_connects"] += timings.num_connects
+        stat["size_download"] += int(timings.size_download)
+        for phase, value in timings.phases().items():
+            if phase not in stat:
+                stat.update({phase: {"sum": 0, "max": 0, "buckets": [0] * (len(self.TIMINGS_BUCKETS) + 1)}})
+            histogram = stat[phase]
+            histogram["sum"] += value
+            histogram["max"] = max(histogram["max"], value)
+            histogram["buckets"][bisect_left(self.TIMINGS_BUCKETS, value * 1000)] += 1
+
     def process_response(self, request, response, spider):
         self.section_count("status_count", response.status_code)
+        self.add_timings(response)
 
     def process_exception(self, request, exception, spider):
         logger = spider._get_logger()
@@ -93,6 +135,14 @@ class Statistics:
             int(self.stat["time_used"] % 3600 / 60),
             int(self.stat["time_used"] % 60)
         )
+        if any(k.startswith("timings/") for k in self.stat):
+            self.stat["timings_buckets_ms"] = self.TIMINGS_BUCKETS + ["+Inf"]
+            for k, v in self.stat.items():
+                if k.startswith("timings/"):
+                    for phase in v.values():
+                        if isinstance(phase, dict):
+                            phase["sum"] = round(phase["sum"], 6)
+                            phase["max"] = round(phase["max"], 6)
         return self.stat
 
 
@@ -115,7 +165,8 @@ class RobotsTxt:
             self.data_url.update({key: url_robotstxt})
 
     def get_key(self, url):
-        url_parsed = urlparse(url)
+        # url: str or parsed url
+        url_parsed = url if isinstance(url, ParseResult) else urlparse(url)
         scheme = url_parsed.scheme
         hostname = url_parsed.hostname
         port = url_parsed.port
@@ -128,10 +179,10 @@ class RobotsTxt:
 
     def process_request(self, request, spider):
         url = request.url
-        url_parsed = urlparse(url)
+        url_parsed = request.url_parsed
         url_domain = url_parsed.netloc
 
-        robots_txt_key = self.get_key(url)
+        robots_txt_key = self.get_key(url_parsed)
         # new domain, get robots.txt
         if robots_txt_key not in self.data_state:
             url_robotstxt = (
@@ -185,4 +236,161 @@ class CookiesDebug:
                 if "set-cookie" in header.lower():
                     msg += "\n\t{0}".format(header)
             spider._get_logger().debug(msg + "\n")
-        return None
\ No newline at end of file
+        return None
+
+class HttpCacheMiddleware:
+    ''' record responses on disk, replay them without download, see settings HTTPCACHE_*.
+        enable by DOWNLOADER_MIDDLEWARES = ["pycurl_session.spider.middleware.HttpCacheMiddleware"]
+        request.meta["dont_cache"] = True: not read or write cache
+    '''
+    def __init__(self):
+        self.store = None
+        self.stat = {"hit": 0, "miss": 0, "store": 0, "expired": 0, "ignore": 0, "refresh": 0}
+
+    def open_store(self, spider):
+        settings = spider.settings
+        self.expiration = settings.get("HTTPCACHE_EXPIRATION_SECS") or 0
+        self.ignore_http_codes = settings.get("HTTPCACHE_IGNORE_HTTP_CODES") or []
+        self.ignore_missing = settings.get("HTTPCACHE_IGNORE_MISSING", False)
+        self.redirect_enabled = settings.get("REDIRECT_ENABLED", True)
+        self.store = SegmentStore(
+            settings.get("HTTPCACHE_DIR") or default_store_dir(HTTPCACHE_DEFAULT_DIR, spider),
+            settings.get("HTTPCACHE_SEGMENT_SIZE") or 64 * 1024 * 1024,
+        )
+
+    def process_request(self, request, spider):
+        if request.meta.get("dont_cache"):
+            return None
+        if self.store is None:
+            self.open_store(spider)
+        record = self.store.get(request_fingerprint(request))
+        if record is None or (self.expiration and time.time() - record[1] > self.expiration):
+            self.stat["miss" if record is None else "expired"] += 1
+            if self.ignore_missing:
+                self.stat["ignore"] += 1
+                raise IgnoreRequest()
+            return None
+        self.stat["hit"] += 1
+        return self.load_response(request, record[0], spider)
+
+    def load_response(self, request, value, spider):
+        data = pickle.loads(value)
+        response = Response(session=spider._session)
+        response.url = data["url"]
+        response.status_code = data["status_code"]
+        response.headers = data["headers"]
+        response.content = data["content"]
+        response.from_cache = True
+        response.meta = request.meta
+        response.request.update({
+            "url": request.url,
+            "method": request.method,
+            "headers": request.headers,
+            "cookies": request.cookies,
+            "origin_url": request.origin_url,
+        })
+        spider._session._response_decode(response)
+        return response
+
+    def process_response(self, request, response, spider):
+        if request.meta.get("dont_cache") or response.from_cache or self.store is None:
+            return None
+        if response.status_code in self.ignore_http_codes:
+            return None
+        if response.status_code == 304:
+            # not modified(e.g. RevalidateMiddleware sent validators of expired entry), body is empty.
+            # keep the cached response, refresh its time and replay it
+            key = request_fingerprint(request)
+            record = self.store.get(key)
+            if record is None:
+                return None
+            self.store.touch(key)
+            self.stat["refresh"] += 1
+            return self.load_response(request, record[0], spider)
+        if (response.status_code in spider._session.redirect_http_codes
+            and self.redirect_enabled and not request.meta.get("dont_redirect")
+        ):
+            # redirect is followed, store final response only
+            return None
+        self.store.set(request_fingerprint(request), pickle.dumps({
+            "url": response.url,
+            "status_code": response.status_code,
+            "headers": list(response.headers),
+            "content": response.content_bytes,
+        }, protocol=pickle.HIGHEST_PROTOCOL))
+        self.stat["store"] += 1
+        return None
+
+    def close(self):
+        if self.store is not None:
+            self.store.close()
+            self.store = None
+
+    def process_logstat(self):
+        return {"httpcache/{0}".format(k): v for k, v in self.stat.items()}
+
+
+class RevalidateMiddleware:
+    ''' remember ETag and Last-Modified of every request, send If-None-Match and If-Modified-Since next time.
+        304 response is passed to callback, response.status_code == 304 means not modified, body is empty.
+        enable by DOWNLOADER_MIDDLEWARES = ["pycurl_session.spider.middleware.RevalidateMiddleware"]
+        request.meta["dont_revalidate"] = True: not send validators
+        request.meta["skip_not_modified"] = True: drop 304 response, callback is not called
+    '''
+    def __init__(self):
+        self.store = None
+        self.stat = {"sent": 0, "not_modified": 0, "modified": 0, "skipped": 0}
+
+    def open_store(self, spider):
+        settings = spider.settings
+        self.skip_not_modified = settings.get("REVALIDATE_SKIP_NOT_MODIFIED", False)
+        self.store = SegmentStore(settings.get("REVALIDATE_DIR") or default_store_dir(REVALIDATE_DEFAULT_DIR, spider))
+
+    def process_request(self, request, spider):
+        if request.meta.get("dont_revalidate") or request.method.upper() not in ["GET", "HEAD"]:
+            return None
+        if self.store is None:
+            self.open_store(spider)
+        record = self.store.get(request_fingerprint(request))
+        if record is None:
+            return None
+        etag, last_modified = record[0].decode("utf-8").split("\n", 1)
+        headers = request.headers
+        if etag and "if-none-match" not in headers:
+            headers.update({"if-none-match": etag})
+        if last_modified and "if-modified-since" not in headers:
+            headers.update({"if-modified-since": last_modified})
+        self.stat["sent"] += 1
+        return None
+
+    def process_response(self, request, response, spider):
+        if self.store is None or request.meta.get("dont_revalidate"):
+            return None
+        if response.status_code == 304:
+            self.stat["not_modified"] += 1
+            if request.meta.get("skip_not_modified", self.skip_not_modified):
+                self.stat["skipped"] += 1
+                raise IgnoreRequest()
+        elif response.status_code != 200:
+            return None
+        elif "if-none-match" in request.headers or "if-modified-since" in request.headers:
+            self.stat["modified"] += 1
+        # 304 may update validators too, only write when changed
+        etag = response.headers.get("etag", "")
+        last_modified = response.headers.get("last-modified", "")
+        if not etag and not last_modified:
+            return None
+        value = "{0}\n{1}".format(etag, last_modified).encode("utf-8")
+        key = request_fingerprint(request)
+        record = self.store.get(key)
+        if record is None or record[0] != value:
+            self.store.set(key, value)
+        return None
+
+    def close(self):
+        if self.store is not None:
+            self.store.close()
+            self.store = None
+
+    def process_logstat(self):
+        return {"revalidate/{0}".format(k): v for k, v in self.stat.items()}
@@ -0,0 +1,169 @@
+# coding: utf-8
+
+import pickle
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from inspect import isgenerator
+
+from pycurl_session import Session
+from pycurl_session.response import Response
+from pycurl_session.spider.exceptions import CloseSpider
+from pycurl_session.spider.request import Request
+
+
+# spider instances in worker process, {spider_id: spider}
+_worker_spiders = {}
+_worker_session = None
+
+
+def pack_response(response):
+    ''' compact, picklable copy of spider Response '''
+    return {
+        "url": response.url,
+        "status_code": response.status_code,
+        "headers": list(response.headers),
+        "content": response.content_bytes,
+        "cookies": [(item.name, item.value, item.domain, item.path, item.expires) for item in response.cookies],
+        "request": dict(response.request),
+        "meta": response.meta,
+        "timings": response.timings,
+        "from_cache": response.from_cache,
+    }
+
+
+def unpack_response(data, session=None):
+    response = Response(session=session)
+    response.url = data["url"]
+    response.status_code = data["status_code"]
+    response.headers = data["headers"]
+    response.content = data["content"]
+    for cookie in data["cookies"]:
+        response.cookies.set_cookie(*cookie)
+    response.request.update(data["request"])
+    response.meta = data["meta"]
+    response.timings = data["timings"]
+    response.from_cache = data.get("from_cache", False)
+    if session is not None:
+        session._response_decode(response)
+    return response
+
+
+def _init_worker(spider_list):
+    global _worker_session
+    _worker_session = Session(store_cookie=False)
+    for spider_id, spider, arg, settings in spider_list:
+        instance = spider(**arg)
+        # init_spider() is not called in worker, only __init__()
+        setattr(instance, "_session", _worker_session)
+        setattr(instance, "settings", settings)
+        _worker_spiders.update({spider_id: instance})
+
+
+def pack_request(request, spider):
+    ''' picklable Request, raise ValueError if callback can not be sent to other process '''
+    callback = request.callback
+    if callable(callback) and getattr(callback, "__self__", None) is spider:
+        # bound method of spider can not pickle, send callback name instead
+        request.callback = callback.__name__
+    elif callback is not None and not isinstance(callback, str):
+        # module function is pickled by name, lambda and local function can not
+        try:
+            pickle.dumps(callback)
+        except Exception as e:
+            raise ValueError(
+                "Callback {0!r} of <{1} {2}> can not be sent to other process, "
+                "use a method of spider: {3}".format(callback, request.method, request.url, e)
+            )
+    return request
+
+
+def unpack_request(request, spider):
+    if isinstance(request.callback, str):
+        request.callback = getattr(spider, request.callback, None)
+    return request
+
+
+def _append_request(results, request, spider):
+    try:
+        results.append(pack_request(request, spider))
+    except ValueError as e:
+        # request is dropped, the other results are kept
+        spider._get_logger().error(e)
+
+
+def _run_callback(spider_id, callback_name, data, cb_kwargs):
+    ''' run in worker process.
+        return (results, close_reason), results are dict item and Request
+    '''
+    spider = _worker_spiders[spider_id]
+    response = unpack_response(data, _worker_session)
+    results = []
+    close_reason = None
+    try:
+        ret = getattr(spider, callback_name)(response, **cb_kwargs)
+        if isgenerator(ret):
+            for result in ret:
+                if isinstance(result, dict):
+                    results.append(result)
+                elif isinstance(result, Request):
+                    _append_request(results, result, spider)
+        elif isinstance(ret, dict):
+            results.append(ret)
+        elif isinstance(ret, Request):
+            _append_request(results, ret, spider)
+    except CloseSpider as reason:
+        close_reason = str(reason)
+    except Exception as e:
+        spider._get_logger().exception(e)
+    return results, close_reason
+
+
+class ParseOffload(object):
+    ''' run spider callback in process pool, enable by setting PARSE_PROCESSES '''
+    def __init__(self, processes, spider_list):
+        self.executor = ProcessPoolExecutor(
+            max_workers=processes,
+            initializer=_init_worker,
+            initargs=(spider_list,),
+        )
+        self.futures = []    # [(future, spider_id, request, response)]
+
+    def can_offload(self, request, spider):
+        callback = request.callback
+        if request.meta.get("parse_inline"):
+            return False
+        return callable(callback) and getattr(callback, "__self__", None) is spider
+
+    def submit(self, request, response, spider):
+        future = self.executor.submit(
+            _run_callback,
+            spider.spider_id,
+            request.callback.__name__,
+            pack_response(response),
+            request.cb_kwargs,
+        )
+        # keep response, parse inline if it can not send to worker
+        self.futures.append((future, spider.spider_id, request, response))
+
+    def pop_done(self, timeout=0):
+        if timeout and self.futures:
+            wait([item[0] for item in self.futures], timeout=timeout, return_when=FIRST_COMPLETED)
+        done = []
+        running = []
+        for item in self.futures:
+            if item[0].done():
+                done.append(item)
+            else:
+                running.append(item)
+        self.futures = running
+        return done
+
+    def __len__(self):
+        return len(self.futures)
+
+    def shutdown(self, wait=True):
+        if not wait:
+            # broken pool, running futures are not waited
+            for item in self.futures:
+                item[0].cancel()
+        self.executor.shutdown(wait=wait)
+        self.futures.clear()
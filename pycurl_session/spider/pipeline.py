@@ -0,0 +1,74 @@
+# coding: utf-8
+
+import queue
+import threading
+import time
+
+
+class PipelineRunner(object):
+    ''' run item pipelines in threads, enable by setting PIPELINE_THREADS
+        item is put to a bounded queue, thread collect items to batch and call
+        handler(items, spider) when batch_size reached or flush_interval passed.
+    '''
+    _STOP = object()
+
+    def __init__(self, handler, threads=1, batch_size=100, flush_interval=1, queue_size=10000):
+        self.handler = handler
+        self.batch_size = max(1, batch_size)
+        self.flush_interval = flush_interval
+        self.queue = queue.Queue(maxsize=max(1, queue_size))
+        self.threads = []
+        for i in range(max(1, threads)):
+            t = threading.Thread(target=self._worker, name="PipelineRunner-{0}".format(i), daemon=True)
+            t.start()
+            self.threads.append(t)
+
+    def put(self, item, spider):
+        # block when queue is full, Schedule stop adding request before this happen
+        self.queue.put((item, spider))
+
+    def full(self):
+        return self.queue.qsize() >= self.queue.maxsize
+
+    def __len__(self):
+        return self.queue.qsize()
+
+    def _flush(self, batch):
+        # keep item order, group by spider
+        group = {}
+        for item, spider in batch:
+            if spider.spider_id not in group:
+                group.update({spider.spider_id: (spider, [])})
+            group[spider.spider_id][1].append(item)
+        for spider, items in group.values():
+            self.handler(items, spider)
+        batch.clear()
+
+    def _worker(self):
+        batch = []
+        deadline = 0
+        while True:
+            try:
+                if batch:
+                    entry = self.queue.get(timeout=max(0, deadline - time.time()))
+                else:
+                    entry = self.queue.get()
+            except queue.Empty:
+                entry = None
+            if entry is self._STOP:
+                if batch: self._flush(batch)
+                break
+            if entry is not None:
+                if not batch:
+                    deadline = time.time() + self.flush_interval
+                batch.append(entry)
+            if batch and (len(batch) >= self.batch_size or time.time() >= deadline):
+                self._flush(batch)
+
+    def close(self):
+        # process all items in queue, then stop threads
+        for _ in self.threads:
+            self.queue.put(self._STOP)
+        for t in self.threads:
+            t.join()
+        self.threads.clear()
@@ -0,0 +1,49 @@
+# coding: utf-8
+
+import heapq
+
+
+class PriorityQueue(object):
+    ''' heap based pending queue, deque-like api: append, appendleft, popleft
+        higher priority pop first. in same priority:
+            append      - FIFO, pop after items already in queue
+            appendleft  - LIFO, pop before items already in queue
+        so with all priority equal, it works the same as collections.deque
+    '''
+    def __init__(self):
+        self.heap = []
+        self._head = 0   # decrease when appendleft
+        self._tail = 0   # increase when append
+
+    def _priority(self, taskitem):
+        return getattr(taskitem, "priority", 0) or 0
+
+    def append(self, taskitem):
+        self._tail += 1
+        heapq.heappush(self.heap, (-self._priority(taskitem), self._tail, taskitem))
+
+    def appendleft(self, taskitem):
+        self._head -= 1
+        heapq.heappush(self.heap, (-self._priority(taskitem), self._head, taskitem))
+
+    def popleft(self):
+        if not self.heap:
+            raise IndexError("pop from an empty queue")
+        return heapq.heappop(self.heap)[2]
+
+    def peek(self):
+        if not self.heap:
+            raise IndexError("peek from an empty queue")
+        return self.heap[0][2]
+
+    def clear(self):
+        self.heap.clear()
+        self._head = 0
+        self._tail = 0
+
+    def __len__(self):
+        return len(self.heap)
+
+    def __iter__(self):
+        # pop order, not heap order
+        return iter([entry[2] for entry in sorted(self.heap)])
@@ -0,0 +1,99 @@
+# coding: utf-8
+
+import cProfile
+import threading
+import time
+from functools import wraps
+
+
+class StageProfiler(object):
+    ''' time spend in every stage of Schedule, enable by setting PROFILE.
+        stage time include the stage called inside, e.g. process_curl_multi_ok include middleware and callback.
+        generator callback is timed every time it resume, so calls = 1 + count of next()
+    '''
+    def __init__(self, cprofile_path=None, dump_interval=60):
+        self.stats = {}     # {stage: [calls, time, max]}
+        self.lock = threading.Lock()    # pipeline threads
+        self.cprofile_path = cprofile_path
+        self.dump_interval = dump_interval
+        self.cprofile = None
+        self.time_dump = time.time()
+        if cprofile_path:
+            self.cprofile = cProfile.Profile()
+            self.cprofile.enable()
+
+    def add(self, stage, elapsed):
+        with self.lock:
+            stat = self.stats.get(stage)
+            if stat is None:
+                self.stats[stage] = [1, elapsed, elapsed]
+            else:
+                stat[0] += 1
+                stat[1] += elapsed
+                if elapsed > stat[2]:
+                    stat[2] = elapsed
+
+    def call(self, stage, func, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            self.add(stage, time.perf_counter() - start)
+
+    def wrap_generator(self, gen, stage):
+        # time spend in generator only, not in the code who consume it
+        while True:
+            start = time.perf_counter()
+            try:
+                result = next(gen)
+            except StopIteration:
+                self.add(stage, time.perf_counter() - start)
+                return
+            except BaseException:
+                self.add(stage, time.perf_counter() - start)
+                raise
+            self.add(stage, time.perf_counter() - start)
+            yield result
+
+    def wrap_method(self, obj, name, stage):
+        # replace bound method of middleware or pipeline instance
+        method = getattr(obj, name, None)
+        if method is None:
+            return
+        @wraps(method)
+        def wrapper(*args, **kwargs):
+            return self.call(stage, method, *args, **kwargs)
+        try:
+            setattr(obj, name, wrapper)
+        except AttributeError:
+            pass
+
+    def dump(self):
+        if self.cprofile is None:
+            return
+        # dump_stats() disable profiler, enable again
+        self.cprofile.dump_stats(self.cprofile_path)
+        self.cprofile.enable()
+        self.time_dump = time.time()
+
+    def process_tick(self):
+        if self.cprofile is not None and time.time() - self.time_dump >= self.dump_interval:
+            self.dump()
+
+    def close(self):
+        if self.cprofile is not None:
+            self.cprofile.disable()
+            self.cprofile.dump_stats(self.cprofile_path)
+            self.cprofile = None
+
+    def process_logstat(self):
+        result = {}
+        with self.lock:
+            for stage, (calls, total, max_time) in self.stats.items():
+                result.update({"profile/{0}".format(stage): {
+                    "calls": calls,
+                    "time": round(total, 6),
+                    "avg_ms": round(total / calls * 1000, 3),
+                    "max_ms": round(max_time * 1000, 3),
+                }})
+        return result
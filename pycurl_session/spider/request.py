@@ -1,19 +1,53 @@
 # coding: utf-8
 
+import hashlib
+import json as m_json
+from urllib.parse import urlencode, urlparse
+
 from pycurl_session.response import Response
 
 
+class _LazyDict(object):
+    ''' dict attribute of Request, created when first used.
+        most pending requests have empty meta, headers, cookies and cb_kwargs
+    '''
+    def __init__(self, slot):
+        self.slot = slot
+
+    def __get__(self, instance, owner):
+        if instance is None:
+            return self
+        value = getattr(instance, self.slot)
+        if value is None:
+            value = {}
+            setattr(instance, self.slot, value)
+        return value
+
+    def __set__(self, instance, value):
+        setattr(instance, self.slot, value)
+
+
 class Request(object):
+    __slots__ = (
+        "_url", "_url_parsed", "origin_url", "callback", "method", "body", "data", "json",
+        "dont_filter", "priority", "_meta", "_headers", "_cookies", "_cb_kwargs",
+    )
+    meta = _LazyDict("_meta")
+    headers = _LazyDict("_headers")
+    cookies = _LazyDict("_cookies")
+    cb_kwargs = _LazyDict("_cb_kwargs")
+
     def __init__(self, url, method="GET", callback=None, meta=None, 
         body=None, data=None, json=None, headers=None, cookies=None,
-        dont_filter=False, cb_kwargs=None,
+        dont_filter=False, cb_kwargs=None, priority=0,
         # encoding="utf-8", errback=None,
     ):
-        ''' Request: url, method, callback, meta, headers, cookies, dont_filter, cb_kwargs'''
-        self.url = url
+        ''' Request: url, method, callback, meta, headers, cookies, dont_filter, cb_kwargs, priority'''
+        self._url = url
+        self._url_parsed = None
         self.origin_url = None
         self.callback = callback
-        self.meta = meta or {}
+        self._meta = meta or None
         # body > data > json
         _data = None
         if body: _data = body
@@ -22,15 +56,33 @@ class Request(object):
             # only json data, change method from GET to POST
             method = "POST"
         self.method = method
-        self.headers = headers or {}
-        self.cookies = cookies or {}
+        self._headers = headers or None
+        self._cookies = cookies or None
         self.body = body
         self.data = _data
         self.json = json if not _data else None
         self.dont_filter = dont_filter
-        self.cb_kwargs = {}
+        self._cb_kwargs = None
         if cb_kwargs and isinstance(cb_kwargs, dict):
-            self.cb_kwargs = cb_kwargs
+            self._cb_kwargs = cb_kwargs
+        # higher priority download first
+        self.priority = int(priority) if priority else 0
+
+    @property
+    def url(self):
+        return self._url
+
+    @url.setter
+    def url(self, url):
+        self._url = url
+        self._url_parsed = None
+
+    @property
+    def url_parsed(self):
+        ''' urlparse(url), parsed once and used by Schedule and middlewares '''
+        if self._url_parsed is None:
+            self._url_parsed = urlparse(self._url)
+        return self._url_parsed
 
     def _run_callback(self, response, **cb_kwargs):
         if self.callback and callable(self.callback):
@@ -39,6 +91,22 @@ class Request(object):
             return None
 
 
+def request_fingerprint(request):
+    ''' sha1 digest(20 bytes) of method, url and body, same request get same fingerprint '''
+    data = request.data if request.data is not None else request.json
+    if isinstance(data, dict):
+        data = urlencode(sorted(data.items())) if request.data is not None else m_json.dumps(data, sort_keys=True)
+    if data is not None and not isinstance(data, bytes):
+        data = str(data).encode("utf-8")
+    sha1 = hashlib.sha1()
+    sha1.update(request.method.upper().encode("utf-8"))
+    sha1.update(b" ")
+    sha1.update(request.url.split("#")[0].encode("utf-8"))
+    sha1.update(b"\n")
+    sha1.update(data or b"")
+    return sha1.digest()
+
+
 class FormRequest(Request):
     def __init__(self, url, **args):
         super().__init__(self, url, **args)
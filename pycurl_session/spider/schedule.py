@@ -10,6 +10,7 @@ import time
 import gc
 
 from collections import deque
+from concurrent.futures.process import BrokenProcessPool
 from copy import deepcopy, copy
 from inspect import isgenerator
 from urllib.parse import urlparse
@@ -17,15 +18,23 @@ from urllib.parse import urlparse
 import pycurl
 from pycurl_session import Session, ColoredConsoleHandler
 from pycurl_session.response import Response
+from pycurl_session.session import CurlHandle
 from pycurl_session.spider import settings
 from pycurl_session.spider.exceptions import IgnoreRequest, DropItem, CloseSpider, PerformError, RetryRequest
 from pycurl_session.spider.middleware import Statistics, RobotsTxt, CookiesDebug
+from pycurl_session.spider.metrics import ScheduleMetrics
+from pycurl_session.spider.offload import ParseOffload, unpack_request
+from pycurl_session.spider.pipeline import PipelineRunner
+from pycurl_session.spider.pqueue import PriorityQueue
+from pycurl_session.spider.profiler import StageProfiler
 from pycurl_session.spider.request import Request
 from pycurl_session.spider.task import TaskItem, Task
 
 
 class Schedule(object):
     name = "Schedule"
+    # seconds to keep prefetch connection, for TLS 1.3 session ticket sent after handshake
+    prefetch_ticket_wait = 0.2
 
     def __init__(self, custom_settings={}):
         self.init_success = True
@@ -49,15 +58,25 @@ class Schedule(object):
         self.set_multi_cookiejar(self.settings["BOT"])
 
         self.cm = pycurl.CurlMulti()
-        self.queue_pending = deque()
+        self.queue_pending = PriorityQueue()
         self.queue_delay = deque()
         self.queue_pending_item = None
         self.curl_pool = deque()
         self.curl_pool_max = max(16, self.settings["CONCURRENT_REQUESTS"] * 2)
         self.curl_handles = {}
         self.num_handles = 0    # running handle count
+        # DNS_PREFETCH, CONNECT_ONLY handles in own CurlMulti, not counted in num_handles
+        self.share = None
+        self.prefetch_cm = None
+        self.prefetch_pending = deque()     # url_parsed of new hosts
+        self.prefetch_handles = []
+        self.prefetch_connected = deque()   # (close time, c)
+        self.prefetch_hosts = set()
+        if self.settings["DNS_PREFETCH_ENABLED"]:
+            self.set_prefetch()
 
         self.spider_instance = {}
+        self.spider_args = {}
         self.spider_task = {}
         self.spider_task_done = set()
         self.middleware = []
@@ -69,6 +88,12 @@ class Schedule(object):
         self.set_pipeline()
 
         self.response_ref = {}
+        self.parse_offload = None
+        self.pipeline_runner = None
+        self.metrics = None
+        self.profiler = None
+        # set by ShardSchedule, when run in multiple processes
+        self.shard = None
 
     def update_settings(self, custom_settings):
         for item in dir(settings):
@@ -175,6 +200,11 @@ class Schedule(object):
                 self.logger.exception(e)
                 self.init_success = False
 
+    def get_pipeline_logger(self, pipline):
+        if hasattr(pipline, "_logger_name"):
+            return logging.getLogger(pipline._logger_name)
+        return self.logger
+
     def run_pipeline(self, item, spider):
         # only support dict type
         if not isinstance(item, dict): return
@@ -182,22 +212,31 @@ class Schedule(object):
         if count not in self.logstat:
             self.logstat.update({count: 0})
         self.logstat[count] += 1
+        if self.metrics is not None:
+            self.metrics.on_item(spider.spider_id)
+        if self.pipeline_runner is not None:
+            self.pipeline_runner.put(item, spider)
+            return
+        self.process_pipeline([item], spider)
+
+    def process_pipeline(self, items, spider):
+        # pipeline with process_items(items, spider) get whole batch
         for pipline in self.pipeline:
-            if hasattr(pipline, "process_item"):
+            if hasattr(pipline, "process_items"):
                 try:
-                    pipline.process_item(item, spider)
+                    pipline.process_items(items, spider)
                 except DropItem as e:
-                    if hasattr(pipline, "_logger_name"):
-                        log = logging.getLogger(pipline._logger_name)
-                    else:
-                        log = self.logger
-                    log.info(f"Drop item in spider[{0}] {1}".format(spider.spider_id, e))
+                    self.get_pipeline_logger(pipline).info("Drop items in spider[{0}] {1}".format(spider.spider_id, e))
                 except Exception as e:
-                    if hasattr(pipline, "_logger_name"):
-                        log = logging.getLogger(pipline._logger_name)
-                    else:
-                        log = self.logger
-                    log.exception(e)
+                    self.get_pipeline_logger(pipline).exception(e)
+            elif hasattr(pipline, "process_item"):
+                for item in items:
+                    try:
+                        pipline.process_item(item, spider)
+                    except DropItem as e:
+                        self.get_pipeline_logger(pipline).info("Drop item in spider[{0}] {1}".format(spider.spider_id, e))
+                    except Exception as e:
+                        self.get_pipeline_logger(pipline).exception(e)
 
     def add_spider(self, spider, task_provider:Task=Task, **arg):
         spider_name = ".".join([spider.__name__, spider.name])
@@ -221,6 +260,7 @@ class Schedule(object):
         spider_id = instance.spider_id
         self.set_logger(spider_id)
         self.spider_instance.update({spider_id: instance})
+        self.spider_args.update({spider_id: (spider, arg)})
         try:
             if not issubclass(task_provider, Task):
                 self.logger.error("add_spider() keyword argument 'task_provider' need class Task")
@@ -229,6 +269,11 @@ class Schedule(object):
             self.logger.exception("Add spider [{0}] failed: {1}".format(spider_name, e))
             self.init_success = False
             return
+        if self.prefetch_cm is not None:
+            # look ahead start_urls
+            for taskitem in getattr(self.spider_task[spider_id], "queue", []):
+                if isinstance(taskitem.item, Request):
+                    self.put_prefetch(taskitem.item)
 
     def get_queue_item(self):
         for spider_id, _ in self.spider_instance.items():
@@ -245,14 +290,17 @@ class Schedule(object):
         if len(self.curl_pool):
             return self.curl_pool.popleft()
         else:
-            return pycurl.Curl()
+            return CurlHandle()
 
     def put_curl_pool(self, c):
-        c.reset()
+        if not isinstance(c, CurlHandle):
+            c.reset()
+        # else: CurlHandle keep options, next prepare_curl_handle only set the changed ones
         if hasattr(c, "in_pool") and c.in_pool == 1:
             self.session.init_curl_var(c)
             if hasattr(c, "spider_request"): del c.spider_request
-            if hasattr(c, "meta"): c.meta.clear()
+            # meta is owned by request and response now, drop it, do not clear
+            if hasattr(c, "meta"): c.meta = None
             if hasattr(c, "top_domain"): c.top_domain = None
             if hasattr(c, "domain"): c.domain = None
             if hasattr(c, "spider_id"): c.spider_id = None
@@ -266,14 +314,115 @@ class Schedule(object):
         return self.queue_pending.popleft()
 
     def put_pending_taskitem(self, taskitem):
+        # Request.priority first, then DEPTH_PRIORITY in same priority
         if self.settings["DEPTH_PRIORITY"]:
             self.queue_pending.appendleft(taskitem)
         else:
             self.queue_pending.append(taskitem)
+        if self.prefetch_cm is not None and isinstance(taskitem.item, Request):
+            self.put_prefetch(taskitem.item)
+
+    def set_prefetch(self):
+        # request handles use DNS cache and TLS sessions of share, instead of their CurlMulti
+        self.share = pycurl.CurlShare()
+        self.share.setopt(pycurl.SH_SHARE, pycurl.LOCK_DATA_DNS)
+        self.share.setopt(pycurl.SH_SHARE, pycurl.LOCK_DATA_SSL_SESSION)
+        self.prefetch_cm = pycurl.CurlMulti()
+
+    def put_prefetch(self, request):
+        # first queued request of new host
+        url_parsed = request.url_parsed
+        host = url_parsed.netloc
+        if (host in self.prefetch_hosts
+            or host in self.curl_handles
+            or url_parsed.scheme not in ["http", "https"]
+            # connect to proxy, not the host
+            or (request._meta and "proxy" in request._meta)
+            or self.session.proxy
+        ):
+            return
+        if self.shard is not None and not self.shard.own(request.url):
+            return
+        self.prefetch_hosts.add(host)
+        self.prefetch_pending.append(url_parsed)
+
+    def process_prefetch(self):
+        while (len(self.prefetch_pending) > 0
+            and len(self.prefetch_handles) < self.settings["DNS_PREFETCH_MAX"]
+        ):
+            url_parsed = self.prefetch_pending.popleft()
+            if url_parsed.netloc in self.curl_handles:
+                # first request is sent already
+                continue
+            c = pycurl.Curl()
+            c.url_parsed = url_parsed
+            self.session.init_curl_var(c)
+            c.setopt(pycurl.URL, "{0}://{1}/".format(url_parsed.scheme, url_parsed.netloc))
+            c.setopt(pycurl.CONNECT_ONLY, 1)
+            c.setopt(pycurl.CONNECTTIMEOUT, self.settings["DOWNLOAD_TIMEOUT"])
+            c.setopt(pycurl.SHARE, self.share)
+            if url_parsed.scheme == "https":
+                # same TLS options as request, or TLS session is not reused
+                self.session._set_ssl(c)
+            self.prefetch_cm.add_handle(c)
+            self.prefetch_handles.append(c)
+        if len(self.prefetch_connected) > 0:
+            self.process_prefetch_connected()
+        if len(self.prefetch_handles) == 0:
+            return
+        while 1:
+            ret, num_handles = self.prefetch_cm.perform()
+            if ret != pycurl.E_CALL_MULTI_PERFORM:
+                break
+        if num_handles == len(self.prefetch_handles):
+            return
+        num_q, ok_list, err_list = self.prefetch_cm.info_read()
+        for c in ok_list:
+            self.logstat["dns_prefetch/connected"] = self.logstat.get("dns_prefetch/connected", 0) + 1
+            # keep in prefetch_cm, recv() need it
+            self.prefetch_handles.remove(c)
+            wait = self.prefetch_ticket_wait if c.url_parsed.scheme == "https" else 0
+            self.prefetch_connected.append((time.time() + wait, c))
+        for c, errno, errmsg in err_list:
+            self.logstat["dns_prefetch/failed"] = self.logstat.get("dns_prefetch/failed", 0) + 1
+            self.prefetch_cm.remove_handle(c)
+            self.prefetch_handles.remove(c)
+            c.close()
+
+    def process_prefetch_connected(self):
+        # libcurl does not reuse CONNECT_ONLY connection, close it. DNS cache and TLS session are kept in share.
+        # TLS 1.3 session ticket comes after handshake, it is stored when libcurl read the connection
+        now = time.time()
+        for _ in range(len(self.prefetch_connected)):
+            close_time, c = self.prefetch_connected.popleft()
+            try:
+                c.recv(1)
+            except BlockingIOError:
+                if close_time > now:
+                    self.prefetch_connected.append((close_time, c))
+                    continue
+            except pycurl.error:
+                pass
+            self.prefetch_cm.remove_handle(c)
+            c.close()
+
+    def close_prefetch(self):
+        for c in self.prefetch_handles:
+            self.prefetch_cm.remove_handle(c)
+            c.close()
+        self.prefetch_handles.clear()
+        for _, c in self.prefetch_connected:
+            self.prefetch_cm.remove_handle(c)
+            c.close()
+        self.prefetch_connected.clear()
+        self.prefetch_pending.clear()
+        self.prefetch_hosts.clear()
+        self.prefetch_cm.close()
+        self.prefetch_cm = None
 
     def make_curl_handle(self, request, spider):
         url = request.url
-        url_parsed = urlparse(url)
+        url_parsed = request.url_parsed
         url_domain = url_parsed.netloc
         top_domain = (
             url_domain[url_domain.find(".") :]
@@ -307,6 +456,8 @@ class Schedule(object):
         c.top_domain = top_domain
         c.domain = url_domain
         c.spider_id = spider.spider_id
+        if self.share is not None:
+            c.setopt(pycurl.SHARE, self.share)
         c.max_retry_times = meta.get("max_retry_times", self.settings["RETRY_TIMES"])
         if meta.get("dont_retry", False):
             c.max_retry_times = 0
@@ -317,10 +468,40 @@ class Schedule(object):
         c.spider_request = request
         return c
 
-    def run_request_callback(self, request, response, spider):
+    def set_request_from_response(self, result, spider_id, response_request):
+        result.headers.update({
+            "referer": response_request["url"]
+        })
+        # new request persist origin_url if:
+        # Spider.URL_PERSIST = True
+        # request.meta has not 'url_persist' or its value is True
+        url_persist = False
+        if (spider_id in self.spider_instance
+            and hasattr(self.spider_instance[spider_id], "URL_PERSIST")
+        ):
+            url_persist = self.spider_instance[spider_id].URL_PERSIST
+        if url_persist:
+            url_persist_in_meta = result.meta.get("url_persist")
+            if url_persist_in_meta is None or url_persist_in_meta:
+                result.origin_url = response_request["origin_url"]
+
+    def run_request_callback(self, request, response, spider, offload=True):
         spider_id = spider.spider_id
+        if (offload
+            and self.parse_offload is not None
+            and self.parse_offload.can_offload(request, spider)
+        ):
+            # result handle in process_parse_result()
+            self.parse_offload.submit(request, response, spider)
+            return True
         try:
-            item = request._run_callback(response, **request.cb_kwargs)
+            if self.profiler is not None:
+                stage = "callback/{0}.{1}".format(spider_id, getattr(request.callback, "__name__", request.callback))
+                item = self.profiler.call(stage, request._run_callback, response, **request.cb_kwargs)
+                if isgenerator(item):
+                    item = self.profiler.wrap_generator(item, stage)
+            else:
+                item = request._run_callback(response, **request.cb_kwargs)
         except Exception as e:
             spider._get_logger().exception(e)
             return True
@@ -338,23 +519,9 @@ class Schedule(object):
                         self.run_pipeline(result, spider)
                         continue
                     if isinstance(result, Request):
-                        result.headers.update({
-                            "referer": response.request["url"]
-                        })
-                        # new request persist origin_url if:
-                        # Spider.URL_PERSIST = True
-                        # request.meta has not 'url_persist' or its value is True
-                        url_persist = False
-                        if (spider_id in self.spider_instance
-                            and hasattr(self.spider_instance[spider_id], "URL_PERSIST")
-                        ):
-                            url_persist = self.spider_instance[spider_id].URL_PERSIST
-                        if url_persist:
-                            url_persist_in_meta = result.meta.get("url_persist")
-                            if url_persist_in_meta is None or url_persist_in_meta:
-                                result.origin_url = response.request["origin_url"]
-                        self.put_pending_taskitem(TaskItem(spider_id, result))
-                        self.put_pending_taskitem(TaskItem(spider_id, item))
+                        self.set_request_from_response(result, spider_id, response.request)
+                        self.put_pending_taskitem(TaskItem(spider_id, result, result.priority))
+                        self.put_pending_taskitem(TaskItem(spider_id, item, request.priority))
                         break
                     # other, ignore
                     continue
@@ -370,6 +537,80 @@ class Schedule(object):
                 break
         return True
 
+    def process_parse_result(self, timeout=0):
+        # collect result of callback run in process pool
+        done = self.parse_offload.pop_done(timeout)
+        for index, (future, spider_id, request, response) in enumerate(done):
+            spider = self.spider_instance[spider_id]
+            try:
+                results, close_reason = future.result()
+            except BrokenProcessPool as e:
+                # every running and later callback fail the same way, stop offload once
+                self.logger.error("Parse process pool broken, run callback in schedule loop from now on: {0}".format(repr(e)))
+                rest = done[index:] + self.parse_offload.futures
+                self.parse_offload.shutdown(wait=False)
+                self.parse_offload = None
+                for _, rest_spider_id, rest_request, rest_response in rest:
+                    self.run_request_callback(
+                        rest_request, rest_response, self.spider_instance[rest_spider_id], offload=False
+                    )
+                return
+            except Exception as e:
+                # e.g. response.meta can not pickle, or worker process broken
+                self.logger.warning("Parse in process failed, run inline <{0} {1}>: {2}".format(
+                    request.method, request.url, repr(e)
+                ))
+                self.run_request_callback(request, response, spider, offload=False)
+                continue
+            requests = []
+            for result in results:
+                if isinstance(result, dict):
+                    self.run_pipeline(result, spider)
+                elif isinstance(result, Request):
+                    requests.append(result)
+            # all request come back together, keep yield order in queue_pending
+            if self.settings["DEPTH_PRIORITY"]:
+                requests.reverse()
+            for result in requests:
+                unpack_request(result, spider)
+                self.set_request_from_response(result, spider_id, response.request)
+                self.put_pending_taskitem(TaskItem(spider_id, result, result.priority))
+            if close_reason:
+                self.manual_close_task(spider, CloseSpider(close_reason))
+
+    def run_stage(self, stage, func, *args):
+        if self.profiler is None:
+            return func(*args)
+        return self.profiler.call(stage, func, *args)
+
+    def set_profiler(self):
+        self.profiler = StageProfiler(
+            cprofile_path=self.settings["PROFILE_CPROFILE"],
+            dump_interval=self.settings["PROFILE_DUMP_INTERVAL"],
+        )
+        for middleware in self.middleware + [self.robotstxt]:
+            for name in ["process_request", "process_response", "process_exception"]:
+                self.profiler.wrap_method(
+                    middleware, name, "middleware/{0}.{1}".format(middleware.__class__.__name__, name)
+                )
+        for pipeline in self.pipeline:
+            for name in ["process_item", "process_items"]:
+                self.profiler.wrap_method(
+                    pipeline, name, "pipeline/{0}.{1}".format(pipeline.__class__.__name__, name)
+                )
+
+    def process_shard(self):
+        def is_idle():
+            return (self.num_handles == 0
+                and len(self.queue_pending) == 0
+                and (self.parse_offload is None or len(self.parse_offload) == 0)
+                and len(self.spider_task_done) >= len(self.spider_task)
+            )
+        # cm.select() return at once without handle, wait for forward request instead of busy loop
+        for taskitem in self.shard.poll(self.spider_instance, timeout=0.01 if is_idle() else 0):
+            self.put_pending_taskitem(taskitem)
+        self.shard.set_idle(is_idle())
+
     def add_curl_handle(self, c):
         self.cm.add_handle(c)
         self.num_handles += 1
@@ -409,23 +650,9 @@ class Schedule(object):
                             continue
                         if isinstance(result, Request):
                             if id(item) in self.response_ref:
-                                result.headers.update({
-                                    "referer": self.response_ref[id(item)]["url"]
-                                })
-                                # new request persist origin_url if:
-                                # Spider.URL_PERSIST = True
-                                # request.meta has not 'url_persist' or its value is True
-                                url_persist = False
-                                if (spider_id in self.spider_instance
-                                    and hasattr(self.spider_instance[spider_id], "URL_PERSIST")
-                                ):
-                                    url_persist = self.spider_instance[spider_id].URL_PERSIST
-                                if url_persist:
-                                    url_persist_in_meta = result.meta.get("url_persist")
-                                    if url_persist_in_meta is None or url_persist_in_meta:
-                                        result.origin_url = self.response_ref[id(item)]["origin_url"]
-                            self.put_pending_taskitem(TaskItem(spider_id, item))
-                            self.put_pending_taskitem(TaskItem(spider_id, result))
+                                self.set_request_from_response(result, spider_id, self.response_ref[id(item)])
+                            self.put_pending_taskitem(TaskItem(spider_id, item, queue_item.priority))
+                            self.put_pending_taskitem(TaskItem(spider_id, result, result.priority))
                             break
                         # other, ignore
                         continue
@@ -444,8 +671,19 @@ class Schedule(object):
                 # ========== process isgenerator end ==========
             elif isinstance(item, Request):
                 # ========== process request start ==========
+                if self.shard is not None and not self.shard.own(item.url):
+                    # other worker process own this domain
+                    try:
+                        self.shard.forward(queue_item, spider)
+                    except Exception as e:
+                        # e.g. meta can not be pickled, the request is dropped
+                        spider._get_logger().error("Forward <{0} {1}> failed".format(item.method, item.url))
+                        spider._get_logger().exception(e)
+                    self.queue_pending_item = None
+                    del queue_item
+                    continue
                 url = item.url
-                url_parsed = urlparse(url)
+                url_parsed = item.url_parsed
                 url_domain = url_parsed.netloc
                 if url_domain not in self.curl_handles:
                     delay = self.settings["DOWNLOAD_DELAY_DOMAIN"].get(url_domain)
@@ -463,11 +701,11 @@ class Schedule(object):
                     try:
                         ret = self.robotstxt.process_request(item, spider)
                         if isinstance(ret, Request):
-                            self.queue_delay.append(TaskItem(spider_id, ret))
-                            self.queue_delay.append(TaskItem(spider_id, item))
+                            self.queue_delay.append(TaskItem(spider_id, ret, ret.priority))
+                            self.queue_delay.append(TaskItem(spider_id, item, item.priority))
                             continue
                         if isinstance(ret, Response):
-                            self.queue_delay.append(TaskItem(spider_id, item))
+                            self.queue_delay.append(TaskItem(spider_id, item, item.priority))
                             continue
                     except IgnoreRequest:
                         self.queue_pending_item = None
@@ -503,7 +741,7 @@ class Schedule(object):
                                 ret = middleware.process_request(c.spider_request, spider)
                                 if ret is None: continue
                                 if isinstance(ret, Request):
-                                    self.queue_delay.append(TaskItem(spider_id, ret))
+                                    self.queue_delay.append(TaskItem(spider_id, ret, ret.priority))
                                     get_new_queue_item = True
                                     break
                                 if isinstance(ret, Response):
@@ -522,6 +760,8 @@ class Schedule(object):
                         self.put_curl_pool(c)
                         continue
                     # ========== Middleware end ==========
+                    # middleware may update request.headers, e.g. If-None-Match
+                    self.session.set_request_headers(c, c.spider_request.headers)
                     self.add_curl_handle(c)
                     del queue_item
                 else:
@@ -578,7 +818,7 @@ class Schedule(object):
                 if new_top_domain != old_top_domain:
                     # new domain, put back to queue, and delete curl
                     c.spider_request.url = new_url
-                    self.queue_pending.appendleft(TaskItem(c.spider_id, c.spider_request))
+                    self.queue_pending.appendleft(TaskItem(c.spider_id, c.spider_request, c.spider_request.priority))
                     return True
             # put back to running handle
             self.add_curl_handle(c)
@@ -599,6 +839,8 @@ class Schedule(object):
             )
             self.add_curl_handle(c)
             if c.retry <= c.max_retry_times:
+                if self.metrics is not None:
+                    self.metrics.on_retry(spider_id)
                 return False
         return self.run_request_callback(c.spider_request, response, spider)
 
@@ -623,8 +865,10 @@ class Schedule(object):
 
         response = Response(session=self.session)
         self.session.gather_response(c, response)
-        response.meta = deepcopy(c.meta)
-        response.headers = deepcopy(c.header_handler.headers)
+        if self.metrics is not None:
+            self.metrics.on_response(spider_id, response)
+        # no copy, response.meta is request.meta, c.meta is dropped when c recycled
+        response.meta = c.meta
         response.request.update({"origin_url": c.spider_request.origin_url})
 
         # ========== Middleware start ==========
@@ -641,7 +885,7 @@ class Schedule(object):
                     ret = middleware.process_response(c.spider_request, response, spider)
                     if ret is None: continue
                     if isinstance(ret, Request):
-                        self.put_pending_taskitem(TaskItem(spider_id, ret))
+                        self.put_pending_taskitem(TaskItem(spider_id, ret, ret.priority))
                         get_new_queue_item = True
                         break
                     if isinstance(ret, Response):
@@ -653,9 +897,9 @@ class Schedule(object):
                 except Exception as e:
                     spider._get_logger().exception(e)
         if get_new_queue_item:
-            # new request, no need to process response
+            # new request or ignored, no need to process response, c is no more use
             del response
-            return ret
+            return True
         # ========== Middleware end ==========
         # ========== process_response start ==========
         ret = self.process_response(response, c)
@@ -667,6 +911,8 @@ class Schedule(object):
     def process_curl_multi_err(self, c, errno, errmsg):
         spider_id = c.spider_id
         spider = self.spider_instance[spider_id]
+        if self.metrics is not None:
+            self.metrics.on_error(spider_id, errno)
 
         # ========== Middleware start ==========
         free_c = True
@@ -683,7 +929,7 @@ class Schedule(object):
                     ret = middleware.process_exception(c.spider_request, PerformError(errno, errmsg), spider)
                     if ret is None: continue
                     if isinstance(ret, Request):
-                        self.put_pending_taskitem(TaskItem(spider_id, ret))
+                        self.put_pending_taskitem(TaskItem(spider_id, ret, ret.priority))
                         get_new_queue_item = True
                         break
                     if isinstance(ret, Response):
@@ -695,6 +941,8 @@ class Schedule(object):
                         self.cm.remove_handle(c)
                         self.add_curl_handle(c)
                         free_c = False
+                        if self.metrics is not None:
+                            self.metrics.on_retry(spider_id)
                         # middleware control log
                     else:
                         msg = "Failed to process <{0} {1}>, try max time.".format(
@@ -746,6 +994,7 @@ class Schedule(object):
                     temp_queue.appendleft(item)
             while len(temp_queue) > 0:
                 self.queue_delay.appendleft(temp_queue.popleft())
+            self.flush_task(spider_id)
 
 
     def process_close_call(self):
@@ -756,11 +1005,7 @@ class Schedule(object):
                     try:
                         pipline.close_spider(spider)
                     except Exception as e:
-                        if hasattr(pipline, "_logger_name"):
-                            log = logging.getLogger(pipline._logger_name)
-                        else:
-                            log = self.logger
-                        log.exception(e)
+                        self.get_pipeline_logger(pipline).exception(e)
 
             # spider closed()
             if hasattr(spider, "closed"):
@@ -790,6 +1035,17 @@ class Schedule(object):
                         count += 1
         except Exception as e:
             self.logger.exception(e)
+        for spider_id in self.spider_task:
+            self.flush_task(spider_id)
+
+    def flush_task(self, spider_id):
+        # send url from Task.put() back to redis in batch
+        task = self.spider_task.get(spider_id)
+        if task is not None and hasattr(task, "flush"):
+            try:
+                task.flush()
+            except Exception as e:
+                self.logger.exception(e)
 
     def run(self):
         if not self.init_success: return
@@ -807,6 +1063,29 @@ class Schedule(object):
         self.logger.info("Backend info: {0}".format(backend_info))
         self.logger.info("Overridden settings: {0}".format(self.settings))
         self.logger.info("Enabled spider: {0}".format(list(self.spider_task.keys())))
+        if self.settings["PARSE_PROCESSES"] > 0:
+            self.parse_offload = ParseOffload(
+                self.settings["PARSE_PROCESSES"],
+                [
+                    (spider_id, spider, arg, self.spider_instance[spider_id].settings)
+                    for spider_id, (spider, arg) in self.spider_args.items()
+                ],
+            )
+            self.logger.info("Parse callback in {0} processes".format(self.settings["PARSE_PROCESSES"]))
+        if self.settings["PIPELINE_THREADS"] > 0 and self.pipeline:
+            self.pipeline_runner = PipelineRunner(
+                self.process_pipeline,
+                threads=self.settings["PIPELINE_THREADS"],
+                batch_size=self.settings["PIPELINE_BATCH_SIZE"],
+                flush_interval=self.settings["PIPELINE_FLUSH_INTERVAL"],
+                queue_size=self.settings["PIPELINE_QUEUE_SIZE"],
+            )
+        if self.settings["PROFILE"]:
+            self.set_profiler()
+        if self.settings["METRICS_PORT"] or self.settings["METRICS_TEXTFILE"]:
+            self.metrics = ScheduleMetrics(self)
+            if self.metrics.server is not None:
+                self.logger.info("Metrics on http://{0}:{1}/metrics".format(self.settings["METRICS_HOST"], self.metrics.server.port))
         self.logger.info("Spider started")
         # ========== schedule info end ==========
         # ========== main loop start ==========
@@ -821,7 +1100,10 @@ class Schedule(object):
         loop_init = True
         to_update_cm = True
         running_handles = 0
-        while loop_init or self.num_handles > 0 or len(self.queue_pending) > 0:
+        while (loop_init or self.num_handles > 0 or len(self.queue_pending) > 0
+            or (self.parse_offload is not None and len(self.parse_offload) > 0)
+            or (self.shard is not None and not self.shard.should_stop())
+        ):
             loop_init = False
             try:
                 while 1:
@@ -848,12 +1130,12 @@ class Schedule(object):
                     running_handles = self.num_handles
                     num_q, ok_list, err_list = self.cm.info_read()
                     for c in ok_list:
-                        recycle = self.process_curl_multi_ok(c)
+                        recycle = self.run_stage("process_curl_multi_ok", self.process_curl_multi_ok, c)
                         self.recycle_curl(c, recycle)
                         per_min_page += 1
 
                     for c, errno, errmsg in err_list:
-                        recycle = self.process_curl_multi_err(c, errno, errmsg)
+                        recycle = self.run_stage("process_curl_multi_err", self.process_curl_multi_err, c, errno, errmsg)
                         self.recycle_curl(c, recycle)
                         per_min_page += 1
 
@@ -861,12 +1143,35 @@ class Schedule(object):
                         gc_time = time.time()
                         gc.collect()
 
+                if self.shard is not None:
+                    self.run_stage("process_shard", self.process_shard)
+
+                if self.prefetch_cm is not None:
+                    self.run_stage("process_prefetch", self.process_prefetch)
+
+                if self.metrics is not None:
+                    self.metrics.process_tick()
+                if self.profiler is not None:
+                    self.profiler.process_tick()
+
+                if self.parse_offload is not None:
+                    # no running handle, wait for parse result instead of busy loop
+                    self.run_stage("process_parse_result", self.process_parse_result, 0.01 if self.num_handles == 0 else 0)
+
                 # when to add new curl?
                 if (to_update_cm
                     and running_handles <= self.settings["CONCURRENT_REQUESTS"]
+                    # too many response wait for parse in process pool
+                    and (self.parse_offload is None
+                        or len(self.parse_offload) < self.settings["CONCURRENT_REQUESTS"] * 2)
+                    # item pipeline queue is full
+                    and (self.pipeline_runner is None or not self.pipeline_runner.full())
                     # and len(self.queue_pending) <= self.settings["CONCURRENT_REQUESTS"]
                 ):
-                    self.collect_curl_multi()
+                    self.run_stage("collect_curl_multi", self.collect_curl_multi)
+                # handles added by collect_curl_multi or retry are counted in num_handles,
+                # or a handle added and done in one perform() is never read by info_read()
+                running_handles = self.num_handles
                 # when Ctrl+c, wait for running_handles to be 0
                 if to_update_cm == False and running_handles == 0:
                     break
@@ -889,8 +1194,27 @@ class Schedule(object):
                     break
         # ========== main loop end ==========
 
+        if self.parse_offload is not None:
+            self.parse_offload.shutdown()
+            self.parse_offload = None
+        if self.pipeline_runner is not None:
+            self.pipeline_runner.close()
+            self.pipeline_runner = None
+        if self.metrics is not None:
+            self.metrics.close()
+            self.metrics = None
+        if self.profiler is not None:
+            # after pipeline threads stop
+            self.profiler.close()
+
         # all spider done, spider call closed() and item pipeline call close_spider()
         self.process_close_call()
+        for middleware in self.middleware:
+            if hasattr(middleware, "close"):
+                try:
+                    middleware.close()
+                except Exception as e:
+                    self.logger.exception(e)
 
         # some clean work. may be usefull
         self.queue_pending.clear()
@@ -899,6 +1223,11 @@ class Schedule(object):
         self.curl_handles.clear()
         self.response_ref.clear()   # important
         self.cm.close()
+        if self.prefetch_cm is not None:
+            self.close_prefetch()
+        for task in self.spider_task.values():
+            if hasattr(task, "process_logstat"):
+                self.logstat.update(task.process_logstat())
         self.spider_task.clear()
 
         # ========== logstat start ==========
@@ -907,5 +1236,8 @@ class Schedule(object):
         for middleware in self.middleware:
             if hasattr(middleware, "process_logstat"):
                 self.logstat.update(middleware.process_logstat())
+        if self.profiler is not None:
+            self.logstat.update(self.profiler.process_logstat())
+            self.profiler = None
         self.logger.info("Dumping logstat:\n" + json.dumps(self.logstat, sort_keys=True, indent=4, separators=(',', ': ')))
         # ========== logstat end ==========
@@ -0,0 +1,99 @@
+# coding: utf-8
+
+import os
+import struct
+import time
+
+
+class SegmentStore(object):
+    ''' append-only key-value store in one directory, for many small records.
+            segment-00000.dat ... - values, appended one by one, new segment when size > segment_size
+            index.dat - fixed size records (key, segment, offset, length, time), appended after value
+        index is loaded in memory when open, last record of a key wins.
+        one writer only, ShardSchedule worker use its own directory.
+    '''
+    INDEX_RECORD = struct.Struct("<20sIQId")
+    INDEX_FILE = "index.dat"
+    SEGMENT_FILE = "segment-{0:05d}.dat"
+
+    def __init__(self, path, segment_size=64 * 1024 * 1024):
+        if not os.path.exists(path):
+            os.makedirs(path)
+        self.path = path
+        self.segment_size = segment_size
+        self.index = {}     # {key: (segment, offset, length, time)}
+        self.readers = {}   # {segment: file}
+        self.load_index()
+        self.segment = max([item[0] for item in self.index.values()] or [0])
+        self.writer = open(os.path.join(path, self.SEGMENT_FILE.format(self.segment)), "ab")
+        self.index_writer = open(os.path.join(path, self.INDEX_FILE), "ab")
+
+    def load_index(self):
+        index_path = os.path.join(self.path, self.INDEX_FILE)
+        if not os.path.exists(index_path):
+            return
+        with open(index_path, "rb") as f:
+            data = f.read()
+        size = self.INDEX_RECORD.size
+        # last record may be cut off if process is killed when writing, ignore it
+        count = len(data) // size
+        for key, segment, offset, length, timestamp in self.INDEX_RECORD.iter_unpack(data[:count * size]):
+            self.index[key] = (segment, offset, length, timestamp)
+        if len(data) != count * size:
+            with open(index_path, "r+b") as f:
+                f.truncate(count * size)
+
+    def __contains__(self, key):
+        return key in self.index
+
+    def __len__(self):
+        return len(self.index)
+
+    def get(self, key):
+        ''' return (value, time), or None '''
+        item = self.index.get(key)
+        if item is None:
+            return None
+        segment, offset, length, timestamp = item
+        reader = self.readers.get(segment)
+        if reader is None:
+            reader = open(os.path.join(self.path, self.SEGMENT_FILE.format(segment)), "rb")
+            self.readers.update({segment: reader})
+        reader.seek(offset)
+        value = reader.read(length)
+        if len(value) != length:
+            return None
+        return value, timestamp
+
+    def set(self, key, value, timestamp=None):
+        ''' key: 20 bytes, e.g. sha1 digest '''
+        if self.writer.tell() + len(value) > self.segment_size and self.writer.tell() > 0:
+            self.writer.close()
+            self.segment += 1
+            self.writer = open(os.path.join(self.path, self.SEGMENT_FILE.format(self.segment)), "ab")
+        offset = self.writer.tell()
+        self.writer.write(value)
+        # value first, index record never point to missing data
+        self.writer.flush()
+        timestamp = timestamp or time.time()
+        self.index_writer.write(self.INDEX_RECORD.pack(key, self.segment, offset, len(value), timestamp))
+        self.index_writer.flush()
+        self.index[key] = (self.segment, offset, len(value), timestamp)
+
+    def touch(self, key, timestamp=None):
+        ''' update time of key, append index record only, value is not copied '''
+        item = self.index.get(key)
+        if item is None:
+            return False
+        segment, offset, length, _ = item
+        timestamp = timestamp or time.time()
+        self.index_writer.write(self.INDEX_RECORD.pack(key, segment, offset, length, timestamp))
+        self.index_writer.flush()
+        self.index[key] = (segment, offset, length, timestamp)
+        return True
+
+    def close(self):
+        for f in [self.writer, self.index_writer] + list(self.readers.values()):
+            if not f.closed:
+                f.close()
+        self.readers.clear()
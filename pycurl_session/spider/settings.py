@@ -30,14 +30,71 @@ DOWNLOAD_DELAY_DOMAIN = {}
 ## DOWNLOADER_MIDDLEWARES
 DOWNLOADER_MIDDLEWARES = []
 
+## HTTPCACHE, for pycurl_session.spider.middleware.HttpCacheMiddleware
+# directory of segment files and index, None for <tempdir>/pycurl_session/httpcache/<spider.name>
+HTTPCACHE_DIR = None
+# cached response older than this is downloaded again, 0 for never expire
+HTTPCACHE_EXPIRATION_SECS = 0
+# response with these status code is not cached
+HTTPCACHE_IGNORE_HTTP_CODES = []
+# drop request not in cache, replay offline
+HTTPCACHE_IGNORE_MISSING = False
+HTTPCACHE_SEGMENT_SIZE = 64 * 1024 * 1024
+
+## REVALIDATE, for pycurl_session.spider.middleware.RevalidateMiddleware
+# directory of ETag and Last-Modified store, None for <tempdir>/pycurl_session/revalidate/<spider.name>
+REVALIDATE_DIR = None
+# drop 304 response, callback is not called. request.meta["skip_not_modified"] first
+REVALIDATE_SKIP_NOT_MODIFIED = False
+
 ## ITEM_PIPELINES
 ITEM_PIPELINES = []
+# run item pipelines in threads, 0 for disable(run in schedule loop)
+PIPELINE_THREADS = 0
+# items pass to process_items() at once, or after PIPELINE_FLUSH_INTERVAL seconds
+PIPELINE_BATCH_SIZE = 100
+PIPELINE_FLUSH_INTERVAL = 1
+# stop adding new request when queue is full
+PIPELINE_QUEUE_SIZE = 10000
+
+## FEED EXPORT, for pycurl_session.spider.exporter.JsonLinesExporter/CsvExporter
+# support {spider}, {spider_id}, {time}, {index}, {worker}
+FEED_URI = None
+# None, gzip, bz2, xz, zstd(python 3.14+)
+FEED_COMPRESSION = None
+# start new file, size in characters before compress, interval in seconds. 0 for disable
+FEED_ROTATE_SIZE = 0
+FEED_ROTATE_INTERVAL = 0
+FEED_BUFFER_SIZE = 1024 * 1024
+FEED_CSV_FIELDS = None
+# set by ShardSchedule to worker index, add "-{worker}" to file name if FEED_URI has no {worker}
+FEED_WORKER = None
 
 ## REDIRECT and RETRY
 REDIRECT_ENABLED = True
 RETRY_TIMES = 3
 RETRY_HTTP_CODES = [500, 502, 503, 504, 522, 524, 408, 429]
 
+## DNS_PREFETCH, resolve and connect(TCP + TLS) new hosts of queued requests before their first request,
+# by CONNECT_ONLY handles out of CONCURRENT_REQUESTS. DNS cache and TLS sessions are shared with requests
+DNS_PREFETCH_ENABLED = False
+# prefetch connections at the same time
+DNS_PREFETCH_MAX = 8
+
+## METRICS, OpenMetrics text of responses, items, retries, errors, queue size and latency
+# serve on http://METRICS_HOST:METRICS_PORT/metrics, 0 for disable
+METRICS_PORT = 0
+METRICS_HOST = "127.0.0.1"
+# write to file every METRICS_INTERVAL seconds, None for disable
+METRICS_TEXTFILE = None
+METRICS_INTERVAL = 15
+
+## PROFILE, time of schedule stages, middlewares, callbacks and pipelines in logstat "profile/..."
+PROFILE = False
+# also run cProfile in schedule loop thread, dump stats(pstats format) to this path
+PROFILE_CPROFILE = None
+PROFILE_DUMP_INTERVAL = 60
+
 ## LOG
 LOG_ENABLED = False
 LOG_ENCODING = "utf-8"
@@ -46,6 +103,11 @@ LOG_FORMAT = "%(asctime)s %(levelname)s [%(name)s] %(message)s"
 
 ## thread
 CONCURRENT_REQUESTS = 16
+# run spider callback in process pool, 0 for disable(run in schedule loop)
+# spider in worker process is a new instance, only __init__() is called, not init_spider(),
+# its attributes are not shared with schedule or other workers.
+# callback of Request yielded in worker must be a method of spider or a module function
+PARSE_PROCESSES = 0
 
 # DFO or BFO
 DEPTH_PRIORITY = 1
\ No newline at end of file
@@ -56,6 +56,13 @@ class RedisSpider(Spider):
     REDIS_SSL = False
     REDIS_START_URLS_KEY = ""
     REDIS_ENCODING = "utf-8" # latin1
+    # urls get from redis in one round-trip, refill when local buffer size <= REDIS_BATCH_LOW_WATER
+    REDIS_BATCH_SIZE = 16
+    REDIS_BATCH_LOW_WATER = 0
+    # url put back to redis is remembered to put only once, keep at most REDIS_URL_FILTER_SIZE urls
+    # for REDIS_URL_FILTER_TTL seconds(0 for never expire)
+    REDIS_URL_FILTER_SIZE = 100000
+    REDIS_URL_FILTER_TTL = 0
     # if set True, origin_url will attach to every request start from it.
     # if set False, only the request made from redis url will attach origin_url.
     # if request.meta has "url_persist" and its value is False, end attach to new request.
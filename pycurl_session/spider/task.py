@@ -7,14 +7,53 @@ try:
 except ModuleNotFoundError:
     _REDIS_INSTALLED = False
 import socket
+import sys
 import time
-from collections import deque, namedtuple
+from collections import deque, namedtuple, OrderedDict
 
 from pycurl_session.spider.request import Request
 from pycurl_session.spider.spider import Spider, RedisSpider
 
 
-TaskItem = namedtuple("TaskItem", ["spider_id", "item"])
+# priority: copy from Request.priority, higher pop first in Schedule.queue_pending
+TaskItem = namedtuple("TaskItem", ["spider_id", "item", "priority"], defaults=[0])
+
+class UrlFilter(object):
+    ''' bounded set, keep at most capacity urls, url expire after ttl seconds(0 for never) '''
+    def __init__(self, capacity=100000, ttl=0):
+        self.capacity = max(1, capacity)
+        self.ttl = ttl
+        self.data = OrderedDict()   # {url: time added}, oldest first
+
+    def __contains__(self, url):
+        added = self.data.get(url)
+        if added is None:
+            return False
+        if self.ttl and time.time() - added > self.ttl:
+            del self.data[url]
+            return False
+        return True
+
+    def __len__(self):
+        return len(self.data)
+
+    def add(self, url):
+        self.data[url] = time.time()
+        self.data.move_to_end(url)
+        while len(self.data) > self.capacity:
+            self.data.popitem(last=False)
+        if self.ttl:
+            expired = time.time() - self.ttl
+            while len(self.data) > 0 and next(iter(self.data.values())) < expired:
+                self.data.popitem(last=False)
+
+    def clear(self):
+        self.data.clear()
+
+    def memory(self):
+        # bytes, approximate
+        return sys.getsizeof(self.data) + sum(sys.getsizeof(url) for url in self.data)
+
 
 class Task(object):
     name = "spider.Task"
@@ -28,7 +67,11 @@ class Task(object):
         self.redis_key = None
         self.redis_key_type = None
         self.redis_encoding = None
-        self.redis_url_filter = set()
+        self.redis_url_filter = UrlFilter()
+        self.redis_batch_size = 1
+        self.redis_low_water = 0
+        self.redis_buffer = deque()         # url get from redis, not used yet
+        self.redis_put_buffer = []          # url to put back, send by flush()
 
         if hasattr(spider, "start_requests"):
             gen_func = spider.start_requests()
@@ -36,7 +79,7 @@ class Task(object):
         elif hasattr(spider, "start_urls"):
             for url in spider.start_urls:
                 request = Request(url=url, callback=spider.parse, headers={"referer": None})
-                self.queue.append(TaskItem(self.spider.spider_id, request))
+                self.queue.append(TaskItem(self.spider.spider_id, request, request.priority))
         if isinstance(spider, RedisSpider):
             if not _REDIS_INSTALLED:
                 raise Exception("python redis not install(for pip: pip install redis)")
@@ -47,37 +90,79 @@ class Task(object):
             item = self.queue.popleft()
             return item
         if isinstance(self.spider, RedisSpider):
-            key = self.get_redis_key()
-            if self.redis_key_type == "set":
-                url = self.redis_server.spop(key)
-            elif self.redis_key_type == "list":
-                url = self.redis_server.lpop(key)
-            if url:
-                if self.redis_encoding:
-                    url = url.decode(self.redis_encoding)
+            if len(self.redis_buffer) <= self.redis_low_water:
+                self.fetch_redis()
+            if len(self.redis_buffer) > 0:
+                url = self.redis_buffer.popleft()
                 request = Request(url=url, callback=self.spider.parse, headers={"referer": None})
                 request.origin_url = url
                 if hasattr(self.spider, "init_request"):
                     # can modify request when RedisSpider has init_request()
                     self.spider.init_request(request)
-                return TaskItem(self.spider.spider_id, request)
+                return TaskItem(self.spider.spider_id, request, request.priority)
         return None
 
+    def fetch_redis(self):
+        # get REDIS_BATCH_SIZE urls in one round-trip
+        key = self.get_redis_key()
+        count = self.redis_batch_size
+        urls = []
+        if self.redis_key_type == "set":
+            urls = self.redis_server.spop(key, count) or []
+        elif self.redis_key_type == "list":
+            pipe = self.redis_server.pipeline(transaction=True)
+            pipe.lrange(key, 0, count - 1)
+            pipe.ltrim(key, count, -1)
+            urls = pipe.execute()[0] or []
+        for url in urls:
+            if not url:
+                continue
+            if self.redis_encoding and isinstance(url, bytes):
+                url = url.decode(self.redis_encoding)
+            self.redis_buffer.append(url)
+
     def put(self, spider_id, url):
+        # url is sent to redis by flush()
         if (hasattr(self, "spider")
             and hasattr(self.spider, "spider_id")
             and self.spider.spider_id == spider_id
-            and hasattr(self, "redis_server")
-            and isinstance(self.redis_server, (redis.Redis, redis.StrictRedis))
+            and getattr(self, "redis_server", None) is not None
             and url not in self.redis_url_filter
         ):
-            key = self.get_redis_key()
-            if self.redis_key_type == "set":
-                self.redis_server.sadd(key, url)
-            elif self.redis_key_type == "list":
-                self.redis_server.lpush(key, url)
+            self.redis_put_buffer.append(url)
             self.redis_url_filter.add(url)      # action once
 
+    def flush(self):
+        # put back url from put() and url not used in buffer, in one round-trip
+        if getattr(self, "redis_server", None) is None:
+            return
+        urls = self.redis_put_buffer + list(self.redis_buffer)
+        self.redis_put_buffer = []
+        self.redis_buffer.clear()
+        if not urls:
+            return
+        key = self.get_redis_key()
+        if self.redis_key_type == "list":
+            # fetch_redis() reads from the head, lpush in reverse keeps the order
+            urls.reverse()
+        pipe = self.redis_server.pipeline(transaction=False)
+        for i in range(0, len(urls), 1000):
+            if self.redis_key_type == "list":
+                pipe.lpush(key, *urls[i:i + 1000])
+            else:
+                pipe.sadd(key, *urls[i:i + 1000])
+        pipe.execute()
+
+    def process_logstat(self):
+        if getattr(self, "redis_server", None) is None:
+            return {}
+        return {
+            "redis_url_filter/{0}".format(self.spider.spider_id): {
+                "size": len(self.redis_url_filter),
+                "memory": self.redis_url_filter.memory(),
+            }
+        }
+
     def set_redis(self, spider):
         if hasattr(spider, "REDIS_HOST") and spider.REDIS_HOST:
             server_host = spider.REDIS_HOST
@@ -97,6 +182,15 @@ class Task(object):
             server_db = 0
         if hasattr(spider, "REDIS_ENCODING") and spider.REDIS_ENCODING:
             self.redis_encoding = spider.REDIS_ENCODING
+        if hasattr(spider, "REDIS_BATCH_SIZE") and spider.REDIS_BATCH_SIZE:
+            self.redis_batch_size = max(1, int(spider.REDIS_BATCH_SIZE))
+        if hasattr(spider, "REDIS_BATCH_LOW_WATER") and spider.REDIS_BATCH_LOW_WATER:
+            self.redis_low_water = max(0, int(spider.REDIS_BATCH_LOW_WATER))
+        if hasattr(spider, "REDIS_URL_FILTER_SIZE") and spider.REDIS_URL_FILTER_SIZE:
+            self.redis_url_filter = UrlFilter(
+                spider.REDIS_URL_FILTER_SIZE,
+                getattr(spider, "REDIS_URL_FILTER_TTL", 0) or 0,
+            )
         if hasattr(spider, "REDIS_SSL") and spider.REDIS_SSL:
             server_ssl = True if spider.REDIS_SSL else False
         else:
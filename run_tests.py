@@ -3,7 +3,7 @@
 import sys
 import unittest
 
-TEST_LIST = ["tests.base_test", "tests.response_test", "tests.auth_test"]
+TEST_LIST = ["tests.base_test", "tests.response_test", "tests.auth_test", "tests.schedule_test", "tests.pipeline_test", "tests.exporter_test", "tests.task_test", "tests.request_test", "tests.metrics_test", "tests.httpcache_test"]
 
 
 def main():
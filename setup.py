@@ -11,7 +11,7 @@ setup(
     author_email='lzgug2@outlook.com',
     license='MIT',
     keywords='pycurl session spider',
-    packages=find_packages(),
+    packages=find_packages(exclude=["tests", "tests.*", "benchmarks", "benchmarks.*"]),
     install_requires=['pycurl', 'lxml', 'certifi', 'cssselect'],
     python_requires='>=3'
 )
\ No newline at end of file
@@ -1,7 +1,13 @@
 # coding: utf-8
 
+import json
+import threading
+import certifi
+import pycurl
 import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 from pycurl_session import Session
+from pycurl_session.session import CurlHandle
 
 
 class BaseTestCase(unittest.TestCase):
@@ -22,3 +28,139 @@ class BaseTestCase(unittest.TestCase):
 
     def tearDown(self):
         self.session.clear_cookies()
+
+
+def start_echo_server():
+    # response json: method, referer, cookie, body. /303 redirect to / by 303
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        disable_nagle_algorithm = True
+
+        def echo(self):
+            length = int(self.headers.get("Content-Length") or 0)
+            if self.path == "/303":
+                self.rfile.read(length)
+                self.send_response(303)
+                self.send_header("Location", "/")
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+            body = json.dumps({
+                "method": self.command,
+                "referer": self.headers.get("Referer"),
+                "cookie": self.headers.get("Cookie"),
+                "content_type": self.headers.get("Content-Type"),
+                "body": self.rfile.read(length).decode("utf-8"),
+            }).encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            if self.command != "HEAD":
+                self.wfile.write(body)
+
+        do_GET = do_POST = do_PUT = do_PATCH = do_DELETE = do_HEAD = echo
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, "http://127.0.0.1:{0}/".format(server.server_address[1])
+
+
+class CurlHandleTestCase(unittest.TestCase):
+    def setUp(self):
+        self.server, self.url = start_echo_server()
+        self.session = Session(store_cookie=False)
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_reuse(self):
+        c = self.session.c
+        self.assertIsInstance(c, CurlHandle)
+        requests = [
+            ("put", {"data": "a"}, {"method": "PUT", "body": "a"}),
+            ("get", {"headers": {"referer": "http://r/"}, "cookies": {"k": "v"}}, {"method": "GET", "referer": "http://r/", "cookie": "k=v"}),
+            ("get", {}, {"method": "GET", "referer": None, "cookie": None}),
+            ("post", {"data": {"x": "1"}}, {"method": "POST", "body": "x=1"}),
+            ("head", {}, {}),
+            ("delete", {}, {"method": "DELETE", "body": ""}),
+            ("get", {}, {"method": "GET", "body": ""}),
+        ]
+        for method, args, expected in requests:
+            response = getattr(self.session, method)(self.url, **args)
+            self.assertEqual(response.status_code, 200)
+            if method == "head":
+                continue
+            result = response.json()
+            self.assertEqual({k: result[k] for k in expected}, expected, method)
+
+        # same request again, only url and headers may change
+        count = c.setopt_count
+        self.session.get(self.url)
+        self.assertEqual(c.setopt_count, count)
+        self.session.get(self.url + "?a=1")
+        self.assertEqual(c.setopt_count, count + 1)
+
+    def test_redirect_reuse(self):
+        # 303 change DELETE to GET in redirect, CUSTOMREQUEST must not stay in the reused handle
+        response = self.session.delete(self.url + "303")
+        self.assertEqual(response.json()["method"], "GET")
+        self.assertEqual(self.session.get(self.url).json()["method"], "GET")
+        self.assertEqual(self.session.delete(self.url).json()["method"], "DELETE")
+        self.assertEqual(self.session.get(self.url).json()["method"], "GET")
+
+    def test_ca_blob(self):
+        self.session._ca_blob = True
+        c = self.session.prepare_curl_handle("GET", "https://example.com/", c=CurlHandle())
+        blob = c.options[pycurl.CAINFO_BLOB]
+        self.assertIn(b"BEGIN CERTIFICATE", blob)
+        # read once
+        self.assertIs(self.session.load_ca_blob(certifi.where()), blob)
+        self.session._ca_blob = False
+        c = self.session.prepare_curl_handle("GET", "https://example.com/", c=CurlHandle())
+        self.assertEqual(c.options[pycurl.CAINFO], certifi.where())
+
+
+class PreparedRequestTestCase(unittest.TestCase):
+    def setUp(self):
+        self.server, self.url = start_echo_server()
+        self.session = Session(store_cookie=False)
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_prepared(self):
+        prepared = self.session.prepare("POST", self.url, json={"a": 1}, headers={"referer": "http://r/"})
+        self.assertEqual(prepared.send().json()["body"], '{"a": 1}')
+        result = prepared.send(json={"a": 2}).json()
+        self.assertEqual((result["method"], result["body"], result["referer"]), ("POST", '{"a": 2}', "http://r/"))
+        response = prepared.send(params={"page": 2})
+        self.assertEqual(response.request["url"], self.url + "?page=2")
+        self.assertEqual(response.json()["body"], '{"a": 1}')
+        # request of other handle not changed
+        self.assertEqual(self.session.get(self.url).json()["method"], "GET")
+        count = prepared.c.setopt_count
+        self.assertEqual(prepared.send().json()["body"], '{"a": 1}')
+        # url back from ?page=2
+        self.assertEqual(prepared.c.setopt_count, count + 1)
+        # cookies changed, prepare again
+        self.session.init_cookies("127.0.0.1", {"k": "v"})
+        self.assertEqual(prepared.send().json()["cookie"], "k=v")
+
+    def test_body_kind(self):
+        prepared = self.session.prepare("POST", self.url, json={"a": 1})
+        self.assertEqual(prepared.send().json()["content_type"], "application/json")
+        # form body of this time is not labelled as json
+        result = prepared.send(data={"a": "2"}).json()
+        self.assertEqual((result["body"], result["content_type"]), ("a=2", "application/x-www-form-urlencoded"))
+        self.assertEqual(prepared.send(json={"a": 3}).json()["content_type"], "application/json")
+        self.assertEqual(prepared.send().json()["content_type"], "application/json")
+        # content-type given by user is kept
+        prepared = self.session.prepare("POST", self.url, json={"a": 1}, headers={"Content-Type": "application/json"})
+        self.assertEqual(prepared.send(data='{"a": 2}').json()["content_type"], "application/json")
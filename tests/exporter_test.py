@@ -0,0 +1,73 @@
+# coding: utf-8
+
+import csv
+import gzip
+import io
+import json
+import os
+import shutil
+import tempfile
+import unittest
+from pycurl_session.spider import Spider
+from pycurl_session.spider.cluster import worker_settings
+from pycurl_session.spider.exporter import FeedExporter, JsonLinesExporter, CsvExporter
+
+
+class ExporterTestCase(unittest.TestCase):
+    def setUp(self):
+        self.dir_path = tempfile.mkdtemp()
+        self.spider = Spider()
+        self.spider.settings = {}
+
+    def tearDown(self):
+        shutil.rmtree(self.dir_path)
+
+    def test_jsonlines_gzip(self):
+        self.spider.settings.update({
+            "FEED_URI": os.path.join(self.dir_path, "{spider}.jsonl"),
+            "FEED_COMPRESSION": "gzip",
+        })
+        exporter = JsonLinesExporter()
+        exporter.process_item({"a": 1}, self.spider)
+        exporter.process_items([{"a": 2}, {"a": "中文"}], self.spider)
+        path = os.path.join(self.dir_path, "spider.jsonl.gz")
+        self.assertTrue(os.path.exists(path + ".part"))
+        exporter.close_spider(self.spider)
+        self.assertFalse(os.path.exists(path + ".part"))
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            items = [json.loads(line) for line in f]
+        self.assertEqual(items, [{"a": 1}, {"a": 2}, {"a": "中文"}])
+
+    def test_worker(self):
+        # ShardSchedule workers write their own file
+        self.spider.settings.update({
+            "FEED_URI": os.path.join(self.dir_path, "{spider}.csv"),
+            "FEED_ROTATE_SIZE": 1,
+            "FEED_BUFFER_SIZE": 1,
+        })
+        for worker in range(2):
+            self.spider.settings.update(worker_settings({}, worker))
+            exporter = CsvExporter()
+            exporter.process_item({"a": worker}, self.spider)
+            exporter.close_spider(self.spider)
+        self.assertEqual(sorted(os.listdir(self.dir_path)), ["spider-0-0.csv", "spider-1-0.csv"])
+        self.spider.settings.update({"FEED_URI": os.path.join(self.dir_path, "w{worker}.jsonl"), "FEED_ROTATE_SIZE": 0})
+        exporter = FeedExporter()
+        exporter.process_item({"a": 1}, self.spider)
+        exporter.close_spider(self.spider)
+        with open(os.path.join(self.dir_path, "w1.jsonl"), encoding="utf-8") as f:
+            self.assertEqual(json.loads(f.read()), {"a": 1})
+
+    def test_csv_rotate(self):
+        self.spider.settings.update({
+            "FEED_URI": os.path.join(self.dir_path, "{spider}.csv"),
+            "FEED_ROTATE_SIZE": 1,
+            "FEED_BUFFER_SIZE": 1,
+        })
+        exporter = CsvExporter()
+        for i in range(3):
+            exporter.process_item({"a": i, "b": "x"}, self.spider)
+        exporter.close_spider(self.spider)
+        self.assertEqual(sorted(os.listdir(self.dir_path)), ["spider-0.csv", "spider-1.csv", "spider-2.csv"])
+        with open(os.path.join(self.dir_path, "spider-2.csv"), newline="", encoding="utf-8") as f:
+            self.assertEqual(list(csv.DictReader(f)), [{"a": "2", "b": "x"}])
@@ -0,0 +1,384 @@
+# coding: utf-8
+
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+from email.utils import formatdate
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pycurl_session import Session, Response
+from pycurl_session.httpcache import HttpCache
+from pycurl_session.spider import Spider, Schedule, Request
+from pycurl_session.spider.cluster import worker_settings
+from pycurl_session.spider.middleware import HTTPCACHE_DEFAULT_DIR, default_store_dir
+from pycurl_session.spider.segmentstore import SegmentStore
+
+
+def make_response(status_code=200, headers=None, content=b"body"):
+    response = Response()
+    response.status_code = status_code
+    response.url = "http://example.com/a"
+    response.headers = headers or []
+    response.content = content
+    return response
+
+
+class HttpCacheTestCase(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    def test_freshness(self):
+        cache = HttpCache()
+        now = time.time()
+        entry = cache.store("GET", "http://example.com/a", {}, make_response(headers=[
+            "Date: {0}".format(formatdate(now, usegmt=True)), "Cache-Control: max-age=60",
+        ]), now, now)
+        self.assertTrue(entry.is_fresh({}, now + 30))
+        self.assertFalse(entry.is_fresh({}, now + 61))
+        self.assertFalse(entry.is_fresh({"cache-control": "no-cache"}, now + 30))
+        self.assertFalse(entry.is_fresh({"cache-control": "max-age=10"}, now + 30))
+        # Age from upstream cache
+        entry = cache.store("GET", "http://example.com/a", {}, make_response(headers=[
+            "Cache-Control: max-age=60", "Age: 50",
+        ]), now, now)
+        self.assertFalse(entry.is_fresh({}, now + 20))
+        # heuristic, 10% of 10 days, max 1 day
+        entry = cache.store("GET", "http://example.com/a", {}, make_response(headers=[
+            "Date: {0}".format(formatdate(now, usegmt=True)),
+            "Last-Modified: {0}".format(formatdate(now - 86400 * 10, usegmt=True)),
+        ]), now, now)
+        self.assertEqual(entry.freshness_lifetime(), 86400)
+        self.assertEqual(entry.validators(), {"if-modified-since": formatdate(now - 86400 * 10, usegmt=True)})
+        self.assertIsNone(cache.store("GET", "http://example.com/b", {}, make_response(headers=["Cache-Control: no-store, max-age=60"]), now))
+        self.assertIsNone(cache.store("GET", "http://example.com/b", {}, make_response(headers=["Content-Type: text/html"]), now))
+        self.assertIsNone(cache.store("GET", "http://example.com/b", {}, make_response(500, ["Cache-Control: max-age=60"]), now))
+        self.assertIsNone(cache.lookup("GET", "http://example.com/b", {}))
+
+    def test_vary(self):
+        cache = HttpCache()
+        headers = ["Cache-Control: max-age=60", "Vary: Accept-Language", "Set-Cookie: a=1"]
+        cache.store("GET", "http://example.com/a", {"accept-language": "en"}, make_response(headers=headers, content=b"en"), time.time())
+        cache.store("GET", "http://example.com/a", {"accept-language": "fr"}, make_response(headers=headers, content=b"fr"), time.time())
+        self.assertEqual(cache.lookup("GET", "http://example.com/a", {"accept-language": "fr"}).content, b"fr")
+        self.assertEqual(cache.lookup("GET", "http://example.com/a", {"accept-language": "en"}).content, b"en")
+        self.assertIsNone(cache.lookup("GET", "http://example.com/a", {}))
+        self.assertNotIn("set-cookie", cache.lookup("GET", "http://example.com/a", {"accept-language": "en"}).headers)
+        cache.invalidate("http://example.com/a")
+        self.assertIsNone(cache.lookup("GET", "http://example.com/a", {"accept-language": "en"}))
+
+    def test_evict(self):
+        path = os.path.join(self.tmp_dir, "cache.db")
+        cache = HttpCache(path, memory_size=2500, disk_size=5000)
+        for i in range(10):
+            cache.store("GET", "http://example.com/{0}".format(i), {}, make_response(headers=["Cache-Control: max-age=60"], content=b"x" * 1000), time.time())
+        self.assertLessEqual(cache.memory.size, 2500)
+        self.assertEqual(len(cache.memory.entries), 2)
+        self.assertLessEqual(cache.disk.size, 5000)
+        # oldest evicted, newest kept on disk
+        self.assertIsNone(cache.lookup("GET", "http://example.com/0", {}))
+        cache.close()
+        cache = HttpCache(path, memory_size=2500, disk_size=5000)
+        self.assertEqual(cache.lookup("GET", "http://example.com/9", {}).content, b"x" * 1000)
+        cache.close()
+
+
+def start_server(hits):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_GET(self):
+            hits.append((self.path, self.headers.get("If-None-Match")))
+            if self.headers.get("If-None-Match") == '"v1"':
+                self.send_response(304)
+                self.send_header("ETag", '"v1"')
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+            if self.path == "/":
+                body = "".join('<a href="/page/{0}">{0}</a>'.format(i) for i in range(20)).encode("utf-8")
+            else:
+                body = self.path.encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/html; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            if self.path == "/fresh":
+                self.send_header("Cache-Control", "max-age=60")
+            elif self.path == "/etag":
+                self.send_header("Cache-Control", "no-cache")
+                self.send_header("ETag", '"v1"')
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    class Server(ThreadingHTTPServer):
+        request_queue_size = 64
+        daemon_threads = True
+
+    server = Server(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, "http://127.0.0.1:{0}".format(server.server_address[1])
+
+
+class SessionHttpCacheTestCase(unittest.TestCase):
+    def setUp(self):
+        self.hits = []
+        self.server, self.base_url = start_server(self.hits)
+        self.session = Session(store_cookie=False)
+        self.session.set_http_cache()
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_session_cache(self):
+        for _ in range(3):
+            response = self.session.get(self.base_url + "/fresh")
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.text, "/fresh")
+        self.assertEqual(len(self.hits), 1)
+        self.assertTrue(response.from_cache)
+
+        for _ in range(2):
+            response = self.session.get(self.base_url + "/etag")
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.text, "/etag")
+        self.assertEqual(self.hits[1:], [("/etag", None), ("/etag", '"v1"')])
+        self.assertTrue(response.from_cache)
+
+        response = self.session.get(self.base_url + "/fresh", headers={"Cache-Control": "no-store"})
+        self.assertFalse(response.from_cache)
+        self.assertEqual(len(self.hits), 4)
+
+
+class SegmentStoreTestCase(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    def test_store(self):
+        store = SegmentStore(self.tmp_dir, segment_size=1000)
+        for i in range(10):
+            store.set("{0:020d}".format(i).encode(), b"v" * 300 + str(i).encode())
+        store.set("{0:020d}".format(1).encode(), b"new")
+        self.assertEqual(store.get("{0:020d}".format(1).encode())[0], b"new")
+        self.assertEqual(store.get("{0:020d}".format(9).encode())[0], b"v" * 300 + b"9")
+        self.assertIsNone(store.get(b"x" * 20))
+        self.assertGreater(store.segment, 1)
+        store.close()
+        # killed when writing index
+        with open(os.path.join(self.tmp_dir, SegmentStore.INDEX_FILE), "ab") as f:
+            f.write(b"broken")
+        store = SegmentStore(self.tmp_dir, segment_size=1000)
+        self.assertEqual(len(store), 10)
+        self.assertEqual(store.get("{0:020d}".format(1).encode())[0], b"new")
+        store.set(b"y" * 20, b"after")
+        self.assertEqual(store.get(b"y" * 20)[0], b"after")
+        store.close()
+
+    def test_touch(self):
+        store = SegmentStore(self.tmp_dir)
+        store.set(b"k" * 20, b"value", timestamp=1.0)
+        segment_path = os.path.join(self.tmp_dir, SegmentStore.SEGMENT_FILE.format(0))
+        size = os.path.getsize(segment_path)
+        self.assertTrue(store.touch(b"k" * 20, timestamp=2.0))
+        self.assertFalse(store.touch(b"x" * 20))
+        self.assertEqual(store.get(b"k" * 20), (b"value", 2.0))
+        # index record only, value not copied
+        self.assertEqual(os.path.getsize(segment_path), size)
+        store.close()
+        store = SegmentStore(self.tmp_dir)
+        self.assertEqual(store.get(b"k" * 20), (b"value", 2.0))
+        store.close()
+
+    def test_default_dir(self):
+        # one writer only, spiders and ShardSchedule workers do not share the default directory
+        spider = Spider()
+        spider.settings = {}
+        self.assertEqual(default_store_dir(HTTPCACHE_DEFAULT_DIR, spider), os.path.join(HTTPCACHE_DEFAULT_DIR, "spider"))
+        spider.settings.update(worker_settings({}, 1))
+        self.assertIsNone(spider.settings.get("HTTPCACHE_DIR"))
+        self.assertEqual(
+            default_store_dir(HTTPCACHE_DEFAULT_DIR, spider),
+            os.path.join(HTTPCACHE_DEFAULT_DIR, "spider", "worker-1"),
+        )
+        self.assertEqual(
+            worker_settings({"HTTPCACHE_DIR": self.tmp_dir}, 1)["HTTPCACHE_DIR"],
+            os.path.join(self.tmp_dir, "worker-1"),
+        )
+
+
+class HttpCacheMiddlewareTestCase(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.hits = []
+        self.server, self.base_url = start_server(self.hits)
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    def crawl(self, **settings):
+        base_url = self.base_url
+        pages = []
+
+        class CacheSpider(Spider):
+            name = "cache"
+
+            def __init__(self):
+                self.start_urls = [base_url + "/"]
+
+            def parse(self, response):
+                for href in response.xpath("//a/@href").getall():
+                    yield Request(response.urljoin(href), callback=self.parse_page)
+
+            def parse_page(self, response):
+                pages.append((response.text, response.from_cache))
+
+        custom_settings = {
+            "ROBOTSTXT_OBEY": False,
+            "COOKIES_STORE_ENABLED": False,
+            "LOG_ENABLED": False,
+            "DOWNLOADER_MIDDLEWARES": ["pycurl_session.spider.middleware.HttpCacheMiddleware"],
+            "HTTPCACHE_DIR": self.tmp_dir,
+        }
+        custom_settings.update(settings)
+        schedule = Schedule(custom_settings)
+        schedule.add_spider(CacheSpider)
+        schedule.run()
+        return sorted(pages), schedule.logstat
+
+    def test_record_replay(self):
+        pages, logstat = self.crawl()
+        self.assertEqual(len(pages), 20)
+        self.assertEqual(logstat["httpcache/store"], 21)
+        self.assertEqual(len(self.hits), 21)
+        pages_replay, logstat = self.crawl(HTTPCACHE_IGNORE_MISSING=True)
+        self.assertEqual(len(self.hits), 21)
+        self.assertEqual(logstat["httpcache/hit"], 21)
+        self.assertEqual([text for text, _ in pages_replay], [text for text, _ in pages])
+        self.assertTrue(all(from_cache for _, from_cache in pages_replay))
+
+
+class RevalidateMiddlewareTestCase(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.hits = []
+        self.server, self.base_url = start_server(self.hits)
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    def crawl(self, meta=None):
+        base_url = self.base_url
+        status = []
+
+        class RevalidateSpider(Spider):
+            name = "revalidate"
+
+            def start_requests(self):
+                for path in ["/etag", "/page/1"]:
+                    yield Request(base_url + path, callback=self.parse, meta=dict(meta or {}))
+
+            def parse(self, response):
+                status.append((response.url[len(base_url):], response.status_code))
+
+        schedule = Schedule({
+            "ROBOTSTXT_OBEY": False,
+            "COOKIES_STORE_ENABLED": False,
+            "LOG_ENABLED": False,
+            "DOWNLOADER_MIDDLEWARES": ["pycurl_session.spider.middleware.RevalidateMiddleware"],
+            "REVALIDATE_DIR": self.tmp_dir,
+        })
+        schedule.add_spider(RevalidateSpider)
+        schedule.run()
+        return sorted(status), schedule.logstat
+
+    def test_revalidate(self):
+        status, logstat = self.crawl()
+        self.assertEqual(status, [("/etag", 200), ("/page/1", 200)])
+        self.assertEqual(logstat["revalidate/sent"], 0)
+        status, logstat = self.crawl()
+        self.assertEqual(status, [("/etag", 304), ("/page/1", 200)])
+        self.assertEqual(logstat["revalidate/sent"], 1)
+        self.assertEqual(logstat["revalidate/not_modified"], 1)
+        self.assertIn(("/etag", '"v1"'), self.hits)
+        status, logstat = self.crawl(meta={"skip_not_modified": True})
+        self.assertEqual(status, [("/page/1", 200)])
+        self.assertEqual(logstat["revalidate/skipped"], 1)
+
+
+class HttpCacheRevalidateTestCase(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.hits = []
+        self.server, self.base_url = start_server(self.hits)
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    def crawl(self, **settings):
+        base_url = self.base_url
+        pages = []
+
+        class CacheRevalidateSpider(Spider):
+            name = "cache_revalidate"
+
+            def start_requests(self):
+                yield Request(base_url + "/etag", callback=self.parse)
+
+            def parse(self, response):
+                pages.append((response.status_code, response.text, response.from_cache))
+
+        custom_settings = {
+            "ROBOTSTXT_OBEY": False,
+            "COOKIES_STORE_ENABLED": False,
+            "LOG_ENABLED": False,
+            "DOWNLOADER_MIDDLEWARES": [
+                "pycurl_session.spider.middleware.HttpCacheMiddleware",
+                "pycurl_session.spider.middleware.RevalidateMiddleware",
+            ],
+            "HTTPCACHE_DIR": os.path.join(self.tmp_dir, "httpcache"),
+            "REVALIDATE_DIR": os.path.join(self.tmp_dir, "revalidate"),
+        }
+        custom_settings.update(settings)
+        schedule = Schedule(custom_settings)
+        schedule.add_spider(CacheRevalidateSpider)
+        schedule.run()
+        return pages, schedule.logstat
+
+    def test_not_modified(self):
+        pages, _ = self.crawl()
+        self.assertEqual(pages, [(200, "/etag", False)])
+        size = os.path.getsize(os.path.join(self.tmp_dir, "httpcache", SegmentStore.SEGMENT_FILE.format(0)))
+        time.sleep(0.05)
+        # expired, revalidated by If-None-Match, 304 replays the cached response
+        pages, logstat = self.crawl(HTTPCACHE_EXPIRATION_SECS=0.01)
+        self.assertEqual(pages, [(200, "/etag", True)])
+        self.assertEqual(logstat["revalidate/not_modified"], 1)
+        self.assertEqual(logstat["httpcache/refresh"], 1)
+        self.assertEqual(logstat["httpcache/store"], 0)
+        # refresh time only, cached value not copied
+        segment_path = os.path.join(self.tmp_dir, "httpcache", SegmentStore.SEGMENT_FILE.format(0))
+        self.assertEqual(os.path.getsize(segment_path), size)
+        # 304 is not stored over the cached 200
+        pages, _ = self.crawl(HTTPCACHE_IGNORE_MISSING=True, HTTPCACHE_EXPIRATION_SECS=60)
+        self.assertEqual(pages, [(200, "/etag", True)])
+        self.assertEqual(len(self.hits), 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
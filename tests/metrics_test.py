@@ -0,0 +1,36 @@
+# coding: utf-8
+
+import unittest
+from urllib.request import urlopen
+from pycurl_session.spider.metrics import Registry, MetricsServer, CONTENT_TYPE
+
+
+class MetricsTestCase(unittest.TestCase):
+    def setUp(self):
+        self.registry = Registry()
+        self.queue = [1, 2, 3]
+        self.registry.counter("test_responses", "Responses", ["status"]).inc((200,))
+        self.registry.gauge("test_queue", "Queue size", func=lambda: len(self.queue))
+        histogram = self.registry.histogram("test_latency_seconds", "Latency", ["domain"], buckets=[0.1, 1])
+        for value in [0.05, 0.5, 5]:
+            histogram.observe(("example.com",), value)
+
+    def test_render(self):
+        text = self.registry.render()
+        lines = text.splitlines()
+        self.assertIn("# TYPE test_responses counter", lines)
+        self.assertIn('test_responses_total{status="200"} 1', lines)
+        self.assertIn("test_queue 3", lines)
+        self.assertIn('test_latency_seconds_bucket{domain="example.com",le="1.0"} 2', lines)
+        self.assertIn('test_latency_seconds_bucket{domain="example.com",le="+Inf"} 3', lines)
+        self.assertIn('test_latency_seconds_count{domain="example.com"} 3', lines)
+        self.assertEqual(lines[-1], "# EOF")
+
+    def test_server(self):
+        server = MetricsServer(self.registry, port=0)
+        try:
+            with urlopen("http://127.0.0.1:{0}/metrics".format(server.port), timeout=5) as f:
+                self.assertEqual(f.headers["Content-Type"], CONTENT_TYPE)
+                self.assertIn("test_queue 3", f.read().decode("utf-8"))
+        finally:
+            server.close()
@@ -0,0 +1,44 @@
+# coding: utf-8
+
+import threading
+import unittest
+from pycurl_session.spider import Spider
+from pycurl_session.spider.pipeline import PipelineRunner
+
+
+class PipelineRunnerTestCase(unittest.TestCase):
+    def setUp(self):
+        self.batches = []
+        self.lock = threading.Lock()
+        self.spider = Spider()
+
+    def handler(self, items, spider):
+        with self.lock:
+            self.batches.append(list(items))
+
+    def test_batch_size(self):
+        runner = PipelineRunner(self.handler, threads=1, batch_size=4, flush_interval=60)
+        for i in range(10):
+            runner.put({"i": i}, self.spider)
+        runner.close()
+        self.assertEqual([len(batch) for batch in self.batches], [4, 4, 2])
+        self.assertEqual([item["i"] for batch in self.batches for item in batch], list(range(10)))
+
+    def test_flush_interval(self):
+        runner = PipelineRunner(self.handler, threads=1, batch_size=100, flush_interval=0.05)
+        runner.put({"i": 0}, self.spider)
+        for _ in range(100):
+            if self.batches: break
+            threading.Event().wait(0.01)
+        self.assertEqual(self.batches, [[{"i": 0}]])
+        runner.close()
+
+    def test_full(self):
+        event = threading.Event()
+        runner = PipelineRunner(lambda items, spider: event.wait(), threads=1, batch_size=1, queue_size=2)
+        for i in range(3):
+            runner.put({"i": i}, self.spider)
+        self.assertTrue(runner.full())
+        event.set()
+        runner.close()
+        self.assertFalse(runner.full())
@@ -0,0 +1,81 @@
+# coding: utf-8
+
+import pickle
+import tracemalloc
+import unittest
+from urllib.parse import urlparse
+
+from pycurl_session import Session
+from pycurl_session.spider.request import Request
+
+
+class DictRequest(object):
+    # Request before __slots__, for memory compare
+    def __init__(self, url, meta=None, headers=None, cookies=None, cb_kwargs=None, priority=0):
+        self.url = url
+        self.origin_url = None
+        self.callback = None
+        self.meta = meta or {}
+        self.method = "GET"
+        self.headers = headers or {}
+        self.cookies = cookies or {}
+        self.body = None
+        self.data = None
+        self.json = None
+        self.dont_filter = False
+        self.cb_kwargs = cb_kwargs or {}
+        self.priority = priority
+
+
+def traced_size(cls, count=10000):
+    urls = ["https://example.com/page/{0}".format(i) for i in range(count)]
+    tracemalloc.start()
+    base = tracemalloc.get_traced_memory()[0]
+    requests = [cls(url) for url in urls]
+    size = tracemalloc.get_traced_memory()[0] - base
+    tracemalloc.stop()
+    del requests
+    return size / count
+
+
+class RequestTestCase(unittest.TestCase):
+    def test_lazy_dict(self):
+        request = Request("https://example.com/")
+        self.assertIsNone(request._meta)
+        request.meta["page"] = 1
+        self.assertEqual(request.meta, {"page": 1})
+        request.headers = {"referer": "https://example.com/"}
+        self.assertEqual(request.headers["referer"], "https://example.com/")
+        self.assertEqual(request.cb_kwargs, {})
+
+    def test_pickle(self):
+        request = Request("https://example.com/", meta={"page": 1}, priority=2)
+        request = pickle.loads(pickle.dumps(request))
+        self.assertEqual(request.meta, {"page": 1})
+        self.assertEqual(request.priority, 2)
+        self.assertEqual(request.cookies, {})
+
+    def test_url_parsed(self):
+        request = Request("https://example.com/a?b=1")
+        url_parsed = request.url_parsed
+        self.assertEqual(url_parsed.netloc, "example.com")
+        self.assertIs(request.url_parsed, url_parsed)
+        request.url = "https://example.org/"
+        self.assertEqual(request.url_parsed.netloc, "example.org")
+        request = pickle.loads(pickle.dumps(request))
+        self.assertEqual((request.url, request.url_parsed.path), ("https://example.org/", "/"))
+
+    def test_normalize_url(self):
+        session = Session(store_cookie=False)
+        url = "https://user:pw@example.com/a b?q=a b&x"
+        url_info, normalized = session.normalize_url(url)
+        self.assertEqual(url_info.username, "user")
+        self.assertEqual(normalized, session.reconstruct_url(urlparse(url)))
+        self.assertIs(session.normalize_url(url)[1], normalized)
+        self.assertEqual(session.normalize_url(url, params={"p": 1})[1], session.normalize_url(url, params="p=1")[1])
+
+    def test_memory(self):
+        size_slots = traced_size(Request)
+        size_dict = traced_size(DictRequest)
+        # about 150 bytes vs 450 bytes per pending request
+        self.assertLess(size_slots, size_dict / 2)
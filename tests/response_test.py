@@ -3,6 +3,8 @@
 import json
 import unittest
 from pycurl_session import Session, Response, Selector
+from pycurl_session.response import Headers, Timings
+from pycurl_session.spider.middleware import Statistics
 
 
 class ResponseTestCase(unittest.TestCase):
@@ -41,5 +43,73 @@ class ResponseTestCase(unittest.TestCase):
         data = rsp.json()
         self.assertEqual(data["url"], url)
 
+    def test_lazy_text_meta_charset(self):
+        rsp = Response()
+        rsp.headers = ["HTTP/1.1 200 OK", "Content-Type: text/html"]
+        rsp.content = '<html><head><meta charset="gbk"></head><p>中文</p></html>'.encode("gbk")
+        self.session._response_decode(rsp)
+        self.assertIsNone(rsp._text)
+        self.assertEqual(rsp.xpath("//p/text()").get(), "中文")
+        self.assertEqual(rsp.encoding, "gbk")
+
+    def test_lazy_text_json(self):
+        rsp = Response()
+        rsp.headers = ["HTTP/1.1 200 OK", "Content-Type: application/json; charset=utf-8"]
+        rsp.content = json.dumps({"a": "中文"}, ensure_ascii=False).encode("utf-8")
+        self.session._response_decode(rsp)
+        self.assertEqual(rsp.json(), {"a": "中文"})
+        self.assertIsNone(rsp._text)
+        self.assertEqual(rsp.encoding, "utf-8")
+
+    def test_json_encoding(self):
+        rsp = Response()
+        rsp.headers = ["HTTP/1.1 200 OK", "Content-Type: application/json"]
+        rsp.content = '{"a":"\u00e9"}'.encode("latin-1")
+        self.session._response_decode(rsp)
+        rsp.encoding = "latin-1"
+        self.assertEqual(rsp.json(), {"a": "\u00e9"})
+        # no charset, not utf-8
+        rsp = Response()
+        rsp.headers = ["HTTP/1.1 200 OK", "Content-Type: application/json"]
+        rsp.content = '{"a":"\u00e9"}'.encode("latin-1")
+        self.session._response_decode(rsp)
+        self.assertEqual(rsp.json(), "")
+
+    def test_headers(self):
+        headers = Headers(["Set-Cookie: a=1", "Content-Type: text/html", "set-cookie: b=2"])
+        self.assertEqual(headers.getlist("SET-COOKIE"), ["a=1", "b=2"])
+        self.assertEqual(headers.get("set-cookie"), "b=2")
+        self.assertEqual(headers["content-type"], "text/html")
+        self.assertNotIn("location", headers)
+        self.assertEqual(list(headers)[0], "Set-Cookie: a=1")
+        rsp = Response()
+        rsp.headers = ["Location: /a", "location: /b"]
+        self.assertEqual(rsp.get_header("LOCATION"), "/b")
+
+    def test_meta_shared(self):
+        meta = {"item": {"a": 1}}
+        rsp = Response()
+        rsp.meta = meta
+        del rsp
+        self.assertEqual(meta, {"item": {"a": 1}})
+
+    def test_timings_histogram(self):
+        stat = Statistics()
+        for total in [0.005, 0.2, 30]:
+            rsp = Response()
+            rsp.url = "https://example.com/a"
+            rsp.timings = Timings(namelookup=0.001, connect=0.002, appconnect=0.004,
+                pretransfer=0.004, starttransfer=total / 2, total=total, num_connects=1)
+            stat.process_response(None, rsp, None)
+        logstat = stat.process_logstat()
+        timings = logstat["timings/example.com"]
+        self.assertEqual(timings["count"], 3)
+        self.assertEqual(timings["num_connects"], 3)
+        self.assertEqual(timings["total"]["buckets"][0], 1)
+        self.assertEqual(timings["total"]["buckets"][4], 1)
+        self.assertEqual(timings["total"]["buckets"][-1], 1)
+        self.assertEqual(timings["tls"]["max"], 0.002)
+        self.assertEqual(len(logstat["timings_buckets_ms"]), len(timings["total"]["buckets"]))
+
     def tearDown(self):
         self.session.clear_cookies()
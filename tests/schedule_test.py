@@ -0,0 +1,276 @@
+# coding: utf-8
+
+import multiprocessing
+import os
+import pickle
+import queue
+import threading
+import unittest
+from collections import deque
+from pycurl_session import Session, Response
+from pycurl_session.spider.cluster import Shard, shard_index, merge_logstat
+from pycurl_session.spider.offload import pack_request, unpack_request, pack_response, unpack_response
+from pycurl_session.spider.pqueue import PriorityQueue
+from pycurl_session.spider.profiler import StageProfiler
+from pycurl_session.spider.request import Request
+from pycurl_session.spider import Spider, Schedule
+from pycurl_session.spider.task import TaskItem
+from tests.base_test import start_echo_server
+
+
+class PriorityQueueTestCase(unittest.TestCase):
+    def make_item(self, url, priority=0):
+        request = Request(url=url, priority=priority)
+        return TaskItem("spider", request, request.priority)
+
+    def test_same_priority_like_deque(self):
+        q = PriorityQueue()
+        d = deque()
+        for i, op in enumerate(["append", "appendleft", "append", "appendleft", "append"]):
+            item = self.make_item("https://example.com/{0}".format(i))
+            getattr(q, op)(item)
+            getattr(d, op)(item)
+        self.assertEqual([q.popleft() for _ in range(len(q))], list(d))
+
+    def test_priority_first(self):
+        q = PriorityQueue()
+        for i in range(5):
+            q.append(self.make_item("https://example.com/list/{0}".format(i)))
+        q.append(self.make_item("https://example.com/detail/1", priority=10))
+        q.appendleft(self.make_item("https://example.com/low", priority=-1))
+        q.append(self.make_item("https://example.com/detail/2", priority=10))
+        urls = [q.popleft().item.url for _ in range(len(q))]
+        self.assertEqual(urls[:2], ["https://example.com/detail/1", "https://example.com/detail/2"])
+        self.assertEqual(urls[2], "https://example.com/list/0")
+        self.assertEqual(urls[-1], "https://example.com/low")
+
+    def test_empty(self):
+        q = PriorityQueue()
+        self.assertEqual(len(q), 0)
+        self.assertRaises(IndexError, q.popleft)
+
+
+def parse_module(response):
+    return None
+
+
+class OrderPipeline(object):
+    items = []
+
+    def process_item(self, item, spider):
+        OrderPipeline.items.append(item["i"])
+        return item
+
+
+class OrderSpider(Spider):
+    name = "order"
+    url = None
+    main_pid = None
+
+    def __init__(self):
+        self.start_urls = [self.url + "list"]
+
+    def parse(self, response):
+        yield {"i": 0}
+        yield Request(self.url + "page/1", callback=self.parse_page)
+        yield {"i": 1}
+        yield Request(self.url + "page/2", callback=self.parse_page)
+        yield {"i": 2}
+
+    def parse_page(self, response):
+        if self.main_pid is not None and os.getpid() != self.main_pid:
+            # worker process killed
+            os._exit(1)
+        yield {"i": response.url[len(self.url):]}
+
+
+class ParseOffloadTestCase(unittest.TestCase):
+    def setUp(self):
+        self.server, self.url = start_echo_server()
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        OrderSpider.url = None
+        OrderSpider.main_pid = None
+
+    def crawl(self, processes):
+        OrderSpider.url = self.url
+        OrderPipeline.items = []
+        schedule = Schedule({
+            "ROBOTSTXT_OBEY": False,
+            "COOKIES_STORE_ENABLED": False,
+            "LOG_ENABLED": False,
+            "CONCURRENT_REQUESTS": 1,
+            "PARSE_PROCESSES": processes,
+            "ITEM_PIPELINES": [OrderPipeline.__module__ + ".OrderPipeline"],
+        })
+        schedule.add_spider(OrderSpider)
+        schedule.run()
+        return OrderPipeline.items
+
+    def test_item_order(self):
+        # items of one callback in yield order, inline or offloaded
+        for processes in [0, 1]:
+            items = self.crawl(processes)
+            self.assertEqual([item for item in items if isinstance(item, int)], [0, 1, 2])
+            self.assertEqual(sorted(item for item in items if isinstance(item, str)), ["page/1", "page/2"])
+
+    def test_broken_pool(self):
+        OrderSpider.main_pid = os.getpid()
+        with self.assertLogs("Schedule", "ERROR") as log:
+            items = self.crawl(1)
+        # parsed in schedule loop after pool broken
+        self.assertEqual(sorted(map(str, items)), ["0", "1", "2", "page/1", "page/2"])
+        self.assertEqual(len([line for line in log.output if "broken" in line]), 1)
+
+    def test_pack_request(self):
+        class PackSpider(Spider):
+            name = "pack"
+
+            def parse_page(self, response):
+                return None
+
+        spider = PackSpider()
+        request = pickle.loads(pickle.dumps(pack_request(Request("https://example.com/a", callback=spider.parse_page), spider)))
+        self.assertEqual(unpack_request(request, spider).callback, spider.parse_page)
+        request = pickle.loads(pickle.dumps(pack_request(Request("https://example.com/b", callback=parse_module), spider)))
+        self.assertIs(unpack_request(request, spider).callback, parse_module)
+        # not dropped silently
+        self.assertRaises(ValueError, pack_request, Request("https://example.com/c", callback=lambda response: None), spider)
+
+    def test_pack_response(self):
+        response = Response()
+        response.url = "https://example.com/"
+        response.status_code = 200
+        response.headers = ["Content-Type: text/html; charset=utf-8"]
+        response.content.write("<html><head><title>hello</title></head></html>".encode("utf-8"))
+        response.cookies.set_cookie("sid", "abc", "example.com")
+        response.request.update({"url": "https://example.com/", "origin_url": None})
+        response.meta = {"page": 1}
+        data = pickle.loads(pickle.dumps(pack_response(response)))
+        new_response = unpack_response(data, Session(store_cookie=False))
+        self.assertEqual(new_response.status_code, 200)
+        self.assertEqual(new_response.title, "hello")
+        self.assertEqual(new_response.cookies["sid"], "abc")
+        self.assertEqual(new_response.meta, {"page": 1})
+
+
+class ShardScheduleTestCase(unittest.TestCase):
+    def test_shard_index(self):
+        # same registered domain, same worker
+        index = shard_index("https://www.example.com/a", 8)
+        self.assertEqual(shard_index("https://static.example.com/b?c=d", 8), index)
+        self.assertTrue(0 <= shard_index("http://127.0.0.1:8080/", 8) < 8)
+
+    def test_forward(self):
+        class ForwardSpider(Spider):
+            name = "forward"
+
+            def parse_page(self, response):
+                return None
+
+        spider = ForwardSpider()
+        sent, received = multiprocessing.Value("q", 0), multiprocessing.Value("q", 0)
+        shard = Shard(0, 1, [queue.Queue()], sent, received, [1], threading.Event())
+        request = Request("https://example.com/a", callback=spider.parse_page, meta={"lock": threading.Lock()})
+        # not counted as sent, or ShardSchedule wait for it forever
+        self.assertRaises(TypeError, shard.forward, TaskItem(spider.spider_id, request, 0), spider)
+        self.assertEqual((sent.value, shard.forward_failed), (0, 1))
+        request = Request("https://example.com/b", callback=spider.parse_page, meta={"page": 2})
+        shard.forward(TaskItem(spider.spider_id, request, 0), spider)
+        items = shard.poll({spider.spider_id: spider})
+        self.assertEqual((sent.value, received.value), (1, 1))
+        self.assertEqual(items[0].item.meta, {"page": 2})
+        self.assertEqual(items[0].item.callback, spider.parse_page)
+
+    def test_idle_worker(self):
+        sent, received = multiprocessing.Value("q", 0), multiprocessing.Value("q", 0)
+        stop = threading.Event()
+        schedule = Schedule({"LOG_ENABLED": False, "ROBOTSTXT_OBEY": False, "COOKIES_STORE_ENABLED": False})
+        schedule.shard = Shard(0, 1, [queue.Queue()], sent, received, [0], stop)
+        loops = []
+        process_shard = schedule.process_shard
+        schedule.process_shard = lambda: loops.append(1) or process_shard()
+        timer = threading.Timer(0.3, stop.set)
+        timer.start()
+        schedule.run()
+        timer.join()
+        # wait in Shard.poll(), not busy loop
+        self.assertLess(len(loops), 60)
+        self.assertEqual(schedule.shard.idle, [1])
+
+    def test_merge_logstat(self):
+        result = merge_logstat([
+            {"status_count/200": 2, "time_start": "2024-01-01 00:00:01.0", "time_used": 1.5, "robots.txt": {"a": 404}},
+            {"status_count/200": 3, "status_count/404": 1, "time_start": "2024-01-01 00:00:00.5", "time_used": 2.0, "robots.txt": {"b": 404}},
+        ])
+        self.assertEqual(result["status_count/200"], 5)
+        self.assertEqual(result["status_count/404"], 1)
+        self.assertEqual(result["time_start"], "2024-01-01 00:00:00.5")
+        self.assertEqual(result["time_used"], 2.0)
+        self.assertEqual(result["robots.txt"], {"a": 404, "b": 404})
+
+
+class DnsPrefetchTestCase(unittest.TestCase):
+    def setUp(self):
+        self.servers = [start_echo_server() for _ in range(3)]
+
+    def tearDown(self):
+        for server, _ in self.servers:
+            server.shutdown()
+            server.server_close()
+
+    def test_prefetch(self):
+        urls = [url + "page" for _, url in self.servers]
+        pages = []
+
+        class PrefetchSpider(Spider):
+            name = "prefetch"
+
+            def __init__(self):
+                self.start_urls = urls
+
+            def parse(self, response):
+                pages.append((response.url, response.status_code))
+
+        schedule = Schedule({
+            "ROBOTSTXT_OBEY": False,
+            "COOKIES_STORE_ENABLED": False,
+            "LOG_ENABLED": False,
+            "CONCURRENT_REQUESTS": 1,
+            "DNS_PREFETCH_ENABLED": True,
+        })
+        schedule.add_spider(PrefetchSpider)
+        # start_urls are looked ahead when spider is added
+        self.assertEqual(len(schedule.prefetch_pending), 3)
+        schedule.run()
+        self.assertEqual(sorted(pages), sorted((url, 200) for url in urls))
+        # first host may be sent before its prefetch
+        self.assertGreaterEqual(schedule.logstat.get("dns_prefetch/connected", 0), 2)
+        self.assertNotIn("dns_prefetch/failed", schedule.logstat)
+        self.assertIsNone(schedule.prefetch_cm)
+
+
+class StageProfilerTestCase(unittest.TestCase):
+    def test_stage(self):
+        profiler = StageProfiler()
+
+        class Pipeline(object):
+            def process_item(self, item, spider):
+                return item
+
+        def parse():
+            yield 1
+            yield 2
+
+        pipeline = Pipeline()
+        profiler.wrap_method(pipeline, "process_item", "pipeline/Pipeline.process_item")
+        self.assertEqual(pipeline.process_item({"a": 1}, None), {"a": 1})
+        self.assertEqual(list(profiler.wrap_generator(parse(), "callback/parse")), [1, 2])
+        self.assertEqual(profiler.call("stage", sum, [1, 2]), 3)
+        logstat = profiler.process_logstat()
+        self.assertEqual(logstat["profile/pipeline/Pipeline.process_item"]["calls"], 1)
+        # two items and StopIteration
+        self.assertEqual(logstat["profile/callback/parse"]["calls"], 3)
+        self.assertEqual(logstat["profile/stage"]["calls"], 1)
@@ -0,0 +1,102 @@
+# coding: utf-8
+
+import unittest
+from pycurl_session.spider import RedisSpider
+from pycurl_session.spider.task import Task, UrlFilter
+
+
+class FakePipeline(object):
+    def __init__(self, server):
+        self.server = server
+        self.commands = []
+
+    def __getattr__(self, name):
+        return lambda *args: self.commands.append((name, args))
+
+    def execute(self):
+        self.server.round_trips += 1
+        return [getattr(self.server, name)(*args) for name, args in self.commands]
+
+
+class FakeRedis(object):
+    def __init__(self, urls):
+        self.data = list(urls)
+        self.round_trips = 0
+
+    def lrange(self, key, start, end):
+        return self.data[start:end + 1]
+
+    def ltrim(self, key, start, end):
+        self.data = self.data[start:]
+
+    def lpush(self, key, *urls):
+        for url in urls:
+            self.data.insert(0, url)
+
+    def pipeline(self, transaction=True):
+        return FakePipeline(self)
+
+
+class FakeRedisSpider(RedisSpider):
+    name = "test"
+    REDIS_START_URLS_KEY = "test:start_urls"
+    REDIS_BATCH_SIZE = 4
+
+
+class FakeTask(Task):
+    def set_redis(self, spider):
+        self.redis_server = FakeRedis([
+            "https://example.com/{0}".format(i).encode("utf-8") for i in range(6)
+        ])
+        self.redis_encoding = spider.REDIS_ENCODING
+        self.redis_batch_size = spider.REDIS_BATCH_SIZE
+        self.redis_key_type = "list"
+
+
+class RedisTaskTestCase(unittest.TestCase):
+    def test_batch_get(self):
+        task = FakeTask(FakeRedisSpider())
+        urls = []
+        while True:
+            item = task.get()
+            if item is None: break
+            urls.append(item.item.url)
+        self.assertEqual(urls, ["https://example.com/{0}".format(i) for i in range(6)])
+        # 4 + 2 + empty
+        self.assertEqual(task.redis_server.round_trips, 3)
+
+    def test_flush(self):
+        spider = FakeRedisSpider()
+        task = FakeTask(spider)
+        item = task.get()
+        task.put(spider.spider_id, item.item.url)
+        task.put(spider.spider_id, item.item.url)
+        self.assertEqual(task.redis_server.round_trips, 1)
+        task.flush()
+        self.assertEqual(task.redis_server.round_trips, 2)
+        # url put back and url not used in buffer
+        self.assertEqual(len(task.redis_server.data), 6)
+        self.assertEqual(len(task.redis_buffer), 0)
+        # order kept at the head of list
+        self.assertEqual(
+            [url.decode("utf-8") if isinstance(url, bytes) else url for url in task.redis_server.data],
+            ["https://example.com/{0}".format(i) for i in range(6)]
+        )
+
+
+class UrlFilterTestCase(unittest.TestCase):
+    def test_capacity(self):
+        url_filter = UrlFilter(capacity=3)
+        for i in range(5):
+            url_filter.add("https://example.com/{0}".format(i))
+        self.assertEqual(len(url_filter), 3)
+        self.assertNotIn("https://example.com/0", url_filter)
+        self.assertIn("https://example.com/4", url_filter)
+        self.assertGreater(url_filter.memory(), 0)
+
+    def test_ttl(self):
+        url_filter = UrlFilter(capacity=10, ttl=60)
+        url_filter.add("https://example.com/0")
+        url_filter.data["https://example.com/0"] -= 120
+        self.assertNotIn("https://example.com/0", url_filter)
+        self.assertEqual(len(url_filter), 0)